@@ -0,0 +1,134 @@
+import time
+import uuid
+from src.statements import StatementRegistry
+
+try:
+    import psycopg
+    from psycopg.conninfo import make_conninfo
+    from psycopg.rows import dict_row
+    from psycopg_pool import AsyncConnectionPool
+except ImportError:
+    psycopg = None
+
+
+class AsyncDatabase():
+    """Database with awaitable methods, built on the asyncio support of psycopg 3.
+
+    It takes the same {"query", "query_arguments"} parameters as Database and
+    uses the same query builders. Connections come from an asyncio pool, and
+    psycopg prepares every statement on its first execution on a connection.
+    """
+
+    def __init__(self, config, pool_config=None) -> None:
+        if psycopg is None:
+            raise ImportError("The async database backend requires psycopg 3: pip install 'psycopg[binary]' psycopg_pool")
+
+        pool_config = pool_config or {}
+        self.config = config
+        # psycopg2 accepts 'database' as an alias, libpq only knows 'dbname'
+        conninfo = {('dbname' if key == 'database' else key): value for key, value in config.items()}
+        self.statements = StatementRegistry(prepare=False)
+        self.pool = AsyncConnectionPool(
+            make_conninfo(**conninfo),
+            min_size=int(pool_config.get('minconn', 1)),
+            max_size=int(pool_config.get('maxconn', 10)),
+            timeout=float(pool_config.get('timeout', 5)),
+            kwargs={"row_factory": dict_row, "prepare_threshold": 0},
+            check=AsyncConnectionPool.check_connection,
+            open=False,
+        )
+
+    async def open(self):
+        """Open the pool. Must be called from the running event loop before the first query."""
+        await self.pool.open(wait=True)
+        print('Connected to the PostgreSQL server (asyncio).')
+
+    async def close(self):
+        await self.pool.close()
+
+    async def execute(self, conn, params: dict):
+        name = params['query']
+        query, values = self.statements.build(params)
+        start = time.perf_counter()
+        cur = await conn.execute(query, values)
+        self.statements.record(name, time.perf_counter() - start)
+        return cur
+
+    async def save_data(self, params: dict):
+        """Execute query.
+
+        Args:
+            params (dict): {query: query_name, query_arguments: dict} dictionary with parameters for query.
+        """
+        async with self.pool.connection() as conn:
+            await self.execute(conn, params)
+
+    async def save_and_get_data(self, params: dict):
+        """Execute query which modifies data and returns a row, e.g. with RETURNING clause.
+
+        Args:
+            params (dict): {query: query_name, query_arguments: dict} dictionary with parameters for query.
+
+        Returns:
+            dict: first row returned by the query or None
+        """
+        async with self.pool.connection() as conn:
+            cur = await self.execute(conn, params)
+            return await cur.fetchone()
+
+    async def save_and_get_all(self, params: dict):
+        """Execute query which modifies data and returns rows, e.g. with RETURNING clause.
+
+        Args:
+            params (dict): {query: query_name, query_arguments: dict} dictionary with parameters for query.
+
+        Returns:
+            list: rows returned by the query
+        """
+        async with self.pool.connection() as conn:
+            cur = await self.execute(conn, params)
+            return await cur.fetchall()
+
+    async def get_data(self, params: dict):
+        """Get data from database.
+
+        Args:
+            params (dict): {query: query_name, query_arguments: dict} dictionary with parameters for query.
+
+        Returns:
+            list: rows
+        """
+        async with self.pool.connection() as conn:
+            cur = await self.execute(conn, params)
+            return await cur.fetchall()
+
+    async def check_data(self, params: dict):
+        """Check data if exist.
+
+        Args:
+            params (dict): {query: query_name, query_arguments: dict} dictionary with parameters for query.
+
+        Returns:
+            bool: True if exist or False if not
+        """
+        async with self.pool.connection() as conn:
+            cur = await self.execute(conn, params)
+            return await cur.fetchone() is not None
+
+    async def stream_data(self, params: dict, chunk_size=1000):
+        """Get data from database in chunks using a server-side cursor.
+
+        Args:
+            params (dict): {query: query_name, query_arguments: dict} dictionary with parameters for query.
+            chunk_size (int): number of rows in a chunk
+
+        Yields:
+            list: next chunk of rows
+        """
+        query, values = self.statements.build(params)
+
+        async with self.pool.connection() as conn:
+            async with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cur:
+                await cur.execute(query, values)
+                while rows := await cur.fetchmany(chunk_size):
+                    yield rows
@@ -0,0 +1,164 @@
+from src.message import Message
+from src.message_manager import INBOX_LIMIT, MAX_PAGE_SIZE, MessageManager
+from src.passwords import needs_rehash
+from src.user import User
+from src.user_manager import UserManager
+
+
+class AsyncUserManager(UserManager):
+    """UserManager which awaits an asyncio database, e.g. AsyncDatabase."""
+
+    async def create_account(self, session=None, **kwargs):
+        """Create account for new user. Username must be unique.
+
+        Args:
+            session (Session): session of the client
+            username (str): name of user
+            password (str): password
+            role (str): role (admin or user)
+
+        Returns:
+            dict: Dictionary with status of job (failure or success) and message.
+        """
+        username = kwargs.get('username')
+        password = kwargs.get('password')
+        role = kwargs.get('role')
+
+        if role not in ['user', 'admin']:
+            return {"status": "failure", 'message': 'Wrong role. Select user or admin.'}
+        if not isinstance(password, str) or not password:
+            return {"status": "failure", "message": "Password can't be empty."}
+
+        if await self.db.check_data({"query": "query_check_if_user_exist", "query_arguments": {"username": username}}):
+            return {"status": "failure", "message": f"User with that name already exist."}
+
+        user = User(username, await self.hasher.async_hash(password), role)
+        await self.db.save_data({"query": "query_insert_user", "query_arguments": user.__dict__})
+        return {"status": "success", "message": f"You have created new account named {username}."}
+
+    async def login(self, session, **kwargs):
+        """Log in to an account.
+
+        Args:
+            session (Session): session of the client
+            username (str): name of user
+            password (str): password
+
+        Returns:
+            dict: Dictionary with status of job (failure or success) and message.
+        """
+        username = kwargs.get('username')
+        password = kwargs.get('password')
+
+        if session.is_logged_in():
+            return {"status": "failure", "message": f"You are logged in as {session.username}."}
+
+        if not isinstance(password, str):
+            return {"status": "failure", "message": f"Invalid username or password."}
+
+        rows = await self.db.get_data({"query": "query_get_user_credentials", "query_arguments": {"username": username}})
+        user = rows[0] if rows else None
+        if await self.hasher.async_verify(username, password, user['password'] if user else None):
+            if needs_rehash(user['password']):
+                await self.db.save_data({"query": "query_update_password", "query_arguments": {
+                    "username": username, "password": await self.hasher.async_hash(password)}})
+            session.username = username
+            session.role = user['role']
+            return {"status": "success", "message": f"User {username} logged in."}
+        return {"status": "failure", "message": f"Invalid username or password."}
+
+    async def logout(self, session, **kwargs):
+        return super().logout(session, **kwargs)
+
+
+class AsyncMessageManager(MessageManager):
+    """MessageManager which awaits an asyncio database, e.g. AsyncDatabase."""
+
+    async def send_msg_to_recipient(self, session, **kwargs):
+        """Send the message and save it to the database.
+
+        Args:
+            session (Session): session of the client
+            recipient (str): name of recipient
+            msg_content (str): content of message
+
+        Returns:
+            dict: Dictionary with status of job (failure or success) and message.
+        """
+        recipient = kwargs['recipient']
+        msg_content = kwargs['msg_content']
+
+        error = self.validate_msg(session, msg_content)
+        if error is not None:
+            return error
+
+        message = Message(session.username, recipient, msg_content)
+        result = await self.db.save_and_get_data({"query": "query_send_message", "query_arguments": {**message.__dict__, 'inbox_limit': INBOX_LIMIT}})
+        if result['sent']:
+            self.notify(recipient, session.username, msg_content)
+        return self.send_result(result, recipient)
+
+    async def broadcast_msg(self, session, **kwargs):
+        """Send the message to many recipients at once.
+
+        Args:
+            session (Session): session of the client
+            recipients (list): names of recipients
+            msg_content (str): content of message
+
+        Returns:
+            dict: Dictionary with status of job (failure or success), message, sent and failed recipients.
+        """
+        recipients = kwargs.get('recipients')
+        msg_content = kwargs.get('msg_content', '')
+
+        error = self.validate_msg(session, msg_content) or self.validate_recipients(recipients)
+        if error is not None:
+            return error
+
+        results = await self.db.save_and_get_all({"query": "query_broadcast_message", "query_arguments": {
+            'sender': session.username, 'receivers': recipients, 'message': msg_content, 'inbox_limit': INBOX_LIMIT}})
+        answer = self.broadcast_result(results, recipients)
+        for recipient in answer['sent']:
+            self.notify(recipient, session.username, msg_content)
+        return answer
+
+    async def read_msg(self, session, **kwargs):
+        """Read the messages received since the last read and move the read watermark of the user past them.
+        If user is the admin, function returns messages of all users page by page or as a stream.
+
+        Args:
+            session (Session): session of the client
+            page_size (int): optional, number of messages in a page (admin only)
+            cursor (str): optional, cursor token of the next page (admin only)
+            stream (bool): optional, send all messages in chunks of page_size messages (admin only)
+
+        Returns:
+            dict: Dictionary with status of job (failure or success) and message.
+        """
+        if not session.is_logged_in():
+            return {"status": "failure", "message": "No user is currently logged in."}
+
+        user_msgs = await self.db.save_and_get_all({"query": "query_read_new_messages", "query_arguments": {'username': session.username, 'limit': MAX_PAGE_SIZE}})
+        if session.role == 'admin':
+            return await self.read_all_msgs_paginated(**kwargs)
+        if len(user_msgs) == 0:
+            return {"message": "You don't have any messages."}
+        return user_msgs
+
+    async def read_all_msgs_paginated(self, **kwargs):
+        """Read messages of all users with keyset pagination or as a stream.
+
+        Returns:
+            dict: page with messages and cursor token of the next page, async generator
+            of chunks in stream mode or dictionary with failure status and message.
+        """
+        page_size, after_id, error = self.parse_page_request(**kwargs)
+        if error is not None:
+            return error
+
+        if kwargs.get('stream'):
+            return self.db.stream_data({"query": "query_get_all_messages", "query_arguments": {}}, chunk_size=page_size)
+
+        messages = await self.db.get_data({"query": "query_get_messages_page", "query_arguments": {'after_id': after_id, 'limit': page_size}})
+        return self.page_result(messages, page_size)
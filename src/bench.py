@@ -0,0 +1,266 @@
+import asyncio
+import itertools
+import json
+import random
+import threading
+import time
+from src.client import AsyncConnection
+from src.server import Server
+
+COMMANDS = ("signup", "login", "send", "read")
+DEFAULT_MIX = {"signup": 5, "login": 10, "send": 50, "read": 35}
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of the samples (nearest-rank)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def parse_mix(text):
+    """Parse a command mix like 'send=50,read=35,login=10,signup=5'.
+
+    Returns:
+        dict: {command: weight}
+    """
+    mix = {}
+    for part in text.split(','):
+        command, _, weight = part.partition('=')
+        command = command.strip()
+        if command not in COMMANDS:
+            raise ValueError(f"Unknown command {command} in the mix, use {', '.join(COMMANDS)}.")
+        mix[command] = float(weight or 1)
+    return mix
+
+
+class ServerThread:
+    """Server running in a background thread of the benchmark process."""
+
+    def __init__(self, config, **server_kwargs) -> None:
+        self.server = Server("127.0.0.1", 0, "bench", config, **server_kwargs)
+        self.thread = threading.Thread(target=self.server.start_server, daemon=True)
+
+    def start(self, timeout=10.0):
+        """Start the server and wait until it listens.
+
+        Args:
+            timeout (float): seconds to wait for the listening socket
+
+        Raises:
+            RuntimeError: the server stopped before it listened, e.g. the database is unreachable
+            TimeoutError: the server didn't listen within the timeout
+        """
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while getattr(self.server, 'listener', None) is None:
+            if not self.thread.is_alive():
+                raise RuntimeError("The benchmark server stopped before it started listening.")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"The benchmark server didn't start listening within {timeout} s.")
+            time.sleep(0.01)
+        self.port = self.server.listener.sockets[0].getsockname()[1]
+        return self
+
+    def query_count(self):
+        """Number of database queries run by the server so far."""
+        return sum(stats["count"] for stats in self.server.db.statements.get_stats().values())
+
+    def stop(self):
+        async def send_stop():
+            async with AsyncConnection(port=self.port) as conn:
+                await conn.request("stop")
+
+        asyncio.run(send_stop())
+        self.thread.join()
+
+
+class SimulatedClient:
+    """Client with its own account, which sends commands picked from the mix."""
+
+    def __init__(self, port, username, peers, rng) -> None:
+        self.port = port
+        self.username = username
+        self.peers = peers
+        self.rng = rng
+        self.signups = itertools.count()
+
+    async def start(self):
+        self.conn = await AsyncConnection(port=self.port).connect()
+        await self.conn.request("signup", username=self.username, password="bench", role="user")
+        await self.conn.request("login", username=self.username, password="bench")
+        return self
+
+    async def close(self):
+        await self.conn.close()
+
+    async def run_command(self, command):
+        """Send the command and measure its latency.
+
+        Returns:
+            tuple: latency in seconds and True if the server answered with a failure
+        """
+        if command == "login":
+            # logout isn't measured, it only makes the next login possible
+            await self.conn.request("logout")
+            request = {"username": self.username, "password": "bench"}
+        elif command == "signup":
+            request = {"username": f"{self.username}_{next(self.signups)}", "password": "bench", "role": "user"}
+        elif command == "send":
+            request = {"recipient": self.rng.choice(self.peers), "msg_content": "benchmark message"}
+        else:
+            request = {}
+
+        start = time.perf_counter()
+        answer = await self.conn.request(command, **request)
+        failed = isinstance(answer, dict) and answer.get("status") == "failure"
+        return time.perf_counter() - start, failed
+
+
+class Benchmark:
+    """Load generator which drives a server with many concurrent simulated clients.
+
+    Args:
+        server (ServerThread): running server
+        clients (int): number of concurrent clients
+        requests (int): number of requests sent by every client
+        mix (dict): {command: weight} of the sent commands
+        pipeline (int): requests a client keeps in flight
+        seed (int): seed of the random choice of commands
+    """
+
+    def __init__(self, server, clients=50, requests=200, mix=None, pipeline=1, seed=1) -> None:
+        self.server = server
+        self.clients = clients
+        self.requests = requests
+        self.mix = mix or DEFAULT_MIX
+        self.pipeline = pipeline
+        self.seed = seed
+        # users of every run get a new prefix, so the benchmark can run against a database with data
+        self.prefix = f"bench{int(time.time() * 1000) % 10 ** 8}"
+
+    async def calibrate(self, client, repeat=20):
+        """Count the database queries of every command, sending it alone from a single client.
+
+        Returns:
+            dict: {command: queries per request}
+        """
+        queries = {}
+        for command in self.mix:
+            before = self.server.query_count()
+            for _ in range(repeat):
+                await client.run_command(command)
+            queries[command] = (self.server.query_count() - before) / repeat
+        return queries
+
+    async def run_client(self, client, latencies, failures):
+        commands = list(self.mix)
+        weights = list(self.mix.values())
+        semaphore = asyncio.Semaphore(self.pipeline)
+
+        async def measured(command):
+            async with semaphore:
+                elapsed, failed = await client.run_command(command)
+            latencies[command].append(elapsed)
+            failures[command] += failed
+
+        # with pipeline > 1 commands sent between the logout and the login of a 'login' command can fail,
+        # they are counted as failures
+        await asyncio.gather(*[measured(command) for command in client.rng.choices(commands, weights, k=self.requests)])
+
+    async def run_async(self):
+        rng = random.Random(self.seed)
+        names = [f"{self.prefix}_{i}" for i in range(self.clients)]
+        simulated = [SimulatedClient(self.server.port, name, names, random.Random(rng.random())) for name in names]
+
+        start = time.perf_counter()
+        await asyncio.gather(*[client.start() for client in simulated])
+        setup_time = time.perf_counter() - start
+
+        queries_per_command = await self.calibrate(simulated[0])
+
+        latencies = {command: [] for command in self.mix}
+        failures = {command: 0 for command in self.mix}
+        queries_before = self.server.query_count()
+        start = time.perf_counter()
+        await asyncio.gather(*[self.run_client(client, latencies, failures) for client in simulated])
+        elapsed = time.perf_counter() - start
+        queries = self.server.query_count() - queries_before
+
+        await asyncio.gather(*[client.close() for client in simulated])
+        return self.report(latencies, failures, queries_per_command, elapsed, queries, setup_time)
+
+    def run(self):
+        return asyncio.run(self.run_async())
+
+    def report(self, latencies, failures, queries_per_command, elapsed, queries, setup_time):
+        """Build the machine-readable results, times in milliseconds."""
+        total = sum(len(samples) for samples in latencies.values())
+        commands = {}
+        for command, samples in latencies.items():
+            commands[command] = {
+                "requests": len(samples),
+                "failures": failures[command],
+                "throughput": len(samples) / elapsed,
+                "p50_ms": percentile(samples, 50) * 1000,
+                "p90_ms": percentile(samples, 90) * 1000,
+                "p99_ms": percentile(samples, 99) * 1000,
+                "max_ms": max(samples, default=0.0) * 1000,
+                "queries_per_request": queries_per_command[command],
+            }
+        return {
+            "settings": {"clients": self.clients, "requests": self.requests, "mix": self.mix,
+                         "pipeline": self.pipeline, "seed": self.seed},
+            "setup_time_s": setup_time,
+            "total": {"requests": total, "elapsed_s": elapsed, "throughput": total / elapsed,
+                      "queries": queries, "queries_per_request": queries / total if total else 0.0},
+            "commands": commands,
+        }
+
+
+def print_report(results):
+    total = results["total"]
+    print(f"{results['settings']['clients']} clients, {total['requests']} requests in {total['elapsed_s']:.2f} s")
+    print(f"throughput: {total['throughput']:.1f} requests/s, {total['queries_per_request']:.2f} queries/request")
+    print(f"{'command':<8} {'req/s':>10} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'queries':>8} {'failures':>9}")
+    for command, stats in results["commands"].items():
+        print(f"{command:<8} {stats['throughput']:>10.1f} {stats['p50_ms']:>8.2f} {stats['p90_ms']:>8.2f} "
+              f"{stats['p99_ms']:>8.2f} {stats['max_ms']:>8.2f} {stats['queries_per_request']:>8.2f} {stats['failures']:>9}")
+
+
+def compare(results, baseline, tolerance=0.1):
+    """Compare the results with a saved baseline.
+
+    Args:
+        results (dict): results of the current run
+        baseline (dict): results of an earlier run
+        tolerance (float): allowed relative drop of throughput or rise of p99 latency and queries per request
+
+    Returns:
+        list: descriptions of the regressions, empty if there are none
+    """
+    regressions = []
+    pairs = [("total", results["total"], baseline["total"])]
+    pairs += [(command, stats, baseline["commands"][command])
+              for command, stats in results["commands"].items() if command in baseline["commands"]]
+
+    for name, current, previous in pairs:
+        if current["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['throughput']:.1f} < {previous['throughput']:.1f} requests/s")
+        if "p99_ms" in current and current["p99_ms"] > previous["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {current['p99_ms']:.2f} > {previous['p99_ms']:.2f} ms")
+        if "queries_per_request" in current and current["queries_per_request"] > previous["queries_per_request"] * (1 + tolerance):
+            regressions.append(f"{name}: {current['queries_per_request']:.2f} > {previous['queries_per_request']:.2f} queries/request")
+    return regressions
+
+
+def save_results(results, filename):
+    with open(filename, 'w') as file:
+        json.dump(results, file, indent=2)
+
+
+def load_results(filename):
+    with open(filename) as file:
+        return json.load(file)
@@ -1,14 +1,438 @@
+import asyncio
+import itertools
 import socket
-import json
+from collections import deque
+from src.protocol import JSON, Codec, FrameReader, encode_msg, read_msg
+
+# chunks of a stream kept while the asyncio consumer is behind, then the reader waits for it
+STREAM_QUEUE_SIZE = 8
+
+
+class StreamError(Exception):
+    """Raised when the server answers a streamed request with a failure, e.g. the stream broke in the middle."""
+
+
+def end_of_stream(answer):
+    """Check the answer closing a stream.
+
+    Args:
+        answer: answer of the server to the streamed request
+
+    Returns:
+        list: chunks which are left to yield, an answer which wasn't streamed (e.g. the inbox of a user) is a single chunk
+
+    Raises:
+        StreamError: the server answered with a failure
+    """
+    if isinstance(answer, list):
+        return [answer]
+    if not isinstance(answer, dict):
+        raise StreamError(answer)
+    if answer.get('status') == 'failure':
+        raise StreamError(answer.get('message'))
+    return []
+
+
+class Connection:
+    """Programmatic connection to the server, without the interactive prompt.
+
+    Requests are tagged with an id, so many of them can be sent before the answers
+    are read and the server can answer them out of order. Commands which change
+    the session (login, logout, stop) are answered in order by the server.
+    Events pushed after 'subscribe' are kept until they are taken with next_event().
+    Streamed answers are read chunk by chunk with stream().
+    """
+
+    def __init__(self, host="127.0.0.1", port=65432, timeout=None) -> None:
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.reader = None
+        self.ids = itertools.count(1)
+        # login of the user on this connection, replayed by the client pools on new connections
+        self.credentials = None
+        # answers read while waiting for another request
+        self.results = {}
+        # rows of unfinished streams of buffered requests
+        self.streams = {}
+        # chunks of the streams iterated with stream() which weren't taken yet
+        self.live_streams = {}
+        # streams whose iteration was stopped early, their remaining frames are skipped
+        self.abandoned = set()
+        self.events = deque()
+        self.codec = JSON
+
+    def connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.reader = FrameReader(self.sock, codec=self.codec)
+        return self
+
+    def hello(self, codec='json', compression=None, columnar=False):
+        """Agree with the server on the serialization of the connection, right after connecting
+        or while no other request is in flight.
+
+        Args:
+            codec (str): json or msgpack
+            compression (str): None, zlib or zstd, only large frames are compressed
+            columnar (bool): send lists of rows as tables with the keys sent once
+
+        Returns:
+            dict: answer of the server, the connection keeps its codec if it failed
+        """
+        new_codec = Codec(codec, compression, columnar)
+        answer = self.request("hello", codec=codec, compression=compression, columnar=columnar)
+        if isinstance(answer, dict) and answer.get('status') == 'success':
+            # frames after the answer are only decoded when they are read, so none was decoded with the old codec
+            self.codec = self.reader.codec = new_codec
+        return answer
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, command, buffered=False, **kwargs):
+        """Send the request without waiting for the answer.
+
+        Args:
+            command (str): name of the command
+            buffered (bool): collect the rows of a streamed answer under the 'items' key of the
+                frame closing the stream, otherwise they are skipped, see stream()
+            kwargs: arguments of the command
+
+        Returns:
+            int: id of the request, used to get the answer with result()
+        """
+        request_id = next(self.ids)
+        self.sock.sendall(self.codec.encode_msg({"command": command, **kwargs, "request_id": request_id}))
+        if buffered:
+            self.streams[request_id] = []
+        return request_id
+
+    def read_next(self):
+        """Read the next frame and keep it with the answers. Chunks of a stream are handed
+        to stream() or collected until the frame closing the stream for buffered requests."""
+        msg = self.reader.read_msg()
+        if msg is None:
+            raise ConnectionError("Connection closed by the server.")
+
+        request_id = msg.get('request_id') if isinstance(msg, dict) else None
+        if request_id is None and isinstance(msg, dict) and 'event' in msg:
+            self.events.append(msg['event'])
+        elif request_id is None:
+            self.results[None] = msg
+        elif 'stream' in msg:
+            if request_id in self.live_streams:
+                self.live_streams[request_id].append(msg['stream'])
+            elif request_id in self.streams:
+                self.streams[request_id].extend(msg['stream'])
+        elif request_id in self.abandoned:
+            self.abandoned.discard(request_id)
+        else:
+            answer = msg['response']
+            items = self.streams.pop(request_id, None)
+            if items is not None and isinstance(answer, dict) and answer.get('end_of_stream'):
+                answer = {**answer, "items": items}
+            self.results[request_id] = answer
+
+    def result(self, request_id):
+        """Wait for the answer of the request.
+
+        Returns:
+            Answer of the server. A streamed answer is the frame closing the stream,
+            with all received rows under the 'items' key if the request was buffered.
+        """
+        while request_id not in self.results:
+            self.read_next()
+        return self.results.pop(request_id)
+
+    def request(self, command, buffered=False, **kwargs):
+        """Send the request and wait for its answer, see submit()."""
+        return self.result(self.submit(command, buffered, **kwargs))
+
+    def stream(self, command, **kwargs):
+        """Send the request and yield the chunks of the streamed answer as they arrive, so only
+        the chunks which weren't taken yet are kept in memory. Answers of other requests read
+        in the meantime are kept for result().
+
+        Args:
+            command (str): name of the command
+            kwargs: arguments of the command, e.g. stream=True and page_size of 'read'
+
+        Yields:
+            list: rows of a chunk
+
+        Raises:
+            StreamError: the server answered with a failure
+        """
+        request_id = self.submit(command, **kwargs)
+        chunks = self.live_streams[request_id] = deque()
+        answer = None
+        try:
+            while request_id not in self.results:
+                if chunks:
+                    yield chunks.popleft()
+                else:
+                    self.read_next()
+            answer = self.results.pop(request_id)
+            while chunks:
+                yield chunks.popleft()
+            yield from end_of_stream(answer)
+        finally:
+            del self.live_streams[request_id]
+            if answer is None:
+                # left before the end, the rest of the stream is still on its way
+                self.abandoned.add(request_id)
+
+    def next_event(self):
+        """Wait for the next event pushed by the server, answers read in the meantime are kept.
+
+        Returns:
+            dict: event, e.g. {"type": "message", "sender_name": ..., "message": ...}
+        """
+        while not self.events:
+            self.read_next()
+        return self.events.popleft()
+
+    def pipeline(self, requests):
+        """Send all requests at once, then collect their answers.
+
+        Args:
+            requests (list): dictionaries with the command and its arguments
+
+        Returns:
+            list: answers in the order of the requests
+        """
+        request_ids = [self.submit(**request) for request in requests]
+        return [self.result(request_id) for request_id in request_ids]
+
+    def batch(self, requests):
+        """Send the requests in a single frame. The server runs them one after another
+        and sends all answers in a single frame.
+
+        Args:
+            requests (list): dictionaries with the command and its arguments
+
+        Returns:
+            list: answers in the order of the requests
+        """
+        self.sock.sendall(self.codec.encode_msg(requests))
+        while None not in self.results:
+            self.read_next()
+        return self.results.pop(None)
+
+
+class AsyncConnection:
+    """Connection to the server for asyncio programs.
+
+    A background task reads the answers and hands them to the waiting requests,
+    so any number of requests can be in flight on a single connection. Events
+    pushed after 'subscribe' are queued for next_event(). Streamed answers are
+    read chunk by chunk with stream().
+    """
+
+    def __init__(self, host="127.0.0.1", port=65432, timeout=None) -> None:
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.writer = None
+        self.reader_task = None
+        self.ids = itertools.count(1)
+        # login of the user on this connection, replayed by the client pools on new connections
+        self.credentials = None
+        self.pending = {}
+        # rows of unfinished streams of buffered requests
+        self.streams = {}
+        # queues of the chunks of the streams iterated with stream()
+        self.live_streams = {}
+        self.events = asyncio.Queue()
+        self.codec = JSON
+        # codecs requested with 'hello', switched to by the reader as soon as the answer arrives
+        self.codec_requests = {}
+
+    async def connect(self):
+        reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        self.reader_task = asyncio.create_task(self.read_answers(reader))
+        return self
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+            await asyncio.gather(self.reader_task, return_exceptions=True)
+            self.reader_task = None
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @property
+    def closed(self):
+        return self.writer is None or self.reader_task is None or self.reader_task.done()
+
+    async def read_answers(self, reader):
+        closed_error = ConnectionError("Connection closed.")
+        try:
+            while (msg := await read_msg(reader, self.codec)) is not None:
+                request_id = msg.get('request_id') if isinstance(msg, dict) else None
+                if request_id is None:
+                    if isinstance(msg, dict) and 'event' in msg:
+                        self.events.put_nowait(msg['event'])
+                    continue
+                if 'stream' in msg:
+                    if request_id in self.live_streams:
+                        # waits while the consumer is behind, TCP flow control slows the server down
+                        await self.live_streams[request_id].put(msg['stream'])
+                    elif request_id in self.streams:
+                        self.streams[request_id].extend(msg['stream'])
+                    continue
+                answer = msg['response']
+                items = self.streams.pop(request_id, None)
+                if items is not None and isinstance(answer, dict) and answer.get('end_of_stream'):
+                    answer = {**answer, "items": items}
+                if request_id in self.live_streams:
+                    await self.live_streams[request_id].put(None)
+                codec = self.codec_requests.pop(request_id, None)
+                if codec is not None and isinstance(answer, dict) and answer.get('status') == 'success':
+                    self.codec = codec
+                future = self.pending.pop(request_id, None)
+                if future is not None and not future.done():
+                    future.set_result(answer)
+        except Exception as error:
+            closed_error = ConnectionError(f"Connection lost: {error}")
+        finally:
+            # the waiting requests fail instead of waiting for their timeout
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(closed_error)
+            self.pending.clear()
+            # a full queue has chunks left, its consumer finds the failed request once they are taken
+            for chunks in self.live_streams.values():
+                if not chunks.full():
+                    chunks.put_nowait(None)
+
+    async def request(self, command, buffered=False, **kwargs):
+        """Send the request and wait for its answer, other requests can be sent in the meantime.
+
+        Args:
+            command (str): name of the command
+            buffered (bool): collect the rows of a streamed answer under the 'items' key of the
+                frame closing the stream, otherwise they are skipped, see stream()
+            kwargs: arguments of the command
+
+        Returns:
+            Answer of the server. A streamed answer is the frame closing the stream,
+            with all received rows under the 'items' key if the request was buffered.
+        """
+        return await self.send_request({"command": command, **kwargs}, buffered=buffered)
+
+    async def stream(self, command, **kwargs):
+        """Send the request and yield the chunks of the streamed answer as they arrive. At most
+        STREAM_QUEUE_SIZE chunks are kept, then the reader waits until the consumer takes them.
+
+        Args:
+            command (str): name of the command
+            kwargs: arguments of the command, e.g. stream=True and page_size of 'read'
+
+        Yields:
+            list: rows of a chunk
+
+        Raises:
+            StreamError: the server answered with a failure
+        """
+        if self.closed:
+            raise ConnectionError("Connection is closed.")
+
+        request_id = next(self.ids)
+        future = self.pending[request_id] = asyncio.get_running_loop().create_future()
+        chunks = self.live_streams[request_id] = asyncio.Queue(STREAM_QUEUE_SIZE)
+        try:
+            self.writer.write(self.codec.encode_msg({"command": command, **kwargs, "request_id": request_id}))
+            await self.writer.drain()
+            while not (chunks.empty() and future.done()):
+                rows = await asyncio.wait_for(chunks.get(), self.timeout)
+                if rows is None:
+                    break
+                yield rows
+            for rows in end_of_stream(await future):
+                yield rows
+        finally:
+            self.pending.pop(request_id, None)
+            del self.live_streams[request_id]
+            # frees the reader if it waits for room in the queue of a stream left before its end
+            while not chunks.empty():
+                chunks.get_nowait()
+
+    async def send_request(self, request, codec=None, buffered=False):
+        """Send the request with a new id and wait for its answer.
+
+        Args:
+            request (dict): command and its arguments
+            codec (Codec): codec used for the frames after a successful answer
+            buffered (bool): collect the rows of a streamed answer
+        """
+        if self.closed:
+            raise ConnectionError("Connection is closed.")
+
+        request_id = next(self.ids)
+        future = self.pending[request_id] = asyncio.get_running_loop().create_future()
+        if codec is not None:
+            self.codec_requests[request_id] = codec
+        if buffered:
+            self.streams[request_id] = []
+        try:
+            self.writer.write(self.codec.encode_msg({**request, "request_id": request_id}))
+            await self.writer.drain()
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            self.pending.pop(request_id, None)
+            self.streams.pop(request_id, None)
+            self.codec_requests.pop(request_id, None)
+
+    async def hello(self, codec='json', compression=None, columnar=False):
+        """Agree with the server on the serialization of the connection, right after connecting
+        or while no other request is in flight.
+
+        Args:
+            codec (str): json or msgpack
+            compression (str): None, zlib or zstd, only large frames are compressed
+            columnar (bool): send lists of rows as tables with the keys sent once
+
+        Returns:
+            dict: answer of the server, the connection keeps its codec if it failed
+        """
+        request = {"command": "hello", "codec": codec, "compression": compression, "columnar": columnar}
+        return await self.send_request(request, Codec(codec, compression, columnar))
+
+    async def next_event(self):
+        """Wait for the next event pushed by the server.
+
+        Returns:
+            dict: event, e.g. {"type": "message", "sender_name": ..., "message": ...}
+        """
+        return await asyncio.wait_for(self.events.get(), self.timeout)
+
 
 class Client:
-    def __init__(self) -> None:
-        self.host = "127.0.0.1"
-        self.port = 65432 
+    def __init__(self, host="127.0.0.1", port=65432) -> None:
+        self.host = host
+        self.port = int(port)
         self.commands = {
                 "signup": ["username", "password", "role"],
                 "login": ["username", "password"],
                 "send": ["recipient", "msg_content"],
+                "broadcast": ["recipients", "msg_content"],
             }
 
     def get_user_input(self):
@@ -21,6 +445,9 @@ class Client:
         if command in self.commands.keys():
             for option in self.commands[command]:
                 user_input[option] = input(f">>> {option}: ").strip()
+            # recipients of a broadcast are entered separated by commas
+            if 'recipients' in user_input:
+                user_input['recipients'] = [name.strip() for name in user_input['recipients'].split(',') if name.strip()]
 
         return user_input
 
@@ -28,20 +455,45 @@ class Client:
         print("Connected to the server.")
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
             s.connect((self.host, self.port))
+            reader = FrameReader(s)
+            next_page = None
 
             while True:
-                # get information from user
-                msg = self.get_user_input()
+                # get information from user, or the next page of the admin's read
+                msg = next_page or self.get_user_input()
+                next_page = None
                 # send data to server
-                s.sendall(json.dumps(msg).encode('utf-8'))
+                s.sendall(encode_msg(msg))
                 # get server response
-                server_response = json.loads(s.recv(1024).decode('utf-8'))
-            
-                if server_response == 'stop':
+                server_response = reader.read_msg()
+
+                # messages pushed after 'subscribe' arrived while waiting for the input
+                while isinstance(server_response, dict) and 'event' in server_response:
+                    event = server_response['event']
+                    print(f"\nNew message from {event.get('sender_name')}: {event.get('message')}")
+                    server_response = reader.read_msg()
+
+                # streamed answers come in chunks closed by a frame marked with 'end_of_stream'
+                while isinstance(server_response, dict) and 'stream' in server_response:
+                    for item in server_response['stream']:
+                        print()
+                        for key, value in item.items():
+                            print(f'{key}: {value}')
+                    server_response = reader.read_msg()
+
+                if server_response is None or server_response == 'stop':
                     print("The server has been closed.")
                     break
                 else:
-                    if isinstance(server_response, dict):
+                    if isinstance(server_response, dict) and 'next_cursor' in server_response:
+                        # the admin reads all messages page by page
+                        for item in server_response['messages']:
+                            print()
+                            for key, value in item.items():
+                                print(f'{key}: {value}')
+                        if server_response['next_cursor'] is not None and input("\nShow the next page? [y/N]: ").strip().lower() == 'y':
+                            next_page = {"command": "read", "cursor": server_response['next_cursor']}
+                    elif isinstance(server_response, dict):
                         print()
                         for key, value in server_response.items():
                             print(f'{key}: {value}')
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import deque
+import psycopg2
+from src.statements import PreparedConnection
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the acquire timeout."""
+
+
+class ConnectionPool:
+    """Thread-safe pool of PostgreSQL connections.
+
+    Connections are created lazily up to maxconn. Idle connections which weren't
+    used for health_check_interval seconds are checked with a cheap query before
+    they are handed out, and broken connections are replaced with new ones.
+    """
+
+    def __init__(self, config, minconn=1, maxconn=10, timeout=5, health_check_interval=30) -> None:
+        self.config = config
+        self.minconn = int(minconn)
+        self.maxconn = int(maxconn)
+        self.timeout = float(timeout)
+        self.health_check_interval = float(health_check_interval)
+        self.idle = deque()
+        self.size = 0
+        self.lock = threading.Condition()
+
+        for _ in range(self.minconn):
+            self.idle.append((self.connect(), time.monotonic()))
+            self.size += 1
+        print(f'Created a pool of PostgreSQL connections (min: {self.minconn}, max: {self.maxconn}).')
+
+    def connect(self):
+        """Open a new connection to the PostgreSQL database server."""
+        return psycopg2.connect(**self.config, connection_factory=PreparedConnection)
+
+    def is_healthy(self, conn, last_used):
+        """Check if the connection can still be used.
+
+        Args:
+            conn: psycopg2 connection
+            last_used (float): time when the connection was returned to the pool
+
+        Returns:
+            bool: True/False
+        """
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def acquire(self):
+        """Take a connection from the pool, opening a new one if needed.
+
+        Returns:
+            psycopg2 connection
+
+        Raises:
+            PoolTimeout: if all connections are in use for longer than the timeout
+        """
+        deadline = time.monotonic() + self.timeout
+
+        while True:
+            with self.lock:
+                while not self.idle and self.size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"No database connection available within {self.timeout} seconds.")
+                    self.lock.wait(remaining)
+
+                if self.idle:
+                    conn, last_used = self.idle.pop()
+                else:
+                    conn, last_used = None, None
+                    self.size += 1
+
+            if conn is None:
+                try:
+                    return self.connect()
+                except psycopg2.Error:
+                    self.discard(None)
+                    raise
+
+            if self.is_healthy(conn, last_used):
+                return conn
+            # the connection is broken, replace it and try again
+            self.discard(conn)
+
+    def release(self, conn):
+        """Return the connection to the pool."""
+        if conn.closed:
+            self.discard(conn)
+            return
+        with self.lock:
+            self.idle.append((conn, time.monotonic()))
+            self.lock.notify()
+
+    def discard(self, conn):
+        """Close the connection and free its place in the pool."""
+        if conn is not None and not conn.closed:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+        with self.lock:
+            self.size -= 1
+            self.lock.notify()
+
+    def close(self):
+        """Close all idle connections."""
+        with self.lock:
+            while self.idle:
+                conn, _ = self.idle.pop()
+                conn.close()
+                self.size -= 1
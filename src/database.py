@@ -1,34 +1,121 @@
+from contextlib import contextmanager
+import threading
+import uuid
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from src.connection_pool import ConnectionPool
+from src.statements import PreparedConnection, StatementRegistry
+from src.storage import StorageEngine
 
-class Database():
-    def __init__(self, config) -> None:
-        self.config = config 
-        self.conn = self.connect(config)
+class Database(StorageEngine):
+    """PostgreSQL storage engine, which runs the queries from src/queries.py."""
+
+    def __init__(self, config, pool_config=None, prepare_statements=True) -> None:
+        self.config = config
+        self.statements = StatementRegistry(prepare_statements)
+        self.pool = ConnectionPool(config, **pool_config) if pool_config else None
+        self.conn = None if self.pool else self.connect(config)
+        # without a pool, threads take turns on the shared connection so their transactions don't mix
+        self.lock = threading.RLock()
 
     def connect(self, config):
         """ Connect to the PostgreSQL database server """
         try:
             # connecting to the PostgreSQL server
-            with psycopg2.connect(**config) as conn:
+            with psycopg2.connect(**config, connection_factory=PreparedConnection) as conn:
                 print('Connected to the PostgreSQL server.')
                 return conn
         except (psycopg2.DatabaseError, Exception) as error:
             print(error)
-            
+
+    @contextmanager
+    def connection(self, exclusive=False):
+        """Provide a connection for a single query.
+
+        In pooled mode the connection is taken from the pool and returned afterwards,
+        otherwise the shared connection is used and reopened if it was lost.
+        A failed query is rolled back, so the connection stays usable.
+
+        Args:
+            exclusive (bool): open a dedicated connection instead of the shared one,
+                for work which keeps a transaction open while other queries run
+        """
+        if self.pool is not None:
+            conn = self.pool.acquire()
+        elif exclusive:
+            conn = psycopg2.connect(**self.config, connection_factory=PreparedConnection)
+        else:
+            self.lock.acquire()
+            if self.conn is None or self.conn.closed:
+                self.conn = self.connect(self.config)
+            conn = self.conn
+
+        try:
+            if conn is None:
+                raise psycopg2.OperationalError("Can't connect to the PostgreSQL server.")
+            yield conn
+        except psycopg2.Error:
+            if conn is not None and not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            if self.pool is not None:
+                self.pool.release(conn)
+            elif exclusive:
+                conn.close()
+            else:
+                self.lock.release()
+
+    def close(self):
+        """Close all connections to the database."""
+        if self.pool is not None:
+            self.pool.close()
+        elif self.conn is not None:
+            self.conn.close()
+
     def save_data(self, params:dict):
- 
+
         """Execute query.
 
         Args:
             query (string): query
         """
-        import src.queries as queries
-        query, values = getattr(queries, params['query'])(params['query_arguments'])
+        with self.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                self.statements.execute(cur, params)
+                conn.commit()
+
+    def save_and_get_data(self, params: dict):
+        """Execute query which modifies data and returns a row, e.g. with RETURNING clause.
+
+        Args:
+            params (dict): {query: query_name, query_arguments: dict} dictionary with parameters for query.
+
+        Returns:
+            dict: first row returned by the query or None
+        """
+        with self.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                self.statements.execute(cur, params)
+                data = cur.fetchone()
+                conn.commit()
+        return data
+
+    def save_and_get_all(self, params: dict):
+        """Execute query which modifies data and returns rows, e.g. with RETURNING clause.
 
-        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(query, values)
-            self.conn.commit()
+        Args:
+            params (dict): {query: query_name, query_arguments: dict} dictionary with parameters for query.
+
+        Returns:
+            list: rows returned by the query
+        """
+        with self.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                self.statements.execute(cur, params)
+                data = cur.fetchall()
+                conn.commit()
+        return data
 
     def get_data(self, params: dict):
         """Get data from database.
@@ -39,19 +126,13 @@ class Database():
         Returns:
             _type_: data
         """
-        import src.queries as queries
-
-        if params['query'] == "query_get_all_messages":
-            query, values = getattr(queries, params['query'])()
-        else:
-            query, values = getattr(queries, params['query'])(params['query_arguments'])
-
-        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(query, values)
-            data = cur.fetchall()
-            cur.close()
+        with self.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                self.statements.execute(cur, params)
+                data = cur.fetchall()
+            conn.commit()
         return data
-    
+
     def check_data(self, params: dict):
         """Check data if exist.
 
@@ -62,13 +143,34 @@ class Database():
         Returns:
             bool: True if exist or False if not
         """
-        import src.queries as queries
+        with self.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                self.statements.execute(cur, params)
+                data = cur.fetchone()
+            conn.commit()
+        return data is not None
 
-        query, values = getattr(queries, params['query'])(params['query_arguments'])
+    def stream_data(self, params: dict, chunk_size=1000):
+        """Get data from database in chunks using a server-side cursor, so the whole result is never kept in memory.
 
-        with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(query, values)
-            data = cur.fetchone()
+        Args:
+            params (dict): {query: query_name, query_arguments: dict} dictionary with parameters for query.
+            chunk_size (int): number of rows in a chunk
 
-            cur.close()
-        return data is not None
+        Yields:
+            list: next chunk of rows
+        """
+        with self.connection(exclusive=True) as conn:
+            try:
+                with conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=RealDictCursor) as cur:
+                    cur.itersize = chunk_size
+                    self.statements.execute(cur, params)
+                    while rows := cur.fetchmany(chunk_size):
+                        yield rows
+                conn.commit()
+            except BaseException:
+                # also when the stream is closed early, e.g. the client disconnected,
+                # so the connection doesn't go back to the pool idle in transaction
+                if not conn.closed:
+                    conn.rollback()
+                raise
@@ -0,0 +1,191 @@
+import bisect
+import itertools
+import json
+import threading
+import zlib
+from datetime import datetime, timezone
+from src.storage import StorageEngine
+
+
+class MemoryDatabase(StorageEngine):
+    """Storage engine keeping users and messages in memory, for tests and small deployments.
+
+    Reads don't take any lock. Records are never modified in place, a writer
+    builds a new record and swaps it in, and message lists are only appended to
+    or replaced by new lists when messages are archived, so a reader always sees
+    a complete record. Writers are serialized by a lock,
+    which keeps checks like the inbox limit atomic.
+    """
+
+    def __init__(self, config=None, pool_config=None) -> None:
+        super().__init__()
+        self.users = {}
+        # all messages ordered by msg_id and the index of messages of every recipient
+        self.messages = []
+        self.inbox = {}
+        # archived messages in batches of zlib compressed JSON
+        self.archive = []
+        self.user_ids = itertools.count(1)
+        self.msg_ids = itertools.count(1)
+        self.archive_ids = itertools.count(1)
+        self.write_lock = threading.Lock()
+
+    def add_message(self, sender, receiver, message):
+        """Append the message, the caller holds the write lock."""
+        sender_record = self.users.get(sender)
+        row = {
+            "msg_id": next(self.msg_ids),
+            "sender_id": sender_record['user_id'] if sender_record else None,
+            "sender_name": sender,
+            "receiver_id": self.users[receiver]['user_id'],
+            "receiver_name": receiver,
+            "message": message,
+            "created_at": datetime.now(timezone.utc),
+        }
+        self.messages.append(row)
+        self.inbox.setdefault(row['receiver_id'], []).append(row)
+
+    def query_insert_user(self, arguments: dict):
+        with self.write_lock:
+            username = arguments['username']
+            if username in self.users:
+                raise ValueError(f"User {username} already exists.")
+            self.users[username] = {
+                "user_id": next(self.user_ids),
+                "username": username,
+                "password": arguments['password'],
+                "role": arguments['role'],
+                "unread_msgs": arguments['unread_msgs'],
+                "last_read_msg_id": 0,
+            }
+        return []
+
+    def query_insert_message(self, arguments: dict):
+        with self.write_lock:
+            if arguments['receiver'] in self.users:
+                self.add_message(arguments['sender'], arguments['receiver'], arguments['message'])
+        return []
+
+    def query_send_message(self, arguments: dict):
+        receiver = arguments['receiver']
+        with self.write_lock:
+            record = self.users.get(receiver)
+            if record is None:
+                return [{"recipient_exists": False, "sent": False}]
+            if record['unread_msgs'] >= arguments['inbox_limit']:
+                return [{"recipient_exists": True, "sent": False}]
+
+            self.users[receiver] = {**record, "unread_msgs": record['unread_msgs'] + 1}
+            self.add_message(arguments['sender'], receiver, arguments['message'])
+        return [{"recipient_exists": True, "sent": True}]
+
+    def query_send_messages(self, arguments: dict):
+        return [self.query_send_message({'sender': sender, 'receiver': receiver, 'message': message, 'inbox_limit': arguments['inbox_limit']})[0]
+                for sender, receiver, message in zip(arguments['senders'], arguments['receivers'], arguments['messages'])]
+
+    def query_broadcast_message(self, arguments: dict):
+        rows = []
+        with self.write_lock:
+            for receiver in dict.fromkeys(arguments['receivers']):
+                record = self.users.get(receiver)
+                sent = record is not None and record['unread_msgs'] < arguments['inbox_limit']
+                if sent:
+                    self.users[receiver] = {**record, "unread_msgs": record['unread_msgs'] + 1}
+                    self.add_message(arguments['sender'], receiver, arguments['message'])
+                rows.append({"recipient": receiver, "recipient_exists": record is not None, "sent": sent})
+        return rows
+
+    def query_check_if_user_exist(self, arguments: dict):
+        record = self.users.get(arguments['username'])
+        return [] if record is None else [{"user_id": record['user_id']}]
+
+    def query_get_user_data(self, arguments: dict):
+        record = self.users.get(arguments['username'])
+        return [] if record is None else [dict(record)]
+
+    def query_get_user_credentials(self, arguments: dict):
+        record = self.users.get(arguments['username'])
+        return [] if record is None else [{key: record[key] for key in ("username", "password", "role")}]
+
+    def query_update_password(self, arguments: dict):
+        with self.write_lock:
+            record = self.users.get(arguments['username'])
+            if record is not None:
+                self.users[arguments['username']] = {**record, "password": arguments['password']}
+        return []
+
+    def query_get_user_messages(self, arguments: dict):
+        record = self.users.get(arguments['receiver'])
+        if record is None:
+            return []
+        return [{"sender_name": row['sender_name'], "message": row['message']}
+                for row in self.inbox.get(record['user_id'], [])[:]]
+
+    def query_read_new_messages(self, arguments: dict):
+        username = arguments['username']
+        with self.write_lock:
+            record = self.users.get(username)
+            if record is None:
+                return []
+            inbox = self.inbox.get(record['user_id'], [])
+            start = bisect.bisect_right(inbox, record['last_read_msg_id'], key=lambda row: row['msg_id'])
+            rows = inbox[start:start + arguments['limit']]
+            if rows:
+                self.users[username] = {**record, "last_read_msg_id": rows[-1]['msg_id'],
+                                        "unread_msgs": max(record['unread_msgs'] - len(rows), 0)}
+        return [{"sender_name": row['sender_name'], "message": row['message']} for row in rows]
+
+    def query_get_all_messages(self, arguments: dict = None):
+        return [{"sender_name": row['sender_name'], "receiver_name": row['receiver_name'], "message": row['message']}
+                for row in self.messages[:]]
+
+    def query_get_messages_page(self, arguments: dict):
+        messages = self.messages[:]
+        start = bisect.bisect_right(messages, arguments['after_id'], key=lambda row: row['msg_id'])
+        return [{"msg_id": row['msg_id'], "sender_name": row['sender_name'],
+                 "receiver_name": row['receiver_name'], "message": row['message']}
+                for row in messages[start:start + arguments['limit']]]
+
+    def query_update_unread_msgs(self, arguments: dict):
+        username = arguments['username']
+        with self.write_lock:
+            record = self.users.get(username)
+            if record is not None:
+                self.users[username] = {**record, "unread_msgs": arguments['unread_msgs']}
+        return []
+
+    def query_archive_messages(self, arguments: dict):
+        with self.write_lock:
+            moved = []
+            for row in self.messages:
+                # ids grow with the time of sending, the scan stops at the first message which is kept
+                if row['created_at'] >= arguments['cutoff'] or len(moved) >= arguments['limit']:
+                    break
+                if row['msg_id'] <= self.users[row['receiver_name']]['last_read_msg_id']:
+                    moved.append(row)
+            if not moved:
+                return [{"archived": 0}]
+
+            self.archive.append({
+                "archive_id": next(self.archive_ids),
+                "first_msg_id": moved[0]['msg_id'],
+                "last_msg_id": moved[-1]['msg_id'],
+                "message_count": len(moved),
+                "archived_at": datetime.now(timezone.utc),
+                "messages": zlib.compress(json.dumps([{**row, "created_at": row['created_at'].isoformat()} for row in moved]).encode('utf-8')),
+            })
+            moved_ids = {row['msg_id'] for row in moved}
+            self.messages = [row for row in self.messages if row['msg_id'] not in moved_ids]
+            for receiver_id in {row['receiver_id'] for row in moved}:
+                self.inbox[receiver_id] = [row for row in self.inbox[receiver_id] if row['msg_id'] not in moved_ids]
+        return [{"archived": len(moved)}]
+
+    def query_purge_archive(self, arguments: dict):
+        with self.write_lock:
+            purged = [batch for batch in self.archive if batch['archived_at'] < arguments['cutoff']]
+            self.archive = [batch for batch in self.archive if batch['archived_at'] >= arguments['cutoff']]
+        return [{"purged": sum(batch['message_count'] for batch in purged)}]
+
+    def query_maintain_partitions(self, arguments: dict):
+        # messages aren't partitioned in memory
+        return [{"created": 0, "dropped": 0}]
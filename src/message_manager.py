@@ -1,14 +1,41 @@
+import base64
+import binascii
 from src.message import Message
 
+INBOX_LIMIT = 5
+MAX_PAGE_SIZE = 1000
+MAX_BROADCAST_RECIPIENTS = 1000
+
+
+def encode_cursor(msg_id):
+    """Encode the id of the last returned message as an opaque cursor token."""
+    return base64.urlsafe_b64encode(str(msg_id).encode('utf-8')).decode('utf-8')
+
+
+def decode_cursor(cursor):
+    """Decode the cursor token to the id of the last returned message.
+
+    Returns:
+        int: message id or None if the token is invalid
+    """
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode('utf-8')).decode('utf-8'))
+    except (AttributeError, ValueError, binascii.Error):
+        return None
+
+
 class MessageManager():
 
-    def __init__(self, database, user_manager) -> None:
+    def __init__(self, database, user_manager, notifier=None) -> None:
         self.db = database
         self.user_manager = user_manager
+        # pushes delivered messages to the subscribed recipients
+        self.notifier = notifier
 
-    def send_msg_to_recipient(self, **kwargs):
+    def send_msg_to_recipient(self, session, **kwargs):
         """Send the message and save it to the database. The message must be less than 250 characters and the recipient's inbox cannot be full.
         Args:
+            session (Session): session of the client
             recipient (str): name of recipient
             msg_content (str): content of message
         
@@ -17,49 +44,173 @@ class MessageManager():
         """
         recipient = kwargs['recipient']
         msg_content = kwargs['msg_content']
-        
-        if not self.user_manager.is_logged_in():
+
+        error = self.validate_msg(session, msg_content)
+        if error is not None:
+            return error
+
+        # check the recipient, update the inbox and save the message in a single statement
+        message = Message(session.username, recipient, msg_content)
+        result = self.db.save_and_get_data({"query": "query_send_message", "query_arguments": {**message.__dict__, 'inbox_limit': INBOX_LIMIT}})
+        if result['sent']:
+            self.notify(recipient, session.username, msg_content)
+        return self.send_result(result, recipient)
+
+    def broadcast_msg(self, session, **kwargs):
+        """Send the message to many recipients at once. Recipients are checked, their inboxes
+        updated and all messages saved with a single statement.
+
+        Args:
+            session (Session): session of the client
+            recipients (list): names of recipients
+            msg_content (str): content of message
+
+        Returns:
+            dict: Dictionary with status of job (failure or success), message and the recipients
+            which got the message and the ones which didn't, with the reason.
+        """
+        recipients = kwargs.get('recipients')
+        msg_content = kwargs.get('msg_content', '')
+
+        error = self.validate_msg(session, msg_content) or self.validate_recipients(recipients)
+        if error is not None:
+            return error
+
+        results = self.db.save_and_get_all({"query": "query_broadcast_message", "query_arguments": {
+            'sender': session.username, 'receivers': recipients, 'message': msg_content, 'inbox_limit': INBOX_LIMIT}})
+        answer = self.broadcast_result(results, recipients)
+        for recipient in answer['sent']:
+            self.notify(recipient, session.username, msg_content)
+        return answer
+
+    def validate_recipients(self, recipients):
+        """Check the recipients of a broadcast.
+
+        Returns:
+            dict: Dictionary with failure status and message or None if the recipients are valid.
+        """
+        if not isinstance(recipients, list) or not recipients or not all(isinstance(name, str) for name in recipients):
+            return {"status": "failure", "message": "Recipients must be a non-empty list of names."}
+        if len(recipients) > MAX_BROADCAST_RECIPIENTS:
+            return {"status": "failure", "message": f"A message can be sent to at most {MAX_BROADCAST_RECIPIENTS} recipients."}
+        return None
+
+    def broadcast_result(self, results, recipients):
+        """Translate the rows returned by query_broadcast_message to the answer for the client."""
+        results = {row['recipient']: row for row in results}
+        sent = []
+        failed = {}
+        for recipient in dict.fromkeys(recipients):
+            row = results[recipient]
+            if row['sent']:
+                sent.append(recipient)
+            elif not row['recipient_exists']:
+                failed[recipient] = "There is no such user."
+            else:
+                failed[recipient] = "Inbox is full."
+
+        return {"status": "success" if sent else "failure",
+                "message": f"The message has been sent to {len(sent)} of {len(sent) + len(failed)} recipients.",
+                "sent": sent, "failed": failed}
+
+    def notify(self, recipient, sender, msg_content):
+        """Push the delivered message to the recipient if it is subscribed. The message is
+        already committed, so a client which reads after the event always finds it."""
+        if self.notifier is not None:
+            self.notifier.publish(recipient, {"type": "message", "sender_name": sender, "message": msg_content})
+
+    def validate_msg(self, session, msg_content):
+        """Check if the message can be sent.
+
+        Returns:
+            dict: Dictionary with failure status and message or None if the message is valid.
+        """
+        if not session.is_logged_in():
             return {"status": "failure", "message": "No user is currently logged in."}
         if len(msg_content) > 255:
             return {"status": "failure", "message": "Message is to long."}
-        
-        if self.db.check_data({"query": "query_check_if_user_exist", "query_arguments": {"username": recipient}}) == False:
-            return {"status": "failure", "message": f"There is no such user like {recipient}."}
-        
-        user = self.db.get_data({"query": "query_get_user_data", "query_arguments": {"username": recipient}})[0]
-        unread_msgs = user['unread_msgs']
-        if unread_msgs >= 5:
-                    return {"status": "failure", "message": "Inbox is full."}        
+        return None
 
-        # save message
-        message = Message(self.user_manager.get_logged_in_user(), recipient, msg_content)
-        self.db.save_data({"query": "query_insert_message", "query_arguments": message.__dict__})
-
-        # update inbox
-        unread_msgs = unread_msgs + 1
-        self.db.save_data({"query": "query_update_unread_msgs", "query_arguments": {'unread_msgs': unread_msgs, 'username': recipient}})
+    def send_result(self, result, recipient):
+        """Translate the row returned by query_send_message to the answer for the client."""
+        if not result['recipient_exists']:
+            return {"status": "failure", "message": f"There is no such user like {recipient}."}
+        if not result['sent']:
+            return {"status": "failure", "message": "Inbox is full."}
 
         return {"status": "success", "message": f"The message has been sent to {recipient}."}
 
     
-    def read_msg(self, **kwargs):
-        """Read the message and update user inbox. If user is the admin, function prints messages of all users.
+    def read_msg(self, session, **kwargs):
+        """Read the messages received since the last read and move the read watermark of the user past them.
+        If user is the admin, function returns messages of all users page by page, pages have
+        MAX_PAGE_SIZE messages by default, or as a stream of chunks.
+
+        Args:
+            session (Session): session of the client
+            page_size (int): optional, number of messages in a page (admin only)
+            cursor (str): optional, cursor token of the next page returned with the previous page (admin only)
+            stream (bool): optional, send all messages in chunks of page_size messages (admin only)
 
         Returns:
             dict: Dictionary with status of job (failure or success) and message.
         """
-        if not self.user_manager.is_logged_in():
+        if not session.is_logged_in():
             return {"status": "failure", "message": "No user is currently logged in."}
         
-        user_msgs = self.db.get_data({"query": "query_get_user_messages", "query_arguments": {'receiver': self.user_manager.get_logged_in_user()}})
-        print(user_msgs)
-        if len(user_msgs) == 0 and self.user_manager.get_logged_in_role() == 'user':
+        # only messages above the watermark are fetched, so the cost doesn't grow with the history
+        user_msgs = self.db.save_and_get_all({"query": "query_read_new_messages", "query_arguments": {'username': session.username, 'limit': MAX_PAGE_SIZE}})
+        if session.role == 'admin':
+            # all messages at once would outgrow the frame size limit
+            return self.read_all_msgs_paginated(**kwargs)
+        if len(user_msgs) == 0:
             return {"message": "You don't have any messages."}
-        else:
-            self.db.save_data({"query": "query_update_unread_msgs", "query_arguments": {'unread_msgs': 0, 'username': self.user_manager.get_logged_in_user()}})
+        return user_msgs
 
-            if self.user_manager.get_logged_in_role() == 'admin':
-                messages = self.db.get_data({"query": "query_get_all_messages", "query_arguments": {}})
-                return messages
-            else:
-                return user_msgs
\ No newline at end of file
+    def read_all_msgs_paginated(self, **kwargs):
+        """Read messages of all users with keyset pagination or as a stream.
+
+        Args:
+            page_size (int): number of messages in a page or a chunk of the stream
+            cursor (str): cursor token of the next page, first page if not given
+            stream (bool): return a generator of chunks instead of a single page
+
+        Returns:
+            dict: page with messages and cursor token of the next page (None on the last page),
+            generator of chunks in stream mode or dictionary with failure status and message.
+        """
+        page_size, after_id, error = self.parse_page_request(**kwargs)
+        if error is not None:
+            return error
+
+        if kwargs.get('stream'):
+            return self.db.stream_data({"query": "query_get_all_messages", "query_arguments": {}}, chunk_size=page_size)
+
+        messages = self.db.get_data({"query": "query_get_messages_page", "query_arguments": {'after_id': after_id, 'limit': page_size}})
+        return self.page_result(messages, page_size)
+
+    def parse_page_request(self, **kwargs):
+        """Validate page size and cursor of a paginated read.
+
+        Returns:
+            tuple: page size, id of the last message of the previous page and failure dictionary or None
+        """
+        page_size = kwargs.get('page_size')
+        if page_size is None:
+            page_size = MAX_PAGE_SIZE
+        # JSON true and false arrive as bool, which is a subclass of int
+        if isinstance(page_size, bool) or not isinstance(page_size, int) or not 0 < page_size <= MAX_PAGE_SIZE:
+            return None, None, {"status": "failure", "message": f"Page size must be a number from 1 to {MAX_PAGE_SIZE}."}
+
+        after_id = 0
+        if kwargs.get('cursor') is not None:
+            after_id = decode_cursor(kwargs['cursor'])
+            if after_id is None:
+                return None, None, {"status": "failure", "message": "Invalid cursor."}
+
+        return page_size, after_id, None
+
+    def page_result(self, messages, page_size):
+        """Build the page answer with the cursor token of the next page (None on the last page)."""
+        next_cursor = encode_cursor(messages[-1]['msg_id']) if len(messages) == page_size else None
+        return {"messages": messages, "next_cursor": next_cursor}
\ No newline at end of file
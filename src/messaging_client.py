@@ -0,0 +1,353 @@
+import asyncio
+import queue
+import threading
+import time
+from src.client import AsyncConnection, Connection
+
+BUSY = {"status": "failure", "message": "Server is busy. Try again later."}
+NOT_LOGGED_IN = {"status": "failure", "message": "No user is currently logged in."}
+# commands which can be sent again if the connection broke before their answer arrived;
+# 'read' moves the read watermark, messages of a lost answer wouldn't be returned again
+RETRIED_COMMANDS = {"uptime", "info", "help", "login"}
+DEFAULT_CODEC = {"codec": "json", "compression": None, "columnar": False}
+
+
+class LoginError(Exception):
+    """Raised when the remembered login is rejected on a new connection, e.g. after a password change."""
+
+
+class ClientCommands:
+    """Typed commands of the server, shared by the sync and the asyncio client.
+
+    Every method returns the answer of the server, a coroutine in the asyncio client.
+    """
+
+    def signup(self, username, password, role='user'):
+        return self.call("signup", username=username, password=password, role=role)
+
+    def login(self, username, password):
+        return self.call("login", username=username, password=password)
+
+    def logout(self):
+        return self.call("logout")
+
+    def send(self, recipient, msg_content):
+        return self.call("send", recipient=recipient, msg_content=msg_content)
+
+    def broadcast(self, recipients, msg_content):
+        return self.call("broadcast", recipients=list(recipients), msg_content=msg_content)
+
+    def read(self, page_size=None, cursor=None, stream=False):
+        """Read the inbox, the admin can read messages of all users page by page or as a stream.
+
+        A streamed read returns an iterator of chunks of messages, an asynchronous
+        iterator in the asyncio client, see stream().
+        """
+        kwargs = {key: value for key, value in [("page_size", page_size), ("cursor", cursor)] if value is not None}
+        if stream:
+            return self.stream("read", stream=True, **kwargs)
+        return self.call("read", **kwargs)
+
+    def uptime(self):
+        return self.call("uptime")
+
+    def info(self):
+        return self.call("info")
+
+    def help(self):
+        return self.call("help")
+
+
+class MessagingClient(ClientCommands):
+    """Client library for programs, with a pool of persistent connections.
+
+    The server keeps the login in the session of a connection, so the client
+    remembers the credentials and logs in on every pooled connection before using
+    it. Requests which failed because of a broken connection or a busy server are
+    retried with exponential backoff. Commands which change data are only retried
+    if they couldn't be sent at all. Every new connection asks for the codec of the
+    client with 'hello', a server which doesn't support it keeps talking JSON.
+    """
+
+    def __init__(self, host="127.0.0.1", port=65432, pool_size=4, timeout=5.0, retries=2, retry_delay=0.1,
+                 codec='json', compression=None, columnar=False) -> None:
+        self.host = host
+        self.port = int(port)
+        self.pool_size = int(pool_size)
+        self.timeout = float(timeout)
+        self.retries = int(retries)
+        self.retry_delay = float(retry_delay)
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.lock = threading.Lock()
+        self.credentials = None
+        self.codec = {"codec": codec, "compression": compression, "columnar": columnar}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def acquire(self):
+        """Take an idle connection or open a new one if the pool isn't full yet."""
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self.lock:
+            can_create = self.created < self.pool_size
+            if can_create:
+                self.created += 1
+        if not can_create:
+            try:
+                return self.idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No connection available within {self.timeout} s.")
+
+        try:
+            conn = Connection(self.host, self.port, self.timeout).connect()
+            if self.codec != DEFAULT_CODEC:
+                conn.hello(**self.codec)
+            return conn
+        except BaseException:
+            with self.lock:
+                self.created -= 1
+            raise
+
+    def release(self, conn):
+        self.idle.put(conn)
+
+    def discard(self, conn):
+        conn.close()
+        with self.lock:
+            self.created -= 1
+
+    def close(self):
+        """Close the idle connections."""
+        while True:
+            try:
+                self.discard(self.idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def prepare(self, conn, credentials):
+        """Log the connection in as the user of the client, or out if nobody is logged in."""
+        if conn.credentials == credentials:
+            return
+        if conn.credentials is not None:
+            conn.request("logout")
+            conn.credentials = None
+        if credentials is not None:
+            answer = conn.request("login", **credentials)
+            if answer.get("status") != "success":
+                raise LoginError(answer.get("message"))
+            conn.credentials = credentials
+
+    def call(self, command, **kwargs):
+        """Send the command on a pooled connection and return the answer.
+
+        Args:
+            command (str): name of the command
+            kwargs: arguments of the command
+
+        Returns:
+            Answer of the server.
+        """
+        # a new login replaces the current one, so the connection is logged out first
+        credentials = None if command == "login" else self.credentials
+        for attempt in range(self.retries + 1):
+            sent = False
+            conn = None
+            try:
+                conn = self.acquire()
+                self.prepare(conn, credentials)
+                sent = True
+                answer = conn.request(command, **kwargs)
+                if answer == NOT_LOGGED_IN and conn.credentials is not None:
+                    # the session expired on the server while the connection was idle
+                    conn.credentials = None
+                    self.prepare(conn, credentials)
+                    answer = conn.request(command, **kwargs)
+            except LoginError:
+                self.release(conn)
+                raise
+            except OSError:
+                # ConnectionError and socket timeouts, the connection can't be trusted anymore
+                if conn is not None:
+                    self.discard(conn)
+                if attempt == self.retries or (sent and command not in RETRIED_COMMANDS):
+                    raise
+            else:
+                self.after(conn, command, kwargs, answer)
+                self.release(conn)
+                if answer != BUSY or attempt == self.retries:
+                    return answer
+            time.sleep(self.retry_delay * 2 ** attempt)
+
+    def stream(self, command, **kwargs):
+        """Send the command on a pooled connection and yield the chunks of the streamed answer
+        as they arrive. The connection is kept until the stream ends, a stream isn't retried.
+
+        Args:
+            command (str): name of the command
+            kwargs: arguments of the command
+
+        Yields:
+            list: rows of a chunk
+        """
+        conn = self.acquire()
+        try:
+            self.prepare(conn, self.credentials)
+            yield from conn.stream(command, **kwargs)
+        except OSError:
+            self.discard(conn)
+            raise
+        except BaseException:
+            # a stream left before its end is skipped by the connection
+            self.release(conn)
+            raise
+        self.release(conn)
+
+    def after(self, conn, command, kwargs, answer):
+        """Remember the login or logout of the user."""
+        if not isinstance(answer, dict) or answer.get("status") != "success":
+            return
+        if command == "login":
+            conn.credentials = self.credentials = {"username": kwargs["username"], "password": kwargs["password"]}
+        elif command == "logout":
+            conn.credentials = self.credentials = None
+
+
+class AsyncMessagingClient(ClientCommands):
+    """Client library for asyncio programs.
+
+    Requests are pipelined on a small set of persistent connections, which are
+    used in turns, so many requests can be in flight at once. Login, retries and
+    backoff work the same way as in MessagingClient.
+    """
+
+    def __init__(self, host="127.0.0.1", port=65432, pool_size=4, timeout=5.0, retries=2, retry_delay=0.1,
+                 codec='json', compression=None, columnar=False) -> None:
+        self.host = host
+        self.port = int(port)
+        self.pool_size = int(pool_size)
+        self.timeout = float(timeout)
+        self.retries = int(retries)
+        self.retry_delay = float(retry_delay)
+        self.connections = [None] * self.pool_size
+        self.locks = [asyncio.Lock() for _ in range(self.pool_size)]
+        self.next_slot = 0
+        self.credentials = None
+        self.codec = {"codec": codec, "compression": compression, "columnar": columnar}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        for slot, conn in enumerate(self.connections):
+            if conn is not None:
+                await conn.close()
+                self.connections[slot] = None
+
+    async def acquire(self, credentials):
+        """Get the next connection in turn, opened and logged in as the given user.
+
+        Returns:
+            tuple: slot of the connection in the pool and the connection
+        """
+        slot = self.next_slot
+        self.next_slot = (self.next_slot + 1) % self.pool_size
+
+        # the lock keeps concurrent requests from opening or logging in the same connection twice
+        async with self.locks[slot]:
+            conn = self.connections[slot]
+            if conn is None or conn.closed:
+                conn = self.connections[slot] = await AsyncConnection(self.host, self.port, self.timeout).connect()
+                if self.codec != DEFAULT_CODEC:
+                    await conn.hello(**self.codec)
+            if conn.credentials != credentials:
+                if conn.credentials is not None:
+                    await conn.request("logout")
+                    conn.credentials = None
+                if credentials is not None:
+                    answer = await conn.request("login", **credentials)
+                    if answer.get("status") != "success":
+                        raise LoginError(answer.get("message"))
+                    conn.credentials = credentials
+        return slot, conn
+
+    async def discard(self, slot, conn):
+        await conn.close()
+        if self.connections[slot] is conn:
+            self.connections[slot] = None
+
+    async def call(self, command, **kwargs):
+        """Send the command on a pooled connection and return the answer.
+
+        Args:
+            command (str): name of the command
+            kwargs: arguments of the command
+
+        Returns:
+            Answer of the server.
+        """
+        # a new login replaces the current one, so the connection is logged out first
+        credentials = None if command == "login" else self.credentials
+        for attempt in range(self.retries + 1):
+            sent = False
+            slot = conn = None
+            try:
+                slot, conn = await self.acquire(credentials)
+                sent = True
+                answer = await conn.request(command, **kwargs)
+                if answer == NOT_LOGGED_IN and conn.credentials is not None:
+                    # the session expired on the server while the connection was idle
+                    conn.credentials = None
+                    slot, conn = await self.acquire(credentials)
+                    answer = await conn.request(command, **kwargs)
+            except (OSError, asyncio.TimeoutError):
+                if conn is not None:
+                    await self.discard(slot, conn)
+                if attempt == self.retries or (sent and command not in RETRIED_COMMANDS):
+                    raise
+            else:
+                self.after(conn, command, kwargs, answer)
+                if answer != BUSY or attempt == self.retries:
+                    return answer
+            await asyncio.sleep(self.retry_delay * 2 ** attempt)
+
+    async def stream(self, command, **kwargs):
+        """Send the command on a pooled connection and yield the chunks of the streamed answer
+        as they arrive. Other requests can use the connection in the meantime, a stream isn't retried.
+
+        Args:
+            command (str): name of the command
+            kwargs: arguments of the command
+
+        Yields:
+            list: rows of a chunk
+        """
+        slot, conn = await self.acquire(self.credentials)
+        chunks = conn.stream(command, **kwargs)
+        try:
+            async for rows in chunks:
+                yield rows
+        except (OSError, asyncio.TimeoutError):
+            await self.discard(slot, conn)
+            raise
+        finally:
+            await chunks.aclose()
+
+    def after(self, conn, command, kwargs, answer):
+        """Remember the login or logout of the user."""
+        if not isinstance(answer, dict) or answer.get("status") != "success":
+            return
+        if command == "login":
+            conn.credentials = self.credentials = {"username": kwargs["username"], "password": kwargs["password"]}
+        elif command == "logout":
+            conn.credentials = self.credentials = None
@@ -0,0 +1,201 @@
+import bisect
+import time
+
+# upper bounds of the latency buckets in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Counts of observed values in fixed buckets, in the same form as a Prometheus histogram."""
+
+    def __init__(self, buckets=BUCKETS) -> None:
+        self.buckets = buckets
+        # the last count is the +Inf bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate the quantile as the upper bound of the bucket it falls into.
+
+        Returns:
+            float: upper bound in seconds, the largest bound for values above all buckets, 0.0 without values
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def to_dict(self):
+        return {"counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+    def merge(self, data):
+        """Add the counts of another histogram with the same buckets, given by to_dict."""
+        self.counts = [count + other for count, other in zip(self.counts, data["counts"])]
+        self.sum += data["sum"]
+        self.count += data["count"]
+
+    def cumulative(self):
+        """Cumulative counts per upper bound, including +Inf."""
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class Metrics:
+    """Counters of the requests answered by the server.
+
+    Everything is recorded on the event loop thread, so the counters aren't locked.
+    Unknown commands are counted under a single name, which keeps the number of series bounded.
+    """
+
+    def __init__(self, commands) -> None:
+        self.commands = set(commands)
+        self.requests = {}
+        self.errors = {}
+        self.latency = {}
+        self.active_connections = 0
+        self.connections = 0
+        self.start_time = time.time()
+
+    def connection_opened(self):
+        self.active_connections += 1
+        self.connections += 1
+
+    def connection_closed(self):
+        self.active_connections -= 1
+
+    def observe(self, command, elapsed, answer):
+        """Record the answered request.
+
+        Args:
+            command (str): name of the command
+            elapsed (float): time to answer in seconds
+            answer: answer of the handler, a failure dictionary or 'Wrong command' counts as an error
+        """
+        if command not in self.commands:
+            command = 'unknown'
+        histogram = self.latency.get(command)
+        if histogram is None:
+            histogram = self.latency[command] = Histogram()
+            self.requests[command] = 0
+            self.errors[command] = 0
+        histogram.observe(elapsed)
+        self.requests[command] += 1
+        if answer == 'Wrong command' or (isinstance(answer, dict) and answer.get('status') == 'failure'):
+            self.errors[command] += 1
+
+    def snapshot(self):
+        """Get the counters as plain data, which can be sent to another process and merged."""
+        return {"requests": dict(self.requests), "errors": dict(self.errors),
+                "latency": {command: histogram.to_dict() for command, histogram in self.latency.items()},
+                "active_connections": self.active_connections, "connections": self.connections,
+                "start_time": self.start_time}
+
+    @classmethod
+    def merge(cls, snapshots):
+        """Add up the counters of several servers, e.g. the worker processes of a supervisor.
+
+        Args:
+            snapshots: counters returned by snapshot()
+
+        Returns:
+            Metrics: sum of the counters, started when the first server started
+        """
+        metrics = cls(())
+        for snapshot in snapshots:
+            for command, data in snapshot["latency"].items():
+                if command not in metrics.latency:
+                    metrics.latency[command] = Histogram()
+                    metrics.requests[command] = 0
+                    metrics.errors[command] = 0
+                metrics.latency[command].merge(data)
+                metrics.requests[command] += snapshot["requests"][command]
+                metrics.errors[command] += snapshot["errors"][command]
+            metrics.active_connections += snapshot["active_connections"]
+            metrics.connections += snapshot["connections"]
+            metrics.start_time = min(metrics.start_time, snapshot["start_time"])
+        return metrics
+
+    def get_stats(self):
+        """Get the request counters.
+
+        Returns:
+            dict: connections and {command: requests, errors, mean, p50, p99 in milliseconds}
+        """
+        commands = {}
+        for command, histogram in self.latency.items():
+            commands[command] = {
+                "requests": self.requests[command],
+                "errors": self.errors[command],
+                "mean_ms": histogram.sum / histogram.count * 1000,
+                "p50_ms": histogram.quantile(0.5) * 1000,
+                "p99_ms": histogram.quantile(0.99) * 1000,
+            }
+        return {"active_connections": self.active_connections, "connections": self.connections, "commands": commands}
+
+    def render_prometheus(self, db_stats=None, cache_stats=None, gauges=None):
+        """Render the metrics in the Prometheus text format.
+
+        Args:
+            db_stats (dict): statement counters, see StatementRegistry.get_stats
+            cache_stats (dict): user cache counters, see UserCache.get_stats
+            gauges (dict): other values as {name: (help, value)}
+
+        Returns:
+            str: metrics page
+        """
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{labels} {value}")
+
+        metric("server_requests_total", "counter", "Requests answered per command.",
+               [(f'{{command="{command}"}}', count) for command, count in self.requests.items()])
+        metric("server_request_errors_total", "counter", "Requests answered with a failure per command.",
+               [(f'{{command="{command}"}}', count) for command, count in self.errors.items()])
+
+        samples = []
+        for command, histogram in self.latency.items():
+            for bound, count in histogram.cumulative():
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                samples.append((f'_bucket{{command="{command}",le="{le}"}}', count))
+            samples.append((f'_sum{{command="{command}"}}', histogram.sum))
+            samples.append((f'_count{{command="{command}"}}', histogram.count))
+        metric("server_request_duration_seconds", "histogram", "Time to answer a request per command.", samples)
+
+        metric("server_active_connections", "gauge", "Connected clients.", [("", self.active_connections)])
+        metric("server_connections_total", "counter", "Accepted connections.", [("", self.connections)])
+        metric("server_start_time_seconds", "gauge", "Start time of the server since the epoch.", [("", self.start_time)])
+
+        if db_stats is not None:
+            metric("server_db_queries_total", "counter", "Executed database queries per query.",
+                   [(f'{{query="{query}"}}', stats["count"]) for query, stats in db_stats.items()])
+            metric("server_db_query_seconds_total", "counter", "Time spent in database queries per query.",
+                   [(f'{{query="{query}"}}', stats["total_time"]) for query, stats in db_stats.items()])
+            metric("server_db_query_max_seconds", "gauge", "Longest database query per query.",
+                   [(f'{{query="{query}"}}', stats["max_time"]) for query, stats in db_stats.items()])
+
+        if cache_stats is not None:
+            metric("server_user_cache_hits_total", "counter", "User lookups answered from the cache.", [("", cache_stats["hits"])])
+            metric("server_user_cache_misses_total", "counter", "User lookups sent to the database.", [("", cache_stats["misses"])])
+            metric("server_user_cache_size", "gauge", "Cached user records.", [("", cache_stats["size"])])
+
+        for name, (help_text, value) in (gauges or {}).items():
+            metric(name, "gauge", help_text, [("", value)])
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,231 @@
+MIGRATIONS = [
+    (1, "Create users and messages tables", """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id SERIAL PRIMARY KEY,
+            username VARCHAR(255) NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            role VARCHAR(5) NOT NULL,
+            unread_msgs INTEGER NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS messages (
+            msg_id SERIAL PRIMARY KEY,
+            sender_name VARCHAR(255) NOT NULL,
+            receiver_name VARCHAR(255) NOT NULL,
+            message VARCHAR(255)
+        );
+        """),
+    (2, "Add username index, user id foreign keys and created_at to messages", """
+        CREATE UNIQUE INDEX IF NOT EXISTS users_username_key ON users (username);
+
+        ALTER TABLE messages
+            ADD COLUMN IF NOT EXISTS sender_id INTEGER REFERENCES users (user_id),
+            ADD COLUMN IF NOT EXISTS receiver_id INTEGER REFERENCES users (user_id),
+            ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+        UPDATE messages SET sender_id = users.user_id
+        FROM users WHERE users.username = messages.sender_name AND messages.sender_id IS NULL;
+
+        UPDATE messages SET receiver_id = users.user_id
+        FROM users WHERE users.username = messages.receiver_name AND messages.receiver_id IS NULL;
+
+        CREATE INDEX IF NOT EXISTS messages_receiver_id_idx ON messages (receiver_id, msg_id);
+        """),
+    (3, "Add the last read message watermark to users", """
+        ALTER TABLE users ADD COLUMN IF NOT EXISTS last_read_msg_id INTEGER NOT NULL DEFAULT 0;
+
+        -- the newest unread_msgs messages of every user stay unread
+        UPDATE users SET last_read_msg_id = ranked.msg_id
+        FROM (
+            SELECT receiver_id, msg_id, row_number() OVER (PARTITION BY receiver_id ORDER BY msg_id DESC) AS position
+            FROM messages
+        ) ranked
+        WHERE ranked.receiver_id = users.user_id AND ranked.position = users.unread_msgs + 1;
+        """),
+    (4, "Keep the unread counters consistent when messages are deleted", """
+        UPDATE users SET unread_msgs = 0 WHERE unread_msgs < 0;
+        ALTER TABLE users ADD CONSTRAINT users_unread_msgs_check CHECK (unread_msgs >= 0);
+
+        -- unread messages leave the inbox with a single update per statement, whatever deletes them
+        CREATE OR REPLACE FUNCTION messages_unread_on_delete() RETURNS trigger AS $$
+        BEGIN
+            UPDATE users SET unread_msgs = GREATEST(users.unread_msgs - deleted.count, 0)
+            FROM (
+                SELECT old_messages.receiver_id, count(*) AS count
+                FROM old_messages
+                JOIN users ON users.user_id = old_messages.receiver_id
+                WHERE old_messages.msg_id > users.last_read_msg_id
+                GROUP BY old_messages.receiver_id
+            ) deleted
+            WHERE users.user_id = deleted.receiver_id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER messages_unread_on_delete AFTER DELETE ON messages
+        REFERENCING OLD TABLE AS old_messages
+        FOR EACH STATEMENT EXECUTE FUNCTION messages_unread_on_delete();
+        """),
+    (5, "Partition messages by msg_id ranges and add the message archive", """
+        -- the existing table becomes the partition of all ids given so far, its rows aren't copied
+        DROP TRIGGER IF EXISTS messages_unread_on_delete ON messages;
+        ALTER TABLE messages RENAME TO messages_legacy;
+        ALTER INDEX messages_pkey RENAME TO messages_legacy_pkey;
+        ALTER INDEX messages_receiver_id_idx RENAME TO messages_legacy_receiver_id_idx;
+        ALTER SEQUENCE messages_msg_id_seq OWNED BY NONE;
+
+        CREATE TABLE messages (
+            msg_id INTEGER NOT NULL DEFAULT nextval('messages_msg_id_seq'),
+            sender_name VARCHAR(255) NOT NULL,
+            receiver_name VARCHAR(255) NOT NULL,
+            message VARCHAR(255),
+            sender_id INTEGER REFERENCES users (user_id),
+            receiver_id INTEGER REFERENCES users (user_id),
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (msg_id)
+        ) PARTITION BY RANGE (msg_id);
+        ALTER SEQUENCE messages_msg_id_seq OWNED BY messages.msg_id;
+        CREATE INDEX messages_receiver_id_idx ON messages (receiver_id, msg_id);
+
+        DO $$
+        BEGIN
+            EXECUTE format('ALTER TABLE messages ATTACH PARTITION messages_legacy FOR VALUES FROM (MINVALUE) TO (%s)',
+                           (SELECT CASE WHEN is_called THEN last_value + 1 ELSE last_value END FROM messages_msg_id_seq));
+        END $$;
+        -- catches new ids until maintain_message_partitions created their range
+        CREATE TABLE messages_default PARTITION OF messages DEFAULT;
+
+        CREATE TRIGGER messages_unread_on_delete AFTER DELETE ON messages
+        REFERENCING OLD TABLE AS old_messages
+        FOR EACH STATEMENT EXECUTE FUNCTION messages_unread_on_delete();
+
+        -- archived messages are kept in batches, the JSON of a batch is compressed by TOAST
+        CREATE TABLE IF NOT EXISTS messages_archive (
+            archive_id SERIAL PRIMARY KEY,
+            first_msg_id INTEGER NOT NULL,
+            last_msg_id INTEGER NOT NULL,
+            message_count INTEGER NOT NULL,
+            archived_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            messages JSONB NOT NULL
+        );
+
+        -- creates the partitions of the next ids ahead of time and drops the partitions
+        -- of past ids which the archiver emptied
+        CREATE OR REPLACE FUNCTION maintain_message_partitions(partition_size INTEGER, partitions_ahead INTEGER,
+                                                               OUT created INTEGER, OUT dropped INTEGER) AS $$
+        DECLARE
+            next_id BIGINT;
+            upper_bound BIGINT;
+            part RECORD;
+            not_empty BOOLEAN;
+        BEGIN
+            created := 0;
+            dropped := 0;
+            -- another server is maintaining the partitions
+            IF NOT pg_try_advisory_xact_lock(4242002) THEN
+                RETURN;
+            END IF;
+
+            SELECT CASE WHEN is_called THEN last_value + 1 ELSE last_value END INTO next_id FROM messages_msg_id_seq;
+            SELECT max(substring(pg_get_expr(c.relpartbound, c.oid) FROM 'TO \\((\\d+)\\)')::BIGINT) INTO upper_bound
+            FROM pg_inherits JOIN pg_class c ON c.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = 'messages'::regclass;
+            -- ids which landed in the default partition stay there
+            upper_bound := GREATEST(upper_bound, (SELECT max(msg_id) + 1 FROM messages_default), next_id);
+            WHILE upper_bound < next_id + partition_size::BIGINT * partitions_ahead LOOP
+                EXECUTE format('CREATE TABLE %I PARTITION OF messages FOR VALUES FROM (%s) TO (%s)',
+                               'messages_' || upper_bound, upper_bound, upper_bound + partition_size);
+                upper_bound := upper_bound + partition_size;
+                created := created + 1;
+            END LOOP;
+
+            FOR part IN
+                SELECT c.oid::regclass AS name, substring(pg_get_expr(c.relpartbound, c.oid) FROM 'TO \\((\\d+)\\)')::BIGINT AS upper_bound
+                FROM pg_inherits JOIN pg_class c ON c.oid = pg_inherits.inhrelid
+                WHERE pg_inherits.inhparent = 'messages'::regclass
+            LOOP
+                -- no new id falls into a partition below next_id, an old unread message only keeps its own partition
+                CONTINUE WHEN part.upper_bound IS NULL OR part.upper_bound > next_id;
+                EXECUTE format('SELECT EXISTS (SELECT 1 FROM %s)', part.name) INTO not_empty;
+                CONTINUE WHEN not_empty;
+                -- an insert which took its id before next_id was read may not be committed yet
+                EXECUTE format('LOCK TABLE %s IN ACCESS EXCLUSIVE MODE', part.name);
+                EXECUTE format('SELECT EXISTS (SELECT 1 FROM %s)', part.name) INTO not_empty;
+                IF NOT not_empty THEN
+                    EXECUTE format('DROP TABLE %s', part.name);
+                    dropped := dropped + 1;
+                END IF;
+            END LOOP;
+        END;
+        $$ LANGUAGE plpgsql;
+        """),
+]
+
+# arbitrary key of the advisory lock which keeps concurrently starting servers from migrating at once
+MIGRATION_LOCK = 4242001
+
+
+def get_schema_version(db):
+    """Get the version of the database schema.
+
+    Args:
+        db (Database): database
+
+    Returns:
+        int: number of the last applied migration, 0 for an empty database
+    """
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('schema_version')")
+            if cur.fetchone()[0] is None:
+                version = 0
+            else:
+                cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+                version = cur.fetchone()[0]
+        conn.commit()
+    return version
+
+
+def apply_migrations(db, target_version=None):
+    """Bring the database schema up to date. Every migration runs in its own transaction.
+
+    Args:
+        db (Database): database
+        target_version (int): last migration to apply, all migrations by default
+
+    Returns:
+        list: versions of the applied migrations
+    """
+    applied = []
+
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK,))
+            try:
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INTEGER PRIMARY KEY,
+                        description VARCHAR(255) NOT NULL,
+                        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                    )
+                    """
+                )
+                conn.commit()
+                cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+                current_version = cur.fetchone()[0]
+
+                for version, description, sql in MIGRATIONS:
+                    if version <= current_version or (target_version is not None and version > target_version):
+                        continue
+                    cur.execute(sql)
+                    cur.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)", (version, description))
+                    conn.commit()
+                    applied.append(version)
+                    print(f"Applied migration {version}: {description}.")
+            finally:
+                conn.rollback()
+                cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK,))
+                conn.commit()
+
+    return applied
@@ -0,0 +1,183 @@
+import json
+import queue
+import select
+import threading
+import uuid
+import psycopg2
+
+
+class Subscription:
+    """Subscription of a connection to the events of a user."""
+
+    def __init__(self, notifier, username, callback) -> None:
+        self.notifier = notifier
+        self.username = username
+        self.callback = callback
+
+    def cancel(self):
+        self.notifier.unsubscribe(self)
+
+
+class Notifier:
+    """In-process fan-out of events to the subscribed connections.
+
+    Events can be published and subscriptions cancelled from any thread, events are
+    delivered on the event loop, which owns the connections. A callback returns False
+    if it dropped the event, e.g. because the client doesn't read fast enough.
+    """
+
+    def __init__(self, bridge=None) -> None:
+        self.loop = None
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.bridge = bridge
+        self.delivered = 0
+        self.dropped = 0
+
+    def bind(self, loop):
+        """Deliver the events on the given event loop."""
+        self.loop = loop
+
+    def subscribe(self, username, callback):
+        """Call the callback on the event loop with every event published for the user.
+
+        Returns:
+            Subscription: subscription which can be cancelled
+        """
+        subscription = Subscription(self, username, callback)
+        with self.lock:
+            self.subscribers.setdefault(username, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscribers.get(subscription.username)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.subscribers[subscription.username]
+
+    def publish(self, username, event):
+        """Publish the event for the user, on this server and through the bridge on the other ones.
+
+        Args:
+            username (str): user the event is meant for
+            event (dict): JSON serializable event
+        """
+        if self.bridge is not None:
+            self.bridge.publish(username, event)
+        self.deliver_threadsafe(username, event)
+
+    def deliver_threadsafe(self, username, event):
+        if self.loop is None or self.loop.is_closed():
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.deliver, username, event)
+        except RuntimeError:
+            # the loop was closed in the meantime
+            pass
+
+    def deliver(self, username, event):
+        with self.lock:
+            subscriptions = list(self.subscribers.get(username, ()))
+        for subscription in subscriptions:
+            if subscription.callback(event) is False:
+                self.dropped += 1
+            else:
+                self.delivered += 1
+
+    def get_stats(self):
+        with self.lock:
+            subscriptions = sum(len(subscriptions) for subscriptions in self.subscribers.values())
+        return {"subscriptions": subscriptions,
+                "delivered": self.delivered, "dropped": self.dropped}
+
+
+class PostgresNotifyBridge:
+    """Bridge which carries events between servers sharing a PostgreSQL database with LISTEN/NOTIFY.
+
+    Every server listens on the channel and delivers the events published by the
+    other servers to its own subscribers. Events are sent from a background thread,
+    so publishing never blocks a handler.
+    """
+
+    def __init__(self, config, channel='client_server_events') -> None:
+        self.config = config
+        self.channel = channel
+        self.node_id = uuid.uuid4().hex
+        self.notifier = None
+        self.outgoing = queue.Queue()
+        self.stopped = threading.Event()
+        self.threads = []
+
+    def start(self, notifier):
+        """Start listening and sending, the received events are delivered by the notifier."""
+        self.notifier = notifier
+        listen_conn = self.connect()
+        with listen_conn.cursor() as cur:
+            cur.execute(f'LISTEN "{self.channel}"')
+        self.threads = [threading.Thread(target=self.listen, args=(listen_conn,), name='notify-listen', daemon=True),
+                        threading.Thread(target=self.send, name='notify-send', daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def connect(self):
+        conn = psycopg2.connect(**self.config)
+        conn.autocommit = True
+        return conn
+
+    def publish(self, username, event):
+        self.outgoing.put((username, event))
+
+    def send(self):
+        conn = None
+        while (item := self.outgoing.get()) is not None:
+            username, event = item
+            payload = json.dumps({"node": self.node_id, "username": username, "event": event})
+            try:
+                if conn is None or conn.closed:
+                    conn = self.connect()
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+            except psycopg2.Error as error:
+                # the event is lost for the other servers, local subscribers already got it
+                print(f"Notification failed: {error}")
+                conn = None
+        if conn is not None:
+            conn.close()
+
+    def listen(self, conn):
+        while not self.stopped.is_set():
+            try:
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+            except (psycopg2.Error, OSError) as error:
+                print(f"Listening for notifications failed: {error}")
+                conn = self.reconnect()
+                continue
+
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                message = json.loads(notify.payload)
+                if message["node"] != self.node_id:
+                    self.notifier.deliver_threadsafe(message["username"], message["event"])
+        conn.close()
+
+    def reconnect(self):
+        """Open a new listening connection, waiting between attempts until it succeeds or the bridge stops."""
+        while not self.stopped.wait(1.0):
+            try:
+                conn = self.connect()
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN "{self.channel}"')
+                return conn
+            except psycopg2.Error:
+                continue
+        return None
+
+    def stop(self):
+        self.stopped.set()
+        self.outgoing.put(None)
+        for thread in self.threads:
+            thread.join()
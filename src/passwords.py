@@ -0,0 +1,164 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from src.user_cache import UserCache
+
+# cost of scrypt, about 16 MiB of memory and tens of milliseconds per password
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_SIZE = 16
+KEY_SIZE = 32
+
+
+def b64encode(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def hash_password(password, salt=None, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+    """Hash the password with scrypt and a random salt.
+
+    Returns:
+        str: scrypt$n$r$p$salt$key with the salt and the key in base64
+    """
+    salt = os.urandom(SALT_SIZE) if salt is None else salt
+    key = hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r, dklen=KEY_SIZE)
+    return f"scrypt${n}${r}${p}${b64encode(salt)}${b64encode(key)}"
+
+
+def is_hashed(stored):
+    return stored.startswith('scrypt$')
+
+
+def needs_rehash(stored):
+    """Check if the stored password is in plain text, as saved before passwords were hashed,
+    or hashed with other parameters than the current ones."""
+    return not is_hashed(stored) or stored.split('$')[1:4] != [str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+
+
+def verify_password(password, stored):
+    """Check the password against the stored hash in constant time.
+
+    Args:
+        password (str): password given by the client
+        stored (str): hash returned by hash_password or a password saved in plain text
+
+    Returns:
+        bool: True if the password matches
+    """
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode('utf-8'), stored.encode('utf-8'))
+    try:
+        _, n, r, p, salt, key = stored.split('$')
+        expected = base64.b64decode(key)
+        actual = hashlib.scrypt(password.encode('utf-8'), salt=base64.b64decode(salt), n=int(n), r=int(r), p=int(p),
+                                maxmem=256 * int(n) * int(r), dklen=len(expected))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+# hash of an empty password, verified instead of a missing user, so unknown names take as long as wrong passwords
+DUMMY_HASH = "scrypt$16384$8$1$AAAAAAAAAAAAAAAAAAAAAA==$qvz1XkWUdv9r5vB2UucTp/UVJ5rkQ51uGEZfRdILG7M="
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords in a pool of processes, so the key derivation
+    never holds the GIL of the serving process and doesn't stall the event loop.
+
+    Successful verifications are cached for a short time, keyed by the user, the
+    stored hash and an HMAC of the password with a key of this process, so clients
+    reconnecting with the same credentials don't run the key derivation again.
+    Plain text passwords are never kept. Changing the password changes the stored
+    hash, which invalidates the cached verification.
+
+    Args:
+        workers (int): processes running the key derivation, 0 runs it in the calling thread
+        cache_size (int): maximum number of cached verifications
+        cache_ttl (float): seconds a successful verification is cached, 0 disables the cache
+    """
+
+    def __init__(self, workers=2, cache_size=10000, cache_ttl=30) -> None:
+        self.workers = int(workers)
+        self.executor = None
+        self.lock = threading.Lock()
+        self.cache = UserCache(cache_size, cache_ttl) if float(cache_ttl) > 0 else None
+        self.key = os.urandom(32)
+
+    def get_executor(self):
+        # started on first use; spawned processes don't inherit the locks and threads of the server
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self.executor
+
+    def close(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+    def token(self, password):
+        return hmac.new(self.key, password.encode('utf-8'), hashlib.sha256).digest()
+
+    def cached(self, username, password, stored):
+        if self.cache is None:
+            return False
+        found, entry = self.cache.get(username)
+        return found and entry[0] == stored and hmac.compare_digest(entry[1], self.token(password))
+
+    def remember(self, username, password, stored):
+        if self.cache is not None:
+            self.cache.put(username, (stored, self.token(password)))
+
+    def run(self, function, *args):
+        if self.workers == 0:
+            return function(*args)
+        return self.get_executor().submit(function, *args).result()
+
+    async def run_async(self, function, *args):
+        if self.workers == 0:
+            return function(*args)
+        return await asyncio.wrap_future(self.get_executor().submit(function, *args))
+
+    def hash(self, password):
+        """Hash the password for storing it, see hash_password."""
+        return self.run(hash_password, password)
+
+    def verify(self, username, password, stored):
+        """Check the password of the user.
+
+        Args:
+            username (str): name of user
+            password (str): password given by the client
+            stored (str): stored hash of the password, None for a missing user
+
+        Returns:
+            bool: True if the password matches
+        """
+        if self.cached(username, password, stored):
+            return True
+        valid = self.run(verify_password, password, DUMMY_HASH if stored is None else stored) and stored is not None
+        if valid:
+            self.remember(username, password, stored)
+        return valid
+
+    async def async_hash(self, password):
+        return await self.run_async(hash_password, password)
+
+    async def async_verify(self, username, password, stored):
+        if self.cached(username, password, stored):
+            return True
+        valid = await self.run_async(verify_password, password, DUMMY_HASH if stored is None else stored) and stored is not None
+        if valid:
+            self.remember(username, password, stored)
+        return valid
+
+    def get_stats(self):
+        """Get counters of the verification cache, see UserCache.get_stats."""
+        return self.cache.get_stats() if self.cache is not None else None
@@ -0,0 +1,281 @@
+import json
+import struct
+import zlib
+from operator import itemgetter
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# every frame is a 4-byte big-endian payload length followed by the payload
+HEADER = struct.Struct('!I')
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+# payloads of compressed connections start with a byte telling how the rest is compressed
+RAW, ZLIB, ZSTD = b'\x00', b'\x01', b'\x02'
+# smaller payloads are sent uncompressed, compression wouldn't pay off
+COMPRESS_THRESHOLD = 1024
+
+
+class ProtocolError(Exception):
+    """Raised when the peer sends a frame that can't be accepted."""
+
+
+def encode_frame(payload: bytes):
+    """Prefix payload with its length.
+
+    Args:
+        payload (bytes): frame content
+
+    Returns:
+        bytes: frame ready to be written to the socket
+    """
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {len(payload)} bytes exceeds the {MAX_FRAME_SIZE} bytes limit.")
+    return HEADER.pack(len(payload)) + payload
+
+
+def encode_msg(msg, code='utf-8'):
+    """Serialize a message to JSON and wrap it in a frame.
+
+    Args:
+        msg: any JSON serializable object
+
+    Returns:
+        bytes: frame ready to be written to the socket
+    """
+    return encode_frame(json.dumps(msg).encode(code))
+
+
+def decode_msg(payload: bytes, code='utf-8'):
+    """Deserialize the payload of a frame."""
+    return json.loads(payload.decode(code))
+
+
+def pack_rows(msg):
+    """Replace lists of rows with the same keys by a table, which sends every key once.
+    Rows are database rows, so their values are sent as they are.
+
+    Returns:
+        Message with {"$columns": [keys], "$rows": [[values], ...]} in place of the lists of rows.
+    """
+    if isinstance(msg, dict):
+        return {key: pack_rows(value) for key, value in msg.items()}
+    if isinstance(msg, list):
+        if len(msg) > 1 and isinstance(msg[0], dict) and len(msg[0]) > 1:
+            keys = msg[0].keys()
+            if all(isinstance(row, dict) and row.keys() == keys for row in msg):
+                columns = list(keys)
+                return {"$columns": columns, "$rows": list(map(itemgetter(*columns), msg))}
+        return [pack_rows(item) for item in msg]
+    return msg
+
+
+def unpack_rows(msg):
+    """Turn the tables made by pack_rows back into lists of rows."""
+    if isinstance(msg, dict):
+        if "$columns" in msg and "$rows" in msg:
+            columns = msg["$columns"]
+            return [dict(zip(columns, row)) for row in msg["$rows"]]
+        return {key: unpack_rows(value) for key, value in msg.items()}
+    if isinstance(msg, list):
+        return [unpack_rows(item) for item in msg]
+    return msg
+
+
+class Codec:
+    """Serialization of the messages of a connection, agreed on with the 'hello' command.
+
+    Args:
+        name (str): json or msgpack (requires the msgpack package)
+        compression (str): None, zlib or zstd (requires the zstandard package), payloads
+            above compress_threshold bytes are compressed
+        columnar (bool): send lists of rows as tables, see pack_rows
+        compress_threshold (int): size of the smallest compressed payload in bytes
+    """
+
+    def __init__(self, name='json', compression=None, columnar=False, compress_threshold=COMPRESS_THRESHOLD) -> None:
+        if name not in available_codecs():
+            raise ValueError(f"Codec {name} isn't available, use one of {', '.join(available_codecs())}.")
+        if compression is not None and compression not in available_compressions():
+            raise ValueError(f"Compression {compression} isn't available, use one of {', '.join(available_compressions())}.")
+        self.name = name
+        self.compression = compression
+        self.columnar = bool(columnar)
+        self.compress_threshold = int(compress_threshold)
+
+    def settings(self):
+        return {"codec": self.name, "compression": self.compression, "columnar": self.columnar}
+
+    def dumps(self, msg):
+        if self.columnar:
+            msg = pack_rows(msg)
+        if self.name == 'msgpack':
+            payload = msgpack.packb(msg, use_bin_type=True)
+        else:
+            payload = json.dumps(msg).encode('utf-8')
+
+        if self.compression is None:
+            return payload
+        if len(payload) < self.compress_threshold:
+            return RAW + payload
+        if self.compression == 'zstd':
+            return ZSTD + zstandard.ZstdCompressor().compress(payload)
+        return ZLIB + zlib.compress(payload, 1)
+
+    def loads(self, payload: bytes):
+        if self.compression is not None:
+            payload = self.decompress(payload)
+        # errors of both decoders are ValueErrors, like for a plain JSON connection
+        msg = msgpack.unpackb(payload, raw=False) if self.name == 'msgpack' else json.loads(payload.decode('utf-8'))
+        return unpack_rows(msg) if self.columnar else msg
+
+    def decompress(self, payload: bytes):
+        """Remove the compression marker and decompress the payload, limited to MAX_FRAME_SIZE bytes."""
+        marker, data = payload[:1], payload[1:]
+        if marker == RAW:
+            return data
+        if marker == ZLIB:
+            decompressor = zlib.decompressobj()
+            try:
+                data = decompressor.decompress(data, MAX_FRAME_SIZE)
+            except zlib.error as error:
+                raise ValueError(f"Invalid compressed payload: {error}")
+            if decompressor.unconsumed_tail:
+                raise ProtocolError(f"Decompressed frame exceeds the {MAX_FRAME_SIZE} bytes limit.")
+            return data
+        if marker == ZSTD and zstandard is not None:
+            try:
+                return zstandard.ZstdDecompressor().decompress(data, max_output_size=MAX_FRAME_SIZE)
+            except zstandard.ZstdError as error:
+                raise ValueError(f"Invalid compressed payload: {error}")
+        raise ValueError("Unknown compression of the payload.")
+
+    def encode_msg(self, msg):
+        """Serialize a message and wrap it in a frame."""
+        return encode_frame(self.dumps(msg))
+
+    def decode_msg(self, payload: bytes):
+        return self.loads(payload)
+
+
+def available_codecs():
+    return ['json'] + (['msgpack'] if msgpack is not None else [])
+
+
+def available_compressions():
+    return ['zlib'] + (['zstd'] if zstandard is not None else [])
+
+
+# codec of connections which didn't ask for another one
+JSON = Codec()
+
+
+class FrameDecoder:
+    """Streaming decoder which collects received bytes and splits them into frames.
+
+    Data can be fed in chunks of any size, so frames split across several reads
+    and several frames coalesced into one read are both handled.
+    """
+
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE) -> None:
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes):
+        """Append received bytes to the buffer."""
+        self.buffer.extend(data)
+
+    def next_frame(self):
+        """Take the next complete frame from the buffer.
+
+        Returns:
+            bytes: payload of the frame or None if the frame isn't complete yet
+        """
+        if len(self.buffer) < HEADER.size:
+            return None
+
+        (length,) = HEADER.unpack_from(self.buffer)
+        if length > self.max_frame_size:
+            raise ProtocolError(f"Frame of {length} bytes exceeds the {self.max_frame_size} bytes limit.")
+
+        end = HEADER.size + length
+        if len(self.buffer) < end:
+            return None
+
+        payload = bytes(self.buffer[HEADER.size:end])
+        del self.buffer[:end]
+        return payload
+
+    def frames(self):
+        """Yield all complete frames currently in the buffer."""
+        while (payload := self.next_frame()) is not None:
+            yield payload
+
+
+class FrameReader:
+    """Buffered reader of messages from a blocking socket."""
+
+    def __init__(self, sock, chunk_size=65536, codec=JSON) -> None:
+        self.sock = sock
+        self.chunk_size = chunk_size
+        self.decoder = FrameDecoder()
+        self.codec = codec
+
+    def read_msg(self):
+        """Block until the next message is received.
+
+        Returns:
+            Decoded message or None if the connection was closed.
+        """
+        while (payload := self.decoder.next_frame()) is None:
+            data = self.sock.recv(self.chunk_size)
+            if not data:
+                return None
+            self.decoder.feed(data)
+        return self.codec.decode_msg(payload)
+
+
+async def read_frame(reader, max_frame_size=MAX_FRAME_SIZE):
+    """Read the next frame from an asyncio stream.
+
+    Args:
+        reader (asyncio.StreamReader): stream to read from
+
+    Returns:
+        bytes: payload of the frame or None if the connection was closed.
+    """
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except EOFError:
+        return None
+
+    (length,) = HEADER.unpack(header)
+    if length > max_frame_size:
+        raise ProtocolError(f"Frame of {length} bytes exceeds the {max_frame_size} bytes limit.")
+
+    try:
+        return await reader.readexactly(length)
+    except EOFError:
+        return None
+
+
+async def read_msg(reader, codec=JSON):
+    """Read and decode the next message from an asyncio stream.
+
+    Args:
+        reader (asyncio.StreamReader): stream to read from
+        codec (Codec): serialization of the connection
+
+    Returns:
+        Decoded message or None if the connection was closed.
+    """
+    payload = await read_frame(reader)
+    if payload is None:
+        return None
+    return codec.decode_msg(payload)
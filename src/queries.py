@@ -17,9 +17,108 @@ def query_insert_message(arguments: dict):
     message = arguments['message']
 
     return f"""
-    INSERT INTO messages (sender_name, receiver_name, message)
-    VALUES (%s, %s, %s)
-    """, (sender, receiver, message)
+    INSERT INTO messages (sender_id, sender_name, receiver_id, receiver_name, message)
+    SELECT (SELECT user_id FROM users WHERE username = %s), %s, user_id, %s, %s
+    FROM users
+    WHERE username = %s
+    """, (sender, sender, receiver, message, receiver)
+
+def query_send_message(arguments: dict):
+
+    sender = arguments['sender']
+    receiver = arguments['receiver']
+    message = arguments['message']
+    inbox_limit = arguments['inbox_limit']
+
+    # the conditional increment locks the recipient's row, so concurrent senders can't exceed the inbox limit
+    return f"""
+    WITH recipient AS (
+        SELECT user_id FROM users WHERE username = %s
+    ), inbox AS (
+        UPDATE users SET unread_msgs = unread_msgs + 1
+        WHERE username = %s AND unread_msgs < %s
+        RETURNING user_id
+    ), sent AS (
+        INSERT INTO messages (sender_id, sender_name, receiver_id, receiver_name, message)
+        SELECT (SELECT user_id FROM users WHERE username = %s), %s, user_id, %s, %s FROM inbox
+        RETURNING msg_id
+    )
+    SELECT EXISTS (SELECT 1 FROM recipient) AS recipient_exists,
+           EXISTS (SELECT 1 FROM sent) AS sent
+    """, (receiver, receiver, inbox_limit, sender, sender, receiver, message)
+
+def query_broadcast_message(arguments: dict):
+
+    sender = arguments['sender']
+    receivers = list(arguments['receivers'])
+    message = arguments['message']
+    inbox_limit = arguments['inbox_limit']
+
+    # recipients are locked in user_id order, so concurrent broadcasts can't deadlock,
+    # then every inbox below the limit is incremented and all messages are inserted at once
+    return f"""
+    WITH recipients AS (
+        SELECT DISTINCT unnest(%s::varchar[]) AS username
+    ), locked AS (
+        SELECT user_id FROM users
+        WHERE username IN (SELECT username FROM recipients)
+        ORDER BY user_id
+        FOR UPDATE
+    ), inbox AS (
+        UPDATE users SET unread_msgs = unread_msgs + 1
+        WHERE user_id IN (SELECT user_id FROM locked) AND unread_msgs < %s
+        RETURNING user_id, username
+    ), sent AS (
+        INSERT INTO messages (sender_id, sender_name, receiver_id, receiver_name, message)
+        SELECT (SELECT user_id FROM users WHERE username = %s), %s, user_id, username, %s FROM inbox
+        RETURNING receiver_name
+    )
+    SELECT recipients.username AS recipient,
+           EXISTS (SELECT 1 FROM users WHERE users.username = recipients.username) AS recipient_exists,
+           EXISTS (SELECT 1 FROM sent WHERE sent.receiver_name = recipients.username) AS sent
+    FROM recipients
+    """, (receivers, inbox_limit, sender, sender, message)
+
+def query_send_messages(arguments: dict):
+
+    senders = list(arguments['senders'])
+    receivers = list(arguments['receivers'])
+    contents = list(arguments['messages'])
+    inbox_limit = arguments['inbox_limit']
+
+    # a group commit of many sends: recipients are locked in user_id order, every recipient accepts
+    # the messages in the order of the batch until its inbox is full, all counters are updated
+    # and all messages are inserted with a single statement
+    return f"""
+    WITH batch AS (
+        SELECT * FROM unnest(%s::varchar[], %s::varchar[], %s::varchar[]) WITH ORDINALITY AS batch(sender, receiver, message, position)
+    ), locked AS (
+        SELECT user_id, username, unread_msgs FROM users
+        WHERE username IN (SELECT receiver FROM batch)
+        ORDER BY user_id
+        FOR UPDATE
+    ), ranked AS (
+        SELECT batch.*, locked.user_id AS receiver_id,
+               locked.unread_msgs + row_number() OVER (PARTITION BY batch.receiver ORDER BY batch.position) AS inbox_size
+        FROM batch LEFT JOIN locked ON locked.username = batch.receiver
+    ), accepted AS (
+        SELECT * FROM ranked WHERE receiver_id IS NOT NULL AND inbox_size <= %s
+    ), inbox AS (
+        UPDATE users SET unread_msgs = users.unread_msgs + counts.count
+        FROM (SELECT receiver_id, count(*) AS count FROM accepted GROUP BY receiver_id) AS counts
+        WHERE users.user_id = counts.receiver_id
+    ), sent AS (
+        INSERT INTO messages (sender_id, sender_name, receiver_id, receiver_name, message)
+        SELECT (SELECT user_id FROM users WHERE username = accepted.sender), sender, receiver_id, receiver, message
+        FROM accepted
+        ORDER BY position
+        RETURNING msg_id
+    )
+    SELECT ranked.receiver_id IS NOT NULL AS recipient_exists,
+           EXISTS (SELECT 1 FROM accepted WHERE accepted.position = ranked.position) AS sent
+    FROM ranked
+    ORDER BY ranked.position
+    """, (senders, receivers, contents, inbox_limit)
 
 def query_check_if_user_exist(arguments: dict):
 
@@ -41,34 +140,87 @@ def query_get_user_data(arguments: dict):
     WHERE username = %s
     """, (username, )
 
-def query_check_user_credentials(arguments: dict):
+def query_get_user_credentials(arguments: dict):
 
     username = arguments['username']
-    password = arguments['password']
 
+    # the password hash is verified by the server, the role comes with it
     return f"""
-    SELECT *
+    SELECT username, password, role
     FROM users
-    WHERE username = %s and password = %s
-    """, (username, password)
+    WHERE username = %s
+    """, (username, )
+
+def query_update_password(arguments: dict):
+
+    username = arguments['username']
+    password = arguments['password']
+
+    return f"""
+    UPDATE users SET password = %s
+    WHERE username = %s
+    """, (password, username)
 
 def query_get_user_messages(arguments: dict):
 
     receiver = arguments['receiver']
 
     return f"""
-    SELECT sender_name, message
+    SELECT messages.sender_name, messages.message
     FROM messages
-    WHERE receiver_name = %s
+    JOIN users ON users.user_id = messages.receiver_id
+    WHERE users.username = %s
+    ORDER BY messages.msg_id
     """, (receiver, )
 
-def query_get_all_messages():
+def query_read_new_messages(arguments: dict):
+
+    username = arguments['username']
+    limit = arguments['limit']
+
+    # the reader's row is locked, so concurrent reads of the same user don't return a message twice;
+    # senders lock the recipient's row as well, so its messages are inserted in msg_id order
+    # and no message can appear below the watermark after it moved
+    return f"""
+    WITH reader AS (
+        SELECT user_id, last_read_msg_id FROM users WHERE username = %s FOR UPDATE
+    ), unread AS (
+        SELECT messages.msg_id, messages.sender_name, messages.message
+        FROM messages
+        JOIN reader ON messages.receiver_id = reader.user_id
+        WHERE messages.msg_id > reader.last_read_msg_id
+        ORDER BY messages.msg_id
+        LIMIT %s
+    ), advanced AS (
+        UPDATE users SET last_read_msg_id = (SELECT MAX(msg_id) FROM unread),
+                         unread_msgs = GREATEST(unread_msgs - (SELECT COUNT(*) FROM unread), 0)
+        FROM reader
+        WHERE users.user_id = reader.user_id AND EXISTS (SELECT 1 FROM unread)
+    )
+    SELECT sender_name, message FROM unread ORDER BY msg_id
+    """, (username, limit)
+
+def query_get_all_messages(arguments: dict = None):
 
     return f"""
     SELECT sender_name, receiver_name, message
     FROM messages
+    ORDER BY msg_id
     """, ()
 
+def query_get_messages_page(arguments: dict):
+
+    after_id = arguments['after_id']
+    limit = arguments['limit']
+
+    return f"""
+    SELECT msg_id, sender_name, receiver_name, message
+    FROM messages
+    WHERE msg_id > %s
+    ORDER BY msg_id
+    LIMIT %s
+    """, (after_id, limit)
+
 def query_update_unread_msgs(arguments: dict):
 
     unread_msgs = arguments['unread_msgs']
@@ -81,3 +233,54 @@ def query_update_unread_msgs(arguments: dict):
 
 
 
+def query_archive_messages(arguments: dict):
+
+    cutoff = arguments['cutoff']
+    limit = arguments['limit']
+
+    # only read messages are archived, unread ones stay in the inbox whatever their age;
+    # ids grow with the time of sending, so the scan stops at the first message which is kept
+    return f"""
+    WITH boundary AS (
+        SELECT COALESCE(MIN(msg_id), 2147483647) AS msg_id FROM messages WHERE created_at >= %s
+    ), candidates AS (
+        SELECT messages.msg_id
+        FROM messages
+        JOIN users ON users.user_id = messages.receiver_id
+        WHERE messages.msg_id < (SELECT msg_id FROM boundary) AND messages.created_at < %s
+          AND messages.msg_id <= users.last_read_msg_id
+        ORDER BY messages.msg_id
+        LIMIT %s
+    ), moved AS (
+        DELETE FROM messages
+        WHERE msg_id IN (SELECT msg_id FROM candidates)
+        RETURNING msg_id, sender_id, sender_name, receiver_id, receiver_name, message, created_at
+    ), archived AS (
+        INSERT INTO messages_archive (first_msg_id, last_msg_id, message_count, messages)
+        SELECT MIN(msg_id), MAX(msg_id), COUNT(*), jsonb_agg(to_jsonb(moved) ORDER BY msg_id)
+        FROM moved
+        HAVING COUNT(*) > 0
+        RETURNING message_count
+    )
+    SELECT COALESCE((SELECT message_count FROM archived), 0) AS archived
+    """, (cutoff, cutoff, limit)
+
+def query_purge_archive(arguments: dict):
+
+    cutoff = arguments['cutoff']
+
+    return f"""
+    WITH purged AS (
+        DELETE FROM messages_archive WHERE archived_at < %s RETURNING message_count
+    )
+    SELECT COALESCE(SUM(message_count), 0) AS purged FROM purged
+    """, (cutoff,)
+
+def query_maintain_partitions(arguments: dict):
+
+    partition_size = arguments['partition_size']
+    partitions_ahead = arguments['partitions_ahead']
+
+    return f"""
+    SELECT created, dropped FROM maintain_message_partitions(%s, %s)
+    """, (partition_size, partitions_ahead)
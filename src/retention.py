@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta, timezone
+
+
+class Archiver:
+    """Applies the retention policy of the messages table.
+
+    Read messages older than retention_days are moved to the compressed archive,
+    a batch of at most batch_size messages per statement and transaction. Unread
+    messages stay in the inbox whatever their age. Archived batches older than
+    archive_retention_days are deleted.
+
+    On PostgreSQL the messages table is partitioned by ranges of partition_size
+    ids. Every run creates the partitions of the next ids ahead of time and drops
+    the partitions which the archiver emptied, so inbox reads only touch the
+    recent partitions and old rows are removed without bloating the table.
+
+    Args:
+        database: storage engine with save_and_get_data
+        retention_days (float): age of the read messages which are archived, 0 keeps them
+        archive_retention_days (float): age of the archived messages which are deleted, 0 keeps them
+        batch_size (int): maximum number of messages archived together
+        partition_size (int): ids per partition of the messages table
+        partitions_ahead (int): partitions created ahead of the next id
+    """
+
+    def __init__(self, database, retention_days=0, archive_retention_days=0, batch_size=1000, partition_size=1000000,
+                 partitions_ahead=2) -> None:
+        self.db = database
+        self.retention_days = float(retention_days)
+        self.archive_retention_days = float(archive_retention_days)
+        self.batch_size = int(batch_size)
+        self.partition_size = int(partition_size)
+        self.partitions_ahead = int(partitions_ahead)
+        self.runs = 0
+        self.archived = 0
+        self.purged = 0
+        self.partitions_created = 0
+        self.partitions_dropped = 0
+        self.last_run = None
+
+    def archive_params(self, now):
+        return {"query": "query_archive_messages", "query_arguments": {
+            "cutoff": now - timedelta(days=self.retention_days), "limit": self.batch_size}}
+
+    def purge_params(self, now):
+        return {"query": "query_purge_archive", "query_arguments": {
+            "cutoff": now - timedelta(days=self.archive_retention_days)}}
+
+    def partition_params(self):
+        return {"query": "query_maintain_partitions", "query_arguments": {
+            "partition_size": self.partition_size, "partitions_ahead": self.partitions_ahead}}
+
+    def record_partitions(self, row, now):
+        self.partitions_created += row['created']
+        self.partitions_dropped += row['dropped']
+        self.runs += 1
+        self.last_run = now.isoformat()
+
+    def run_once(self, now=None):
+        """Archive the old read messages, purge the old archive and maintain the partitions.
+
+        Args:
+            now (datetime): time the ages are counted from, the current time by default
+
+        Returns:
+            dict: counters, see get_stats
+        """
+        now = now or datetime.now(timezone.utc)
+        if self.retention_days > 0:
+            # the partitions emptied by the archiver are dropped below
+            while True:
+                archived = self.db.save_and_get_data(self.archive_params(now))['archived']
+                self.archived += archived
+                if archived < self.batch_size:
+                    break
+        if self.archive_retention_days > 0:
+            self.purged += self.db.save_and_get_data(self.purge_params(now))['purged']
+        self.record_partitions(self.db.save_and_get_data(self.partition_params()), now)
+        return self.get_stats()
+
+    def get_stats(self):
+        """Get retention counters.
+
+        Returns:
+            dict: runs, archived and purged messages, created and dropped partitions, time of the last run
+        """
+        return {"runs": self.runs, "archived": self.archived, "purged": self.purged,
+                "partitions_created": self.partitions_created, "partitions_dropped": self.partitions_dropped,
+                "last_run": self.last_run}
+
+
+class AsyncArchiver(Archiver):
+    """Archiver for an asyncio database, e.g. AsyncDatabase."""
+
+    async def run_once(self, now=None):
+        now = now or datetime.now(timezone.utc)
+        if self.retention_days > 0:
+            while True:
+                archived = (await self.db.save_and_get_data(self.archive_params(now)))['archived']
+                self.archived += archived
+                if archived < self.batch_size:
+                    break
+        if self.archive_retention_days > 0:
+            self.purged += (await self.db.save_and_get_data(self.purge_params(now)))['purged']
+        self.record_partitions(await self.db.save_and_get_data(self.partition_params()), now)
+        return self.get_stats()
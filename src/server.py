@@ -1,73 +1,573 @@
-import socket
-import json 
+import asyncio
+import functools
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from src.user_manager import UserManager
 from src.message_manager import MessageManager
 from src.database import Database
+from src.memory_database import MemoryDatabase
+from src.sqlite_database import SqliteDatabase
+from src.migrations import apply_migrations
+from src.user_cache import AsyncCachedDatabase, CachedDatabase, UserCache
+from src.async_database import AsyncDatabase
+from src.async_managers import AsyncMessageManager, AsyncUserManager
+from src.metrics import Metrics
+from src.notifier import Notifier, PostgresNotifyBridge
+from src.passwords import PasswordHasher
+from src.retention import Archiver, AsyncArchiver
+from src.write_behind import AsyncWriteBehindMessageManager, GroupCommitter, WriteBehindMessageManager
+from src.session import SessionManager
+from src.protocol import JSON, Codec, ProtocolError, read_msg
+
+MAX_BATCH_SIZE = 100
 
 class Server:
-    def __init__(self, host, port, version, config) -> None:
+    def __init__(self, host, port, version, config, backlog=1024, session_timeout=1800, pool_config=None, cache_config=None,
+                 handler_workers=8, max_queue=1000, backend='psycopg2', engine='postgresql', max_in_flight=32,
+                 metrics_port=None, notify_channel=None, push_buffer=1048576, sock=None, reuse_port=False,
+                 kdf_workers=2, credentials_ttl=30, write_behind=False, group_commit_size=500, group_commit_delay=0.002,
+                 write_behind_queue=10000, retention_days=0, archive_retention_days=0, archive_batch=1000,
+                 partition_size=1000000, maintenance_interval=3600) -> None:
         self.host = host
         self.port = port
+        self.backlog = int(backlog)
+        # listening socket shared with other worker processes, or the port is shared with SO_REUSEPORT
+        self.sock = sock
+        self.reuse_port = reuse_port
         self.version = version
         self.config = config
         self.start_time = datetime.now()
-        self.db = Database(self.config)
-        self.user_manager = UserManager(self.db)
-        self.message_manager = MessageManager(self.db, self.user_manager)
+        self.backend = backend
+        # pushed events are shared with the other servers of the database through LISTEN/NOTIFY if a channel is set
+        bridge = None
+        if notify_channel:
+            if engine != 'postgresql':
+                raise ValueError("Notifications between servers require the postgresql storage engine.")
+            bridge = PostgresNotifyBridge(self.config, notify_channel)
+        self.notifier = Notifier(bridge)
+        # events are dropped for subscribers with more unsent bytes than this
+        self.push_buffer = int(push_buffer)
+        # passwords are hashed and verified in separate processes, successful logins are cached for credentials_ttl seconds
+        self.hasher = PasswordHasher(kdf_workers, cache_ttl=credentials_ttl)
+        # sent messages are queued and committed in groups, the sender is answered after the commit
+        self.write_behind = str(write_behind).lower() in ('1', 'true', 'yes', 'on')
+        if backend == 'async':
+            if engine != 'postgresql':
+                raise ValueError("The async backend requires the postgresql storage engine.")
+            # handlers await the database directly on the event loop
+            migration_db = Database(self.config)
+            apply_migrations(migration_db)
+            migration_db.close()
+            self.db = AsyncDatabase(self.config, pool_config)
+            if cache_config:
+                self.db = AsyncCachedDatabase(self.db, UserCache(**cache_config))
+            self.user_manager = AsyncUserManager(self.db, self.hasher)
+            self.committer = None
+            if self.write_behind:
+                self.committer = GroupCommitter(self.db, None, group_commit_size, group_commit_delay, write_behind_queue)
+                self.message_manager = AsyncWriteBehindMessageManager(self.db, self.user_manager, self.notifier, self.committer)
+            else:
+                self.message_manager = AsyncMessageManager(self.db, self.user_manager, self.notifier)
+            self.archiver = AsyncArchiver(self.db, retention_days, archive_retention_days, archive_batch, partition_size)
+        else:
+            self.db = self.open_database(engine, pool_config)
+            if cache_config:
+                self.db = CachedDatabase(self.db, UserCache(**cache_config))
+            self.user_manager = UserManager(self.db, self.hasher)
+            self.committer = None
+            if self.write_behind:
+                # groups are committed on a thread of their own, so they don't wait behind the handlers
+                self.committer = GroupCommitter(self.db, ThreadPoolExecutor(max_workers=1, thread_name_prefix='group-commit'),
+                                                group_commit_size, group_commit_delay, write_behind_queue)
+                self.message_manager = WriteBehindMessageManager(self.db, self.user_manager, self.notifier, self.committer)
+            else:
+                self.message_manager = MessageManager(self.db, self.user_manager, self.notifier)
+            self.archiver = Archiver(self.db, retention_days, archive_retention_days, archive_batch, partition_size)
+        # seconds between two runs of the archiver and the partition maintenance, 0 disables them
+        self.maintenance_interval = float(maintenance_interval)
+        self.session_manager = SessionManager(float(session_timeout))
+        # handlers which query the database run on a bounded pool of worker threads
+        self.executor = ThreadPoolExecutor(max_workers=int(handler_workers), thread_name_prefix='handler')
+        self.max_queue = int(max_queue)
+        self.queued = 0
+        # pipelined requests of a single connection which can be answered at the same time
+        self.max_in_flight = int(max_in_flight)
         self.options = {
             "uptime": self.uptime,
             "info": self.info,
             "help": self.help,
             "stop": self.stop,
+            "stats": self.stats,
+            "subscribe": self.subscribe,
+            "unsubscribe": self.unsubscribe,
             "signup": self.user_manager.create_account,
             "login": self.user_manager.login,
             "logout": self.user_manager.logout,
             "send": self.message_manager.send_msg_to_recipient,
+            "broadcast": self.message_manager.broadcast_msg,
             "read": self.message_manager.read_msg}
+        # cheap commands which are answered directly on the event loop
+        self.inline_commands = {"uptime", "info", "help", "stop", "stats", "subscribe", "unsubscribe"}
+        # commands which change the session wait for the pipelined requests before them and are never pipelined
+        self.ordered_commands = {"login", "logout", "stop"}
         self.commands = {
             "uptime": "Returns the server's lifetime.",
             "info": "Returns the server's version number and date of creation.",
             "help": "Returns a list of available commands.",
-            "stop": "Stop the server and the client simultaneously.",
+            "hello": "Choose the codec (json, msgpack), compression (zlib, zstd) and columnar rows of the connection.",
+            "stop": "Stop the server and disconnect the client.",
+            "stats": "Returns request, database and connection statistics.",
+            "subscribe": "Receive new messages as soon as they are sent, without reading.",
+            "unsubscribe": "Stop receiving new messages.",
             "signup": "Create a new account",
             "login": "Log in.",
             "logout": "Log out.",
             "send": "Send message.",
+            "broadcast": "Send message to many recipients.",
             "read": "Read message."
                }
+        self.metrics = Metrics(self.options)
+        # port of the HTTP endpoint with the metrics in the Prometheus text format, disabled if not set
+        self.metrics_port = int(metrics_port) if metrics_port not in (None, '') else None
         
-        
-    def send_msg(self, conn, msg, code ='utf-8'):
-        conn.sendall(msg.encode(code))
+    def open_database(self, engine, pool_config=None):
+        """Open the storage engine selected in the configuration.
 
-    def receive_msg(self, conn, code='utf-8'):
-        return conn.recv(1024).decode(code)
+        Args:
+            engine (str): postgresql, sqlite or memory
+            pool_config (dict): settings of the connection pool (postgresql only)
 
-    def start_server(self):
+        Returns:
+            StorageEngine: database used by the managers
+        """
+        if engine == 'postgresql':
+            db = Database(self.config, pool_config)
+            apply_migrations(db)
+            return db
+        if engine == 'sqlite':
+            return SqliteDatabase(self.config)
+        if engine == 'memory':
+            return MemoryDatabase()
+        raise ValueError(f"Unknown storage engine {engine}.")
+
+    async def send_msg(self, writer, msg):
+        codec = self.codecs.get(writer, JSON)
+        try:
+            frame = codec.encode_msg(msg)
+        except ProtocolError as error:
+            # the client gets an answer it can act on instead of a closed connection
+            print(f"Answer not sent: {error}")
+            failure = {"status": "failure", "message": "The answer is too large. Read it page by page or as a stream."}
+            if isinstance(msg, dict) and 'request_id' in msg:
+                failure = {"request_id": msg['request_id'], "response": failure}
+            frame = codec.encode_msg(failure)
+        writer.write(frame)
+        await writer.drain()
+
+    def push_event(self, writer, event):
+        """Write an event to a subscribed client without waiting until it is sent.
+
+        Returns:
+            bool: False if the event was dropped because the connection is closing
+            or the client doesn't read fast enough
+        """
+        if writer.is_closing() or writer.transport.get_write_buffer_size() > self.push_buffer:
+            return False
+        writer.write(self.codecs.get(writer, JSON).encode_msg({"event": event}))
+        return True
+
+    def tag(self, msg, request_id):
+        """Attach the id of a pipelined request to a frame of its answer.
+
+        A chunk of a stream gets the request_id key, any other answer is wrapped as
+        {"request_id": request_id, "response": answer}. Frames of requests without an id are sent as they are.
+        """
+        if request_id is None:
+            return msg
+        if isinstance(msg, dict) and 'stream' in msg:
+            return {"request_id": request_id, **msg}
+        return {"request_id": request_id, "response": msg}
+
+    async def send_answer(self, writer, answer, request_id=None):
+        """Send the answer of a handler. A generator is sent as a stream of chunks
+        followed by a frame closing the stream.
+
+        Args:
+            writer (asyncio.StreamWriter): stream to write the answer to
+            answer: answer of the handler
+            request_id: id of the request, sent with every frame of the answer
+        """
+        if inspect.isasyncgen(answer):
+            await self.send_async_stream(writer, answer, request_id)
+            return
+        if not inspect.isgenerator(answer):
+            await self.send_msg(writer, msg = self.tag(answer, request_id))
+            return
+
+        loop = asyncio.get_running_loop()
+        count = 0
+        try:
+            # every chunk is fetched from the database on a worker thread
+            while (chunk := await loop.run_in_executor(self.executor, next, answer, None)) is not None:
+                await self.send_msg(writer, msg = self.tag({"stream": chunk}, request_id))
+                count += len(chunk)
+        except ConnectionError:
+            raise
+        except Exception as error:
+            print(f"Stream failed: {error}")
+            await self.send_msg(writer, msg = self.tag({"status": "failure", "message": "Internal server error. Try again later.", "end_of_stream": True}, request_id))
+            return
+        finally:
+            # releases the database cursor if the client disconnected in the middle of the stream
+            await loop.run_in_executor(self.executor, answer.close)
+
+        await self.send_msg(writer, msg = self.tag({"status": "success", "message": f"Sent {count} items.", "end_of_stream": True}, request_id))
+
+    async def send_async_stream(self, writer, answer, request_id=None):
+        """Send the chunks of an asynchronous generator, followed by a frame closing the stream."""
+        count = 0
+        try:
+            async for chunk in answer:
+                await self.send_msg(writer, msg = self.tag({"stream": chunk}, request_id))
+                count += len(chunk)
+        except ConnectionError:
+            raise
+        except Exception as error:
+            print(f"Stream failed: {error}")
+            await self.send_msg(writer, msg = self.tag({"status": "failure", "message": "Internal server error. Try again later.", "end_of_stream": True}, request_id))
+            return
+        finally:
+            await answer.aclose()
+
+        await self.send_msg(writer, msg = self.tag({"status": "success", "message": f"Sent {count} items.", "end_of_stream": True}, request_id))
+
+    async def receive_msg(self, reader, codec=JSON):
+        return await read_msg(reader, codec)
+
+    async def hello(self, writer, request):
+        """Agree with the client on the serialization of the connection. The answer is sent
+        with the current codec, the following frames with the new one.
+
+        Args:
+            writer (asyncio.StreamWriter): stream of the client
+            request (dict): 'hello' request with codec (json or msgpack), compression (zlib or zstd) and columnar
+        """
+        try:
+            codec = Codec(request.get('codec', 'json'), request.get('compression'), request.get('columnar', False))
+        except (TypeError, ValueError) as error:
+            await self.send_answer(writer, {"status": "failure", "message": str(error)}, request.get('request_id'))
+            return
+        await self.send_answer(writer, {"status": "success", **codec.settings()}, request.get('request_id'))
+        self.codecs[writer] = codec
+
+    def dispatch(self, request, session):
+        """Run the handler from the command table matching the request.
+
+        Args:
+            request (dict): decoded request received from the client
+            session (Session): session of the client which sent the request
+
+        Returns:
+            Answer of the handler or 'Wrong command' if the command is unknown.
+        """
+        if not isinstance(request, dict):
+            return 'Wrong command'
+        command = request.get('command')
+
+        try:
+            return self.options[command](**{**request, 'session': session})
+        except KeyError:
+            return 'Wrong command'
+        except Exception as error:
+            # e.g. the database is unavailable, the client stays connected and can retry
+            print(f"Command {command} failed: {error}")
+            return {"status": "failure", "message": "Internal server error. Try again later."}
+
+    async def run_handler(self, request, session):
+        """Run the handler of the request and record its latency.
+
+        Args:
+            request (dict): decoded request received from the client
+            session (Session): session of the client which sent the request
+
+        Returns:
+            Answer of the handler.
+        """
+        start = time.perf_counter()
+        answer = await self.call_handler(request, session)
+        self.metrics.observe(request.get('command') if isinstance(request, dict) else None, time.perf_counter() - start, answer)
+        return answer
+
+    async def call_handler(self, request, session):
+        """Run the handler of the request on the worker pool, so the event loop keeps serving
+        other clients while it waits for the database.
+
+        Args:
+            request (dict): decoded request received from the client
+            session (Session): session of the client which sent the request
+
+        Returns:
+            Answer of the handler or failure message if too many requests are waiting for a worker.
+        """
+        if not isinstance(request, dict) or request.get('command') in self.inline_commands:
+            return self.dispatch(request, session)
+
+        if self.queued >= self.max_queue:
+            return {"status": "failure", "message": "Server is busy. Try again later."}
+
+        self.queued += 1
+        try:
+            if inspect.iscoroutinefunction(self.options.get(request.get('command'))):
+                return await self.await_answer(self.dispatch(request, session))
+            return await asyncio.get_running_loop().run_in_executor(self.executor, self.dispatch, request, session)
+        finally:
+            self.queued -= 1
+
+    async def run_batch(self, requests, session):
+        """Run the requests of a batch one after another.
+
+        Args:
+            requests (list): decoded requests received in a single frame
+            session (Session): session of the client which sent the batch
+
+        Returns:
+            list: answers in the order of the requests, answers of requests with an id are tagged with it
+        """
+        if len(requests) > MAX_BATCH_SIZE:
+            return {"status": "failure", "message": f"A batch can have at most {MAX_BATCH_SIZE} requests."}
+
+        answers = []
+        for request in requests:
+            answer = await self.run_handler(request, session)
+            if inspect.isgenerator(answer):
+                await asyncio.get_running_loop().run_in_executor(self.executor, answer.close)
+                answer = {"status": "failure", "message": "Streams can't be sent in a batch."}
+            elif inspect.isasyncgen(answer):
+                await answer.aclose()
+                answer = {"status": "failure", "message": "Streams can't be sent in a batch."}
+            answers.append(self.tag(answer, request.get('request_id') if isinstance(request, dict) else None))
+        return answers
+
+    async def answer_request(self, writer, request, session):
+        """Run a request or a batch of requests and send the answer.
 
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.bind((self.host, self.port))
-            s.listen()
-            conn, addr = s.accept()
+        Returns:
+            Answer of the handler or list of answers of the batch.
+        """
+        if isinstance(request, list):
+            answer = await self.run_batch(request, session)
+            await self.send_answer(writer, answer)
+            return answer
 
-            with conn:
-                print(f"Connected by {addr}")
+        answer = await self.run_handler(request, session)
+        await self.send_answer(writer, answer, request.get('request_id') if isinstance(request, dict) else None)
+        return answer
 
-                while True:
-                    data = self.receive_msg(conn)
-                    if not data:
-                        break
+    async def answer_pipelined(self, writer, request, session):
+        try:
+            await self.answer_request(writer, request, session)
+        except (ConnectionError, ProtocolError):
+            # the connection is closed by handle_client
+            pass
 
-                    request = json.loads(data)
-                    command = request.get('command')
+    def has_stop(self, answers):
+        """Check if the 'stop' command was answered in the batch."""
+        return isinstance(answers, list) and any(
+            answer == 'stop' or (isinstance(answer, dict) and answer.get('response') == 'stop') for answer in answers)
 
-                    try:
-                        answer = self.options[command](**request)
-                        self.send_msg(conn, msg = json.dumps(answer))
-                    except KeyError:
-                        self.send_msg(conn, msg = json.dumps('Wrong command')) 
-                            
+    def is_pipelined(self, request):
+        """Check if the request can be answered out of order, while the next requests are read."""
+        return (isinstance(request, dict) and request.get('request_id') is not None
+                and request.get('command') not in self.ordered_commands)
+
+    async def await_answer(self, answer):
+        """Await the answer of an asynchronous handler, mapping errors the same way as dispatch."""
+        if not inspect.isawaitable(answer):
+            return answer
+        try:
+            return await answer
+        except KeyError:
+            return 'Wrong command'
+        except Exception as error:
+            print(f"Command failed: {error}")
+            return {"status": "failure", "message": "Internal server error. Try again later."}
+
+    async def handle_client(self, reader, writer):
+        """Serve a single client connection until it disconnects.
+
+        Args:
+            reader (asyncio.StreamReader): stream to read requests from
+            writer (asyncio.StreamWriter): stream to write answers to
+        """
+        addr = writer.get_extra_info('peername')
+        print(f"Connected by {addr}")
+        push = functools.partial(self.push_event, writer)
+        session = self.session_manager.create()
+        session.push = push
+        self.clients[asyncio.current_task()] = writer
+        self.codecs[writer] = JSON
+        self.metrics.connection_opened()
+        pending = set()
+
+        try:
+            while True:
+                try:
+                    request = await self.receive_msg(reader, self.codecs[writer])
+                except ValueError:
+                    await self.send_msg(writer, msg = 'Wrong command')
+                    continue
+                if request is None:
+                    break
+
+                # the session is replaced by a new one if it expired while the client was idle
+                session = self.session_manager.get(session.session_id) or self.session_manager.create()
+                session.push = push
+
+                # the codec is switched between two requests, after everything sent before
+                if isinstance(request, dict) and request.get('command') == 'hello':
+                    if pending:
+                        await asyncio.wait(pending)
+                    await self.hello(writer, request)
+                    continue
+
+                # requests with an id are answered as soon as they are done, possibly out of order
+                if self.is_pipelined(request):
+                    if len(pending) >= self.max_in_flight:
+                        await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    task = asyncio.create_task(self.answer_pipelined(writer, request, session))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                    continue
+
+                # other requests and batches are answered in order, after everything sent before them
+                if pending:
+                    await asyncio.wait(pending)
+                answer = await self.answer_request(writer, request, session)
+
+                if answer == 'stop' or (isinstance(request, list) and self.has_stop(answer)):
+                    self.stop_event.set()
+                    break
+        except (ConnectionError, ProtocolError):
+            pass
+        finally:
+            for task in pending:
+                task.cancel()
+            self.session_manager.remove(session.session_id)
+            self.clients.pop(asyncio.current_task(), None)
+            self.codecs.pop(writer, None)
+            self.metrics.connection_closed()
+            writer.close()
+
+    async def handle_metrics(self, reader, writer):
+        """Answer an HTTP request for the metrics page in the Prometheus text format."""
+        try:
+            request_line = await reader.readline()
+            # skip the headers
+            while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status, body = '200 OK', self.render_metrics().encode('utf-8')
+            else:
+                status, body = '404 Not Found', b'Not found\n'
+
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def render_metrics(self):
+        user_cache = getattr(self.db, 'user_cache', None)
+        notifier_stats = self.notifier.get_stats()
+        return self.metrics.render_prometheus(
+            db_stats=self.db.statements.get_stats(),
+            cache_stats=user_cache.get_stats() if user_cache is not None else None,
+            gauges={"server_queued_requests": ("Requests waiting for a worker.", self.queued),
+                    "server_sessions": ("Open sessions.", len(self.session_manager.sessions)),
+                    "server_subscriptions": ("Connections subscribed to pushed events.", notifier_stats["subscriptions"]),
+                    "server_pushed_events": ("Events pushed to subscribers.", notifier_stats["delivered"]),
+                    "server_dropped_events": ("Events dropped for slow subscribers.", notifier_stats["dropped"])})
+
+    async def expire_sessions(self):
+        """Periodically remove sessions of idle clients."""
+        while True:
+            await asyncio.sleep(self.session_manager.idle_timeout / 2)
+            self.session_manager.expire_idle()
+
+    async def maintain_messages(self):
+        """Periodically archive old messages and maintain the partitions of the messages table."""
+        while True:
+            try:
+                if self.backend == 'async':
+                    await self.archiver.run_once()
+                else:
+                    await asyncio.get_running_loop().run_in_executor(self.executor, self.archiver.run_once)
+            except Exception as error:
+                print(f"Message maintenance failed: {error}")
+            await asyncio.sleep(self.maintenance_interval)
+
+    async def serve(self):
+        """Accept and serve clients concurrently until the 'stop' command is received."""
+        self.stop_event = asyncio.Event()
+        self.clients = {}
+        # codec of every connection, JSON until the client sends 'hello'
+        self.codecs = {}
+        if self.backend == 'async':
+            await self.db.open()
+        self.notifier.bind(asyncio.get_running_loop())
+        if self.notifier.bridge is not None:
+            self.notifier.bridge.start(self.notifier)
+        self.loop = asyncio.get_running_loop()
+        if self.sock is not None:
+            server = self.listener = await asyncio.start_server(self.handle_client, sock=self.sock, backlog=self.backlog)
+        else:
+            server = self.listener = await asyncio.start_server(self.handle_client, self.host, self.port, backlog=self.backlog,
+                                                                reuse_port=self.reuse_port)
+
+        expiry_task = asyncio.create_task(self.expire_sessions())
+        maintenance_task = asyncio.create_task(self.maintain_messages()) if self.maintenance_interval > 0 else None
+        metrics_server = self.metrics_listener = None
+        if self.metrics_port is not None:
+            metrics_server = self.metrics_listener = await asyncio.start_server(self.handle_metrics, self.host, self.metrics_port)
+
+        async with server:
+            await self.stop_event.wait()
+        expiry_task.cancel()
+        if maintenance_task is not None:
+            maintenance_task.cancel()
+        if metrics_server is not None:
+            metrics_server.close()
+
+        # disconnect the remaining clients and let their handlers finish
+        for writer in self.clients.values():
+            writer.close()
+        await asyncio.gather(*self.clients, return_exceptions=True)
+        if self.committer is not None:
+            await self.committer.close()
+            if self.committer.executor is not None:
+                self.committer.executor.shutdown()
+        self.executor.shutdown()
+        self.hasher.close()
+        if self.notifier.bridge is not None:
+            self.notifier.bridge.stop()
+        if self.backend == 'async':
+            await self.db.close()
+        else:
+            self.db.close()
+
+    def shutdown(self):
+        """Stop serving, can be called from another thread or a signal handler."""
+        self.loop.call_soon_threadsafe(self.stop_event.set)
+
+    def start_server(self):
+
+        asyncio.run(self.serve())
 
     def uptime(self, *args, **kwargs):
 
@@ -82,6 +582,70 @@ class Server:
         
         return 'stop'
 
+    def stats(self, *args, **kwargs):
+        """Get request, database and connection statistics.
+
+        Returns:
+            dict: request counters per command, statement counters per query, queue and cache counters
+        """
+        user_cache = getattr(self.db, 'user_cache', None)
+        return {**self.metrics.get_stats(),
+                "uptime": str(datetime.now() - self.start_time),
+                "sessions": len(self.session_manager.sessions),
+                "queued_requests": self.queued,
+                "events": self.notifier.get_stats(),
+                "db": self.db.statements.get_stats(),
+                "user_cache": user_cache.get_stats() if user_cache is not None else None,
+                "credentials_cache": self.hasher.get_stats(),
+                "write_behind": self.committer.get_stats() if self.committer is not None else None,
+                "retention": self.archiver.get_stats()}
+
+    def subscribe(self, session, **kwargs):
+        """Push the messages sent to the logged in user to this connection, until
+        the user unsubscribes, logs out or disconnects.
+
+        Args:
+            session (Session): session of the client
+
+        Returns:
+            dict: Dictionary with status of job (failure or success) and message.
+        """
+        if not session.is_logged_in():
+            return {"status": "failure", "message": "No user is currently logged in."}
+        if session.subscription is not None:
+            return {"status": "failure", "message": "You are already subscribed."}
+
+        session.subscription = self.notifier.subscribe(session.username, session.push)
+        return {"status": "success", "message": f"New messages of {session.username} will be pushed to this connection."}
+
+    def unsubscribe(self, session, **kwargs):
+        """Stop pushing messages to this connection.
+
+        Returns:
+            dict: Dictionary with status of job (failure or success) and message.
+        """
+        if session.subscription is None:
+            return {"status": "failure", "message": "You are not subscribed."}
+
+        session.subscription.cancel()
+        session.subscription = None
+        return {"status": "success", "message": "You have unsubscribed."}
+
+    def snapshot(self):
+        """Get the counters of the server in a form which can be sent to another process
+        and added up with the counters of other workers.
+
+        Returns:
+            dict: metrics, statement, cache and event counters, queued requests and sessions
+        """
+        user_cache = getattr(self.db, 'user_cache', None)
+        return {"metrics": self.metrics.snapshot(),
+                "db": self.db.statements.get_stats(),
+                "user_cache": user_cache.get_stats() if user_cache is not None else None,
+                "events": self.notifier.get_stats(),
+                "queued_requests": self.queued,
+                "sessions": len(self.session_manager.sessions)}
+
     def help(self, *args, **kwargs):
         
         return self.commands
\ No newline at end of file
@@ -0,0 +1,103 @@
+import time
+import uuid
+from collections import OrderedDict
+
+
+class Session:
+
+    def __init__(self, session_id) -> None:
+        self.session_id = session_id
+        self.username = None
+        self.role = None
+        self.last_seen = time.monotonic()
+        # callback writing pushed events to the connection and the subscription of the user, if subscribed
+        self.push = None
+        self.subscription = None
+
+    def is_logged_in(self):
+        """Check if a user is logged in within this session.
+
+        Returns:
+            bool: True/False
+        """
+        return self.username is not None
+
+    def clear(self):
+        """Forget the logged in user and stop pushing events to the connection."""
+        self.username = None
+        self.role = None
+        if self.subscription is not None:
+            self.subscription.cancel()
+            self.subscription = None
+
+
+class SessionManager:
+    """In-memory registry of the sessions of connected clients.
+
+    Sessions are kept in least recently used order, so both the lookup and the
+    expiry of idle sessions don't need to scan the whole registry. Sessions
+    subscribed to pushed events don't expire while their connection is open.
+    """
+
+    def __init__(self, idle_timeout=1800) -> None:
+        self.idle_timeout = idle_timeout
+        self.sessions = OrderedDict()
+
+    def create(self):
+        """Create a new session for a client.
+
+        Returns:
+            Session: new session with no user logged in
+        """
+        session = Session(uuid.uuid4().hex)
+        self.sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id):
+        """Get the session and mark it as used.
+
+        Args:
+            session_id (str): id of the session
+
+        Returns:
+            Session: session or None if it doesn't exist or has expired
+        """
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None
+
+        now = time.monotonic()
+        if now - session.last_seen > self.idle_timeout and session.subscription is None:
+            self.remove(session_id)
+            return None
+
+        session.last_seen = now
+        self.sessions.move_to_end(session_id)
+        return session
+
+    def remove(self, session_id):
+        """Remove the session, e.g. when the client disconnects."""
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.clear()
+
+    def expire_idle(self):
+        """Remove all sessions which were idle for longer than the timeout.
+
+        Returns:
+            int: number of removed sessions
+        """
+        deadline = time.monotonic() - self.idle_timeout
+        expired = 0
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if session.last_seen >= deadline:
+                break
+            if session.subscription is not None:
+                # subscribed clients wait for pushed events, they are idle on purpose
+                session.last_seen = time.monotonic()
+                self.sessions.move_to_end(session_id)
+                continue
+            self.remove(session_id)
+            expired += 1
+        return expired
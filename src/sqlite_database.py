@@ -0,0 +1,368 @@
+from contextlib import contextmanager
+from datetime import timezone
+import json
+import sqlite3
+import threading
+import zlib
+from src.storage import StorageEngine
+
+# versions of the schema, the applied version is kept in PRAGMA user_version
+SCHEMA = [
+    (1, """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL,
+            role TEXT NOT NULL,
+            unread_msgs INTEGER NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS messages (
+            msg_id INTEGER PRIMARY KEY,
+            sender_id INTEGER REFERENCES users (user_id),
+            sender_name TEXT NOT NULL,
+            receiver_id INTEGER REFERENCES users (user_id),
+            receiver_name TEXT NOT NULL,
+            message TEXT,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE INDEX IF NOT EXISTS messages_receiver_id_idx ON messages (receiver_id, msg_id);
+        """),
+    (2, """
+        ALTER TABLE users ADD COLUMN last_read_msg_id INTEGER NOT NULL DEFAULT 0;
+
+        UPDATE users SET last_read_msg_id = COALESCE((
+            SELECT MAX(msg_id) FROM messages
+            WHERE receiver_id = users.user_id AND users.unread_msgs <= (
+                SELECT COUNT(*) FROM messages later WHERE later.receiver_id = users.user_id AND later.msg_id > messages.msg_id)
+        ), 0);
+        """),
+    (3, """
+        -- deleted messages which weren't read yet leave the inbox
+        CREATE TRIGGER IF NOT EXISTS messages_unread_on_delete AFTER DELETE ON messages
+        BEGIN
+            UPDATE users SET unread_msgs = MAX(unread_msgs - 1, 0)
+            WHERE user_id = OLD.receiver_id AND OLD.msg_id > last_read_msg_id;
+        END;
+        """),
+    (4, """
+        -- archived messages in batches of zlib compressed JSON
+        CREATE TABLE IF NOT EXISTS messages_archive (
+            archive_id INTEGER PRIMARY KEY,
+            first_msg_id INTEGER NOT NULL,
+            last_msg_id INTEGER NOT NULL,
+            message_count INTEGER NOT NULL,
+            archived_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            messages BLOB NOT NULL
+        );
+        """),
+    (5, """
+        -- without AUTOINCREMENT the ids of archived messages would be given again, below the read watermarks
+        CREATE TABLE messages_autoincrement (
+            msg_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sender_id INTEGER REFERENCES users (user_id),
+            sender_name TEXT NOT NULL,
+            receiver_id INTEGER REFERENCES users (user_id),
+            receiver_name TEXT NOT NULL,
+            message TEXT,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+
+        INSERT INTO messages_autoincrement (msg_id, sender_id, sender_name, receiver_id, receiver_name, message, created_at)
+        SELECT msg_id, sender_id, sender_name, receiver_id, receiver_name, message, created_at FROM messages;
+
+        DROP TABLE messages;
+        ALTER TABLE messages_autoincrement RENAME TO messages;
+
+        -- ids already archived or read count as given
+        DELETE FROM sqlite_sequence WHERE name = 'messages';
+        INSERT INTO sqlite_sequence (name, seq) SELECT 'messages', MAX(
+            COALESCE((SELECT MAX(msg_id) FROM messages), 0),
+            COALESCE((SELECT MAX(last_msg_id) FROM messages_archive), 0),
+            COALESCE((SELECT MAX(last_read_msg_id) FROM users), 0));
+
+        CREATE INDEX IF NOT EXISTS messages_receiver_id_idx ON messages (receiver_id, msg_id);
+
+        CREATE TRIGGER IF NOT EXISTS messages_unread_on_delete AFTER DELETE ON messages
+        BEGIN
+            UPDATE users SET unread_msgs = MAX(unread_msgs - 1, 0)
+            WHERE user_id = OLD.receiver_id AND OLD.msg_id > last_read_msg_id;
+        END;
+        """),
+]
+
+
+def to_timestamp(value):
+    """Format a datetime like CURRENT_TIMESTAMP, in UTC."""
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class SqliteDatabase(StorageEngine):
+    """Storage engine on an embedded SQLite database, for deployments without a database server.
+
+    The database runs in WAL mode, so readers don't block the writer. Every thread
+    gets its own connection, writes which read before they modify take the write
+    lock up front with BEGIN IMMEDIATE.
+    """
+
+    # queries which can be sent as a stream, with their SQL
+    STREAMED = {
+        "query_get_all_messages": ("SELECT sender_name, receiver_name, message FROM messages ORDER BY msg_id", ()),
+    }
+
+    def __init__(self, config, pool_config=None) -> None:
+        super().__init__()
+        self.path = config['path']
+        self.timeout = float(config.get('timeout', 5))
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+        self.apply_schema()
+
+    def connect(self):
+        # a connection is used by one thread at a time, but closed by the thread calling close()
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def get_connection(self):
+        """Get the connection of the current thread, opening it on first use."""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = self.connect()
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """Run the statements in a transaction which is committed or rolled back on error."""
+        conn = self.get_connection()
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def apply_schema(self):
+        with self.transaction(immediate=True) as conn:
+            current_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for version, sql in SCHEMA:
+                if version > current_version:
+                    # statements end at a semicolon which isn't inside a trigger body
+                    statement = ''
+                    for part in sql.split(';'):
+                        statement += part + ';'
+                        if sqlite3.complete_statement(statement):
+                            conn.execute(statement)
+                            statement = ''
+                    conn.execute(f"PRAGMA user_version = {version}")
+
+    def fetch(self, sql, values=()):
+        return [dict(row) for row in self.get_connection().execute(sql, values)]
+
+    def close(self):
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections.clear()
+
+    def stream_data(self, params: dict, chunk_size=1000):
+        """Get data in chunks from a dedicated connection, which reads a snapshot of the database.
+
+        Chunks may be fetched by different worker threads, one at a time.
+        """
+        if params['query'] not in self.STREAMED:
+            raise ValueError(f"Query {params['query']} can't be streamed.")
+        sql, values = self.STREAMED[params['query']]
+
+        conn = self.connect()
+        try:
+            cur = conn.execute(sql, values)
+            while rows := cur.fetchmany(chunk_size):
+                yield [dict(row) for row in rows]
+        finally:
+            conn.close()
+
+    def query_insert_user(self, arguments: dict):
+        self.get_connection().execute(
+            "INSERT INTO users (username, password, role, unread_msgs) VALUES (?, ?, ?, ?)",
+            (arguments['username'], arguments['password'], arguments['role'], arguments['unread_msgs']))
+        return []
+
+    def insert_message(self, conn, sender, receiver_id, receiver, message):
+        conn.execute(
+            """
+            INSERT INTO messages (sender_id, sender_name, receiver_id, receiver_name, message)
+            VALUES ((SELECT user_id FROM users WHERE username = ?), ?, ?, ?, ?)
+            """, (sender, sender, receiver_id, receiver, message))
+
+    def query_insert_message(self, arguments: dict):
+        with self.transaction(immediate=True) as conn:
+            row = conn.execute("SELECT user_id FROM users WHERE username = ?", (arguments['receiver'],)).fetchone()
+            if row is not None:
+                self.insert_message(conn, arguments['sender'], row['user_id'], arguments['receiver'], arguments['message'])
+        return []
+
+    def increment_inbox(self, conn, receiver, inbox_limit):
+        """Count a new message in the recipient's inbox with a single capped increment.
+
+        Returns:
+            tuple: True if the recipient exists and its user_id, or None if the inbox is full
+        """
+        rows = conn.execute("UPDATE users SET unread_msgs = unread_msgs + 1 WHERE username = ? AND unread_msgs < ? RETURNING user_id",
+                            (receiver, inbox_limit)).fetchall()
+        if rows:
+            return True, rows[0]['user_id']
+        # the recipient is only looked up when the message doesn't fit
+        return conn.execute("SELECT 1 FROM users WHERE username = ?", (receiver,)).fetchone() is not None, None
+
+    def query_send_message(self, arguments: dict):
+        receiver = arguments['receiver']
+        with self.transaction(immediate=True) as conn:
+            exists, receiver_id = self.increment_inbox(conn, receiver, arguments['inbox_limit'])
+            if receiver_id is not None:
+                self.insert_message(conn, arguments['sender'], receiver_id, receiver, arguments['message'])
+        return [{"recipient_exists": exists, "sent": receiver_id is not None}]
+
+    def query_send_messages(self, arguments: dict):
+        rows = []
+        # all messages of the group are committed with a single transaction
+        with self.transaction(immediate=True) as conn:
+            for sender, receiver, message in zip(arguments['senders'], arguments['receivers'], arguments['messages']):
+                exists, receiver_id = self.increment_inbox(conn, receiver, arguments['inbox_limit'])
+                if receiver_id is not None:
+                    self.insert_message(conn, sender, receiver_id, receiver, message)
+                rows.append({"recipient_exists": exists, "sent": receiver_id is not None})
+        return rows
+
+    def query_broadcast_message(self, arguments: dict):
+        receivers = list(dict.fromkeys(arguments['receivers']))
+        with self.transaction(immediate=True) as conn:
+            counted = {}
+            # capped increments of all inboxes, in batches below the limit of SQLite parameters
+            for start in range(0, len(receivers), 500):
+                batch = receivers[start:start + 500]
+                counted.update((row['username'], row) for row in conn.execute(
+                    f"""
+                    UPDATE users SET unread_msgs = unread_msgs + 1
+                    WHERE username IN ({', '.join('?' * len(batch))}) AND unread_msgs < ?
+                    RETURNING user_id, username
+                    """, [*batch, arguments['inbox_limit']]).fetchall())
+
+            # recipients which didn't get the message are either full or don't exist
+            missing = [receiver for receiver in receivers if receiver not in counted]
+            found = set(counted)
+            for start in range(0, len(missing), 500):
+                batch = missing[start:start + 500]
+                found.update(row['username'] for row in conn.execute(
+                    f"SELECT username FROM users WHERE username IN ({', '.join('?' * len(batch))})", batch))
+
+            inbox = [counted[receiver] for receiver in receivers if receiver in counted]
+            sender_id = conn.execute("SELECT user_id FROM users WHERE username = ?", (arguments['sender'],)).fetchone()
+            conn.executemany(
+                "INSERT INTO messages (sender_id, sender_name, receiver_id, receiver_name, message) VALUES (?, ?, ?, ?, ?)",
+                [(sender_id[0] if sender_id else None, arguments['sender'], row['user_id'], row['username'], arguments['message'])
+                 for row in inbox])
+
+        sent = {row['username'] for row in inbox}
+        return [{"recipient": receiver, "recipient_exists": receiver in found, "sent": receiver in sent}
+                for receiver in receivers]
+
+    def query_check_if_user_exist(self, arguments: dict):
+        return self.fetch("SELECT user_id FROM users WHERE username = ?", (arguments['username'],))
+
+    def query_get_user_data(self, arguments: dict):
+        return self.fetch("SELECT * FROM users WHERE username = ?", (arguments['username'],))
+
+    def query_get_user_credentials(self, arguments: dict):
+        return self.fetch("SELECT username, password, role FROM users WHERE username = ?", (arguments['username'],))
+
+    def query_update_password(self, arguments: dict):
+        self.get_connection().execute("UPDATE users SET password = ? WHERE username = ?",
+                                      (arguments['password'], arguments['username']))
+        return []
+
+    def query_get_user_messages(self, arguments: dict):
+        return self.fetch(
+            """
+            SELECT messages.sender_name, messages.message
+            FROM messages
+            JOIN users ON users.user_id = messages.receiver_id
+            WHERE users.username = ?
+            ORDER BY messages.msg_id
+            """, (arguments['receiver'],))
+
+    def query_read_new_messages(self, arguments: dict):
+        with self.transaction(immediate=True) as conn:
+            reader = conn.execute("SELECT user_id, last_read_msg_id FROM users WHERE username = ?", (arguments['username'],)).fetchone()
+            if reader is None:
+                return []
+            rows = conn.execute(
+                """
+                SELECT msg_id, sender_name, message
+                FROM messages
+                WHERE receiver_id = ? AND msg_id > ?
+                ORDER BY msg_id
+                LIMIT ?
+                """, (reader['user_id'], reader['last_read_msg_id'], arguments['limit'])).fetchall()
+            if rows:
+                conn.execute("UPDATE users SET last_read_msg_id = ?, unread_msgs = MAX(unread_msgs - ?, 0) WHERE user_id = ?",
+                             (rows[-1]['msg_id'], len(rows), reader['user_id']))
+        return [{"sender_name": row['sender_name'], "message": row['message']} for row in rows]
+
+    def query_get_all_messages(self, arguments: dict = None):
+        return self.fetch(*self.STREAMED["query_get_all_messages"])
+
+    def query_get_messages_page(self, arguments: dict):
+        return self.fetch(
+            """
+            SELECT msg_id, sender_name, receiver_name, message
+            FROM messages
+            WHERE msg_id > ?
+            ORDER BY msg_id
+            LIMIT ?
+            """, (arguments['after_id'], arguments['limit']))
+
+    def query_update_unread_msgs(self, arguments: dict):
+        self.get_connection().execute(
+            "UPDATE users SET unread_msgs = ? WHERE username = ?", (arguments['unread_msgs'], arguments['username']))
+        return []
+
+    def query_archive_messages(self, arguments: dict):
+        cutoff = to_timestamp(arguments['cutoff'])
+        with self.transaction(immediate=True) as conn:
+            # ids grow with the time of sending, the scan stops at the first message which is kept
+            rows = [dict(row) for row in conn.execute(
+                """
+                SELECT messages.msg_id, messages.sender_id, messages.sender_name, messages.receiver_id,
+                       messages.receiver_name, messages.message, messages.created_at
+                FROM messages
+                JOIN users ON users.user_id = messages.receiver_id
+                WHERE messages.msg_id < COALESCE((SELECT MIN(msg_id) FROM messages WHERE created_at >= ?), 9223372036854775807)
+                  AND messages.created_at < ? AND messages.msg_id <= users.last_read_msg_id
+                ORDER BY messages.msg_id
+                LIMIT ?
+                """, (cutoff, cutoff, arguments['limit']))]
+            if rows:
+                conn.execute(
+                    "INSERT INTO messages_archive (first_msg_id, last_msg_id, message_count, messages) VALUES (?, ?, ?, ?)",
+                    (rows[0]['msg_id'], rows[-1]['msg_id'], len(rows), zlib.compress(json.dumps(rows).encode('utf-8'))))
+                conn.executemany("DELETE FROM messages WHERE msg_id = ?", [(row['msg_id'],) for row in rows])
+        return [{"archived": len(rows)}]
+
+    def query_purge_archive(self, arguments: dict):
+        with self.transaction() as conn:
+            purged = conn.execute("DELETE FROM messages_archive WHERE archived_at < ? RETURNING message_count",
+                                  (to_timestamp(arguments['cutoff']),)).fetchall()
+        return [{"purged": sum(row['message_count'] for row in purged)}]
+
+    def query_maintain_partitions(self, arguments: dict):
+        # SQLite has no partitioned tables
+        return [{"created": 0, "dropped": 0}]
@@ -0,0 +1,118 @@
+import threading
+import time
+import psycopg2
+import psycopg2.errors
+import src.queries as queries
+
+
+class PreparedConnection(psycopg2.extensions.connection):
+    """psycopg2 connection which remembers the statements prepared in its session."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+def to_positional(query):
+    """Convert psycopg2 %s placeholders to $n parameters used by PREPARE."""
+    parts = query.replace('%%', '\0').split('%s')
+    converted = parts[0]
+    for number, part in enumerate(parts[1:], start=1):
+        converted += f"${number}{part}"
+    return converted.replace('\0', '%')
+
+
+class StatementRegistry:
+    """Registry of the query builders from src/queries.py.
+
+    Builders are resolved once, each statement is prepared once per connection
+    with PREPARE and later run with EXECUTE, so PostgreSQL doesn't parse and plan
+    it again. The registry also counts executions and their time per statement.
+    """
+
+    def __init__(self, prepare=True) -> None:
+        self.prepare = prepare
+        self.builders = {}
+        self.prepared_sql = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def build(self, params: dict):
+        """Build the query with its arguments.
+
+        Args:
+            params (dict): {query: query_name, query_arguments: dict} dictionary with parameters for query.
+
+        Returns:
+            tuple: query and values
+        """
+        name = params['query']
+        builder = self.builders.get(name)
+        if builder is None:
+            if not name.startswith('query_') or not hasattr(queries, name):
+                raise ValueError(f"Unknown query {name}.")
+            builder = self.builders[name] = getattr(queries, name)
+        return builder(params.get('query_arguments'))
+
+    def execute(self, cur, params: dict):
+        """Execute the query on the cursor, preparing it first if the connection hasn't seen it yet.
+
+        Args:
+            cur: psycopg2 cursor
+            params (dict): {query: query_name, query_arguments: dict} dictionary with parameters for query.
+        """
+        name = params['query']
+        query, values = self.build(params)
+        prepared = getattr(cur.connection, 'prepared', None)
+
+        start = time.perf_counter()
+        # server-side (named) cursors can't be declared for EXECUTE
+        if not self.prepare or prepared is None or cur.name is not None:
+            cur.execute(query, values)
+        else:
+            try:
+                self.execute_prepared(cur, prepared, name, query, values)
+            except psycopg2.errors.InvalidSqlStatementName:
+                # the statement was deallocated, e.g. by DISCARD ALL, prepare it again
+                cur.connection.rollback()
+                prepared.discard(name)
+                self.execute_prepared(cur, prepared, name, query, values)
+            except psycopg2.errors.FeatureNotSupported:
+                # the tables changed under the prepared plan, prepare it again
+                cur.connection.rollback()
+                cur.execute(f"DEALLOCATE {name}")
+                prepared.discard(name)
+                self.execute_prepared(cur, prepared, name, query, values)
+        self.record(name, time.perf_counter() - start)
+
+    def execute_prepared(self, cur, prepared, name, query, values):
+        if name not in prepared:
+            sql = self.prepared_sql.get(name)
+            if sql is None:
+                sql = self.prepared_sql[name] = f"PREPARE {name} AS {to_positional(query)}"
+            cur.execute(sql)
+            prepared.add(name)
+
+        if values:
+            cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(values))})", values)
+        else:
+            cur.execute(f"EXECUTE {name}")
+
+    def record(self, name, elapsed):
+        with self.lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = {"count": 0, "total_time": 0.0, "max_time": 0.0}
+            stats["count"] += 1
+            stats["total_time"] += elapsed
+            stats["max_time"] = max(stats["max_time"], elapsed)
+
+    def get_stats(self):
+        """Get execution counters of every statement.
+
+        Returns:
+            dict: {query_name: {count, total_time, max_time, mean_time}}, times in seconds
+        """
+        with self.lock:
+            return {name: {**stats, "mean_time": stats["total_time"] / stats["count"]}
+                    for name, stats in self.stats.items()}
@@ -0,0 +1,105 @@
+import time
+import src.queries as queries
+from src.statements import StatementRegistry
+
+
+class StorageEngine:
+    """Interface of the storage engines used by UserManager and MessageManager.
+
+    The managers only pass {"query", "query_arguments"} parameters naming a query
+    from src/queries.py. An engine which doesn't speak SQL of PostgreSQL implements
+    every query as a method with the same name, taking the query arguments and
+    returning the rows as a list of dictionaries, and gets the rest from this class.
+    """
+
+    def __init__(self) -> None:
+        # only the execution counters are used, engines don't prepare PostgreSQL statements
+        self.statements = StatementRegistry(prepare=False)
+
+    def run(self, params: dict):
+        """Run the query method of the engine.
+
+        Args:
+            params (dict): {query: query_name, query_arguments: dict} dictionary with parameters for query.
+
+        Returns:
+            list: rows
+        """
+        name = params['query']
+        if not name.startswith('query_') or not hasattr(queries, name):
+            raise ValueError(f"Unknown query {name}.")
+
+        start = time.perf_counter()
+        rows = getattr(self, name)(params.get('query_arguments') or {})
+        self.statements.record(name, time.perf_counter() - start)
+        return rows
+
+    def save_data(self, params: dict):
+        """Execute query.
+
+        Args:
+            params (dict): {query: query_name, query_arguments: dict} dictionary with parameters for query.
+        """
+        self.run(params)
+
+    def save_and_get_data(self, params: dict):
+        """Execute query which modifies data and returns a row.
+
+        Args:
+            params (dict): {query: query_name, query_arguments: dict} dictionary with parameters for query.
+
+        Returns:
+            dict: first row returned by the query or None
+        """
+        rows = self.run(params)
+        return rows[0] if rows else None
+
+    def save_and_get_all(self, params: dict):
+        """Execute query which modifies data and returns rows.
+
+        Args:
+            params (dict): {query: query_name, query_arguments: dict} dictionary with parameters for query.
+
+        Returns:
+            list: rows returned by the query
+        """
+        return self.run(params)
+
+    def get_data(self, params: dict):
+        """Get data from the engine.
+
+        Args:
+            params (dict): {query: query_name, query_arguments: dict} dictionary with parameters for query.
+
+        Returns:
+            list: rows
+        """
+        return self.run(params)
+
+    def check_data(self, params: dict):
+        """Check data if exist.
+
+        Args:
+            params (dict): {query: query_name, query_arguments: dict} dictionary with parameters for query.
+
+        Returns:
+            bool: True if exist or False if not
+        """
+        return len(self.run(params)) > 0
+
+    def stream_data(self, params: dict, chunk_size=1000):
+        """Get data in chunks.
+
+        Args:
+            params (dict): {query: query_name, query_arguments: dict} dictionary with parameters for query.
+            chunk_size (int): number of rows in a chunk
+
+        Yields:
+            list: next chunk of rows
+        """
+        rows = self.run(params)
+        for start in range(0, len(rows), chunk_size):
+            yield rows[start:start + chunk_size]
+
+    def close(self):
+        """Release the resources of the engine."""
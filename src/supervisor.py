@@ -0,0 +1,287 @@
+import asyncio
+import multiprocessing
+import queue
+import signal
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.metrics import Metrics
+from src.server import Server
+
+
+class WorkerServer(Server):
+    """Server of a worker process, which periodically reports its counters to the supervisor.
+
+    SIGTERM stops the worker gracefully, SIGINT is left to the supervisor.
+    """
+
+    def __init__(self, *args, worker_id=0, stats_queue=None, stats_interval=1.0, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.worker_id = worker_id
+        self.stats_queue = stats_queue
+        self.stats_interval = float(stats_interval)
+
+    async def report_stats(self):
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            self.stats_queue.put((self.worker_id, self.snapshot()))
+
+    async def serve(self):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, self.shutdown)
+        reporter = asyncio.create_task(self.report_stats())
+        try:
+            await super().serve()
+        finally:
+            reporter.cancel()
+            self.stats_queue.put((self.worker_id, self.snapshot()))
+
+
+def run_worker(worker_id, stats_queue, args, kwargs):
+    """Entry point of a worker process."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    server = WorkerServer(*args, worker_id=worker_id, stats_queue=stats_queue, **kwargs)
+    server.start_server()
+
+
+def merge_statement_stats(stats_list):
+    """Add up the statement counters of several workers, see StatementRegistry.get_stats."""
+    merged = {}
+    for stats in stats_list:
+        for name, counters in stats.items():
+            total = merged.setdefault(name, {"count": 0, "total_time": 0.0, "max_time": 0.0})
+            total["count"] += counters["count"]
+            total["total_time"] += counters["total_time"]
+            total["max_time"] = max(total["max_time"], counters["max_time"])
+    return {name: {**total, "mean_time": total["total_time"] / total["count"]} for name, total in merged.items()}
+
+
+def merge_cache_stats(stats_list):
+    """Add up the user cache counters of several workers, see UserCache.get_stats."""
+    stats_list = [stats for stats in stats_list if stats is not None]
+    if not stats_list:
+        return None
+    merged = {key: sum(stats[key] for stats in stats_list) for key in ("size", "hits", "misses", "invalidations")}
+    lookups = merged["hits"] + merged["misses"]
+    merged["hit_ratio"] = merged["hits"] / lookups if lookups else 0.0
+    return merged
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the metrics of all workers in the Prometheus text format."""
+
+    def do_GET(self):
+        if self.path.split('?')[0] == '/metrics':
+            status, body = 200, self.server.supervisor.render_metrics().encode('utf-8')
+        else:
+            status, body = 404, b'Not found\n'
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Supervisor:
+    """Runs the server in several worker processes, which share the listening port,
+    so the throughput isn't limited by a single interpreter.
+
+    Workers bind the port with SO_REUSEPORT, so the kernel balances connections
+    between them. Where SO_REUSEPORT isn't available they accept connections from a
+    socket bound by the supervisor. A crashed worker is started again after a delay,
+    which grows while it keeps crashing. A worker which exits on its own, after the
+    'stop' command, stops the whole server.
+
+    Every worker has its own database connections and sessions, so the storage engine
+    must be shared between processes (postgresql or sqlite) and pushed events reach
+    subscribers on other workers only through notify_channel. The user cache of a
+    worker isn't invalidated by the writes of the others, so it is disabled when
+    there is more than one worker.
+
+    Args:
+        host (str): address to listen on
+        port (int): port shared by the workers, 0 picks a free one
+        version (str): version of the server
+        config (dict): settings of the storage engine
+        workers (int): number of worker processes
+        metrics_port (int): port of the HTTP endpoint with the metrics of all workers
+        restart_delay (float): seconds before a crashed worker is started again
+        stats_interval (float): seconds between the reports of the workers
+        server_kwargs: other arguments of Server
+    """
+
+    # a worker which ran longer than this is considered healthy again and restarted without backoff
+    STABLE_TIME = 10.0
+    MAX_RESTART_DELAY = 30.0
+
+    def __init__(self, host, port, version, config, workers=2, metrics_port=None, restart_delay=1.0,
+                 stats_interval=1.0, reuse_port=None, **server_kwargs) -> None:
+        if server_kwargs.get('engine', 'postgresql') == 'memory':
+            raise ValueError("The memory storage engine can't be shared between worker processes.")
+        self.host = host
+        self.port = int(port)
+        self.version = version
+        self.config = config
+        self.workers = int(workers)
+        self.metrics_port = int(metrics_port) if metrics_port not in (None, '') else None
+        self.restart_delay = float(restart_delay)
+        self.stats_interval = float(stats_interval)
+        self.reuse_port = hasattr(socket, 'SO_REUSEPORT') if reuse_port is None else reuse_port
+        self.server_kwargs = server_kwargs
+        if self.workers > 1 and server_kwargs.get('cache_config'):
+            # a user who signed up on one worker would be missing on the others until the cache expires
+            print("The user cache is disabled, it can't be shared between worker processes.")
+            self.server_kwargs = {**server_kwargs, "cache_config": None}
+        self.stats_queue = multiprocessing.Queue()
+        self.processes = {}
+        self.started_at = {}
+        self.failures = {}
+        self.restarts = {}
+        self.restart_at = {}
+        self.worker_stats = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.ready = threading.Event()
+        self.sock = None
+        self.metrics_server = None
+
+    def bind(self):
+        """Bind the shared port. With SO_REUSEPORT the socket only reserves the port for
+        the workers, otherwise it is the listening socket of all of them."""
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.sock.bind((self.host, self.port))
+        self.port = self.sock.getsockname()[1]
+        if not self.reuse_port:
+            self.sock.listen(int(self.server_kwargs.get('backlog', 1024)))
+
+    def spawn(self, worker_id):
+        if self.reuse_port:
+            kwargs = {**self.server_kwargs, "reuse_port": True}
+        else:
+            kwargs = {**self.server_kwargs, "sock": self.sock}
+        # workers aren't daemonic, so they can start the processes hashing passwords, stop_workers() ends them
+        process = multiprocessing.Process(target=run_worker, name=f"worker-{worker_id}",
+                                          args=(worker_id, self.stats_queue, (self.host, self.port, self.version, self.config),
+                                                {**kwargs, "stats_interval": self.stats_interval}))
+        process.start()
+        self.processes[worker_id] = process
+        self.started_at[worker_id] = time.monotonic()
+        print(f"Started worker {worker_id} (pid {process.pid}).")
+
+    def check_workers(self):
+        """Restart crashed workers. Returns False if a worker stopped on its own and the server should stop."""
+        now = time.monotonic()
+        for worker_id, process in list(self.processes.items()):
+            if process.is_alive():
+                continue
+            if worker_id in self.restart_at:
+                if now >= self.restart_at[worker_id]:
+                    del self.restart_at[worker_id]
+                    self.restarts[worker_id] = self.restarts.get(worker_id, 0) + 1
+                    self.spawn(worker_id)
+                continue
+            if process.exitcode == 0:
+                print(f"Worker {worker_id} has stopped, stopping the server.")
+                return False
+
+            if now - self.started_at[worker_id] > self.STABLE_TIME:
+                self.failures[worker_id] = 0
+            delay = min(self.restart_delay * 2 ** self.failures.get(worker_id, 0), self.MAX_RESTART_DELAY)
+            self.failures[worker_id] = self.failures.get(worker_id, 0) + 1
+            self.restart_at[worker_id] = now + delay
+            print(f"Worker {worker_id} crashed with exit code {process.exitcode}, restarting in {delay:.1f} s.")
+        return True
+
+    def collect_stats(self, timeout):
+        """Keep the latest report of every worker, waiting up to timeout seconds for the first one."""
+        try:
+            worker_id, snapshot = self.stats_queue.get(timeout=timeout)
+            while True:
+                with self.lock:
+                    self.worker_stats[worker_id] = snapshot
+                worker_id, snapshot = self.stats_queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def get_stats(self):
+        """Get the counters of all workers added up.
+
+        Returns:
+            dict: request counters per command like the 'stats' command, statement and cache
+            counters, and the process id, restarts and state of every worker
+        """
+        with self.lock:
+            snapshots = list(self.worker_stats.values())
+        return {**Metrics.merge(snapshot["metrics"] for snapshot in snapshots).get_stats(),
+                "sessions": sum(snapshot["sessions"] for snapshot in snapshots),
+                "queued_requests": sum(snapshot["queued_requests"] for snapshot in snapshots),
+                "db": merge_statement_stats(snapshot["db"] for snapshot in snapshots),
+                "user_cache": merge_cache_stats(snapshot["user_cache"] for snapshot in snapshots),
+                "workers": {worker_id: {"pid": process.pid, "alive": process.is_alive(), "restarts": self.restarts.get(worker_id, 0)}
+                            for worker_id, process in self.processes.items()}}
+
+    def render_metrics(self):
+        with self.lock:
+            snapshots = list(self.worker_stats.values())
+        return Metrics.merge(snapshot["metrics"] for snapshot in snapshots).render_prometheus(
+            db_stats=merge_statement_stats(snapshot["db"] for snapshot in snapshots),
+            cache_stats=merge_cache_stats(snapshot["user_cache"] for snapshot in snapshots),
+            gauges={"server_queued_requests": ("Requests waiting for a worker.", sum(snapshot["queued_requests"] for snapshot in snapshots)),
+                    "server_sessions": ("Open sessions.", sum(snapshot["sessions"] for snapshot in snapshots)),
+                    "server_workers": ("Running worker processes.", sum(process.is_alive() for process in self.processes.values())),
+                    "server_worker_restarts": ("Restarts of crashed worker processes.", sum(self.restarts.values()))})
+
+    def start_metrics_server(self):
+        self.metrics_server = ThreadingHTTPServer((self.host, self.metrics_port), MetricsHandler)
+        self.metrics_server.supervisor = self
+        threading.Thread(target=self.metrics_server.serve_forever, name='metrics', daemon=True).start()
+
+    def stop(self):
+        """Stop the workers and return from run(), can be called from another thread."""
+        self.stop_event.set()
+
+    def run(self):
+        """Start the workers and supervise them until the server is stopped."""
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *args: self.stop())
+
+        self.bind()
+        for worker_id in range(self.workers):
+            self.spawn(worker_id)
+        if self.metrics_port is not None:
+            self.start_metrics_server()
+        print(f"Supervising {self.workers} workers on port {self.port}.")
+        self.ready.set()
+
+        try:
+            while not self.stop_event.is_set():
+                self.collect_stats(timeout=0.2)
+                if not self.check_workers():
+                    break
+        finally:
+            self.stop_workers()
+
+    def stop_workers(self, timeout=10.0):
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in self.processes.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.kill()
+                process.join()
+        # the final reports of the stopped workers
+        self.collect_stats(timeout=0)
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+            self.metrics_server.server_close()
+        self.sock.close()
+        print("All workers have stopped.")
@@ -0,0 +1,200 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class UserCache:
+    """Bounded LRU cache of user records with time to live.
+
+    Missing users are cached as well (as None), so repeated lookups of
+    a non-existent name don't reach the database either.
+    """
+
+    def __init__(self, max_size=10000, ttl=60) -> None:
+        self.max_size = int(max_size)
+        self.ttl = float(ttl)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, username):
+        """Get the cached user record.
+
+        Args:
+            username (str): name of user
+
+        Returns:
+            tuple: (True, record) on hit, record is None for a missing user, (False, None) on miss
+        """
+        with self.lock:
+            entry = self.entries.get(username)
+            if entry is not None:
+                record, expires_at = entry
+                if expires_at > time.monotonic():
+                    self.entries.move_to_end(username)
+                    self.hits += 1
+                    return True, record
+                del self.entries[username]
+            self.misses += 1
+            return False, None
+
+    def put(self, username, record):
+        """Cache the user record, evicting the least recently used one if the cache is full."""
+        with self.lock:
+            self.entries[username] = (record, time.monotonic() + self.ttl)
+            self.entries.move_to_end(username)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, username):
+        """Remove the user record, e.g. after it was changed in the database."""
+        with self.lock:
+            if self.entries.pop(username, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        """Get cache counters.
+
+        Returns:
+            dict: size, hits, misses, invalidations and hit ratio
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self.entries), "hits": self.hits, "misses": self.misses,
+                    "invalidations": self.invalidations,
+                    "hit_ratio": self.hits / lookups if lookups else 0.0}
+
+
+class CachedDatabase:
+    """Read-through user cache in front of a database.
+
+    User lookups are answered from the cache, everything else is passed to
+    the database. Queries which modify a user invalidate its record. A lookup
+    racing with an update can still cache the old record, the time to live
+    bounds how long it's served.
+    """
+
+    # user lookups answered from the cache, with the argument holding the username
+    USER_LOOKUPS = {
+        "query_check_if_user_exist": "username",
+        "query_get_user_data": "username",
+        "query_get_user_credentials": "username",
+    }
+    # queries which modify users, with the argument holding the username or a list of usernames
+    USER_UPDATES = {
+        "query_insert_user": "username",
+        "query_update_unread_msgs": "username",
+        "query_update_password": "username",
+        "query_read_new_messages": "username",
+        "query_send_message": "receiver",
+        "query_broadcast_message": "receivers",
+        "query_send_messages": "receivers",
+    }
+
+    def __init__(self, database, user_cache) -> None:
+        self.db = database
+        self.user_cache = user_cache
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def get_user(self, username):
+        """Get the user record from the cache or load it from the database.
+
+        Returns:
+            dict: user record or None if there is no such user
+        """
+        found, record = self.user_cache.get(username)
+        if not found:
+            rows = self.db.get_data({"query": "query_get_user_data", "query_arguments": {"username": username}})
+            record = dict(rows[0]) if rows else None
+            self.user_cache.put(username, record)
+        return record
+
+    def invalidate(self, params: dict):
+        key = self.USER_UPDATES.get(params['query'])
+        if key is None:
+            return
+        usernames = params['query_arguments'][key]
+        for username in [usernames] if isinstance(usernames, str) else usernames:
+            self.user_cache.invalidate(username)
+
+    def save_data(self, params: dict):
+        try:
+            return self.db.save_data(params)
+        finally:
+            self.invalidate(params)
+
+    def save_and_get_data(self, params: dict):
+        try:
+            return self.db.save_and_get_data(params)
+        finally:
+            self.invalidate(params)
+
+    def save_and_get_all(self, params: dict):
+        try:
+            return self.db.save_and_get_all(params)
+        finally:
+            self.invalidate(params)
+
+    def get_data(self, params: dict):
+        key = self.USER_LOOKUPS.get(params['query'])
+        if key is None:
+            return self.db.get_data(params)
+        record = self.get_user(params['query_arguments'][key])
+        return [] if record is None else [record]
+
+    def check_data(self, params: dict):
+        key = self.USER_LOOKUPS.get(params['query'])
+        if key is None:
+            return self.db.check_data(params)
+        return self.get_user(params['query_arguments'][key]) is not None
+
+
+class AsyncCachedDatabase(CachedDatabase):
+    """Read-through user cache in front of an asyncio database, e.g. AsyncDatabase."""
+
+    async def get_user(self, username):
+        found, record = self.user_cache.get(username)
+        if not found:
+            rows = await self.db.get_data({"query": "query_get_user_data", "query_arguments": {"username": username}})
+            record = dict(rows[0]) if rows else None
+            self.user_cache.put(username, record)
+        return record
+
+    async def save_data(self, params: dict):
+        try:
+            return await self.db.save_data(params)
+        finally:
+            self.invalidate(params)
+
+    async def save_and_get_data(self, params: dict):
+        try:
+            return await self.db.save_and_get_data(params)
+        finally:
+            self.invalidate(params)
+
+    async def save_and_get_all(self, params: dict):
+        try:
+            return await self.db.save_and_get_all(params)
+        finally:
+            self.invalidate(params)
+
+    async def get_data(self, params: dict):
+        key = self.USER_LOOKUPS.get(params['query'])
+        if key is None:
+            return await self.db.get_data(params)
+        record = await self.get_user(params['query_arguments'][key])
+        return [] if record is None else [record]
+
+    async def check_data(self, params: dict):
+        key = self.USER_LOOKUPS.get(params['query'])
+        if key is None:
+            return await self.db.check_data(params)
+        return await self.get_user(params['query_arguments'][key]) is not None
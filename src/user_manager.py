@@ -1,17 +1,19 @@
+from src.passwords import PasswordHasher, needs_rehash
 from src.user import User
 
 class UserManager():
 
-    def __init__(self, database) -> None:
+    def __init__(self, database, hasher=None) -> None:
         self.db = database
-        self.logged_in_user = None
-        self.logged_in_role = None
+        # hashes passwords off the event loop, runs in the calling thread if not given
+        self.hasher = hasher if hasher is not None else PasswordHasher(workers=0)
 
 
-    def create_account(self, **kwargs):
+    def create_account(self, session=None, **kwargs):
         """Create account for new user. Username must be unique. 
 
         Args:
+            session (Session): session of the client
             username (str): name of user
             password (str): password
             role (str): role (admin or user)
@@ -25,18 +27,22 @@ class UserManager():
 
         if role not in ['user', 'admin']:
             return {"status": "failure", 'message': 'Wrong role. Select user or admin.'}
+        if not isinstance(password, str) or not password:
+            return {"status": "failure", "message": "Password can't be empty."}
         
         if self.db.check_data({"query": "query_check_if_user_exist", "query_arguments": {"username": username}}) == True:
             return {"status": "failure", "message": f"User with that name already exist."}
         else:
-            user = User(username, password, role)
+            # only the salted hash of the password is stored
+            user = User(username, self.hasher.hash(password), role)
             self.db.save_data({"query": "query_insert_user", "query_arguments": user.__dict__})
             return {"status": "success", "message": f"You have created new account named {username}."}
 
-    def login(self, **kwargs):
+    def login(self, session, **kwargs):
         """Log in to an account. 
 
         Args:
+            session (Session): session of the client
             username (str): name of user
             password (str): password
 
@@ -46,55 +52,41 @@ class UserManager():
         username = kwargs.get('username')
         password = kwargs.get('password')
 
-        if self.logged_in_user is not None:
-            return {"status": "failure", "message": f"You are logged in as {self.logged_in_user}."}
+        if session.is_logged_in():
+            return {"status": "failure", "message": f"You are logged in as {session.username}."}
         
-        if self.db.check_data({"query": "query_check_user_credentials", "query_arguments": {"username": username, 'password': password}}):
-            user = self.db.get_data({"query": "query_get_user_data", "query_arguments": {"username": username}})[0]
-            self.logged_in_user = username
-            self.logged_in_role = user['role']
+        if not isinstance(password, str):
+            return {"status": "failure", "message": f"Invalid username or password."}
+
+        # the password hash and the role come with a single query
+        rows = self.db.get_data({"query": "query_get_user_credentials", "query_arguments": {"username": username}})
+        user = rows[0] if rows else None
+        if self.hasher.verify(username, password, user['password'] if user else None):
+            self.upgrade_password(username, password, user['password'])
+            session.username = username
+            session.role = user['role']
             return {"status": "success", "message": f"User {username} logged in."}
         else:
             return {"status": "failure", "message": f"Invalid username or password."}
 
-    def logout(self, **kwargs):
+    def upgrade_password(self, username, password, stored):
+        """Replace a password stored in plain text, or hashed with old parameters, with a new hash
+        after the user logged in with it."""
+        if needs_rehash(stored):
+            self.db.save_data({"query": "query_update_password", "query_arguments": {"username": username, "password": self.hasher.hash(password)}})
+
+    def logout(self, session, **kwargs):
         """Log out of an account. 
 
         Args:
-            username (str): name of user
-            password (str): password
+            session (Session): session of the client
 
         Returns:
             dict: Dictionary with status of job (failure or success) and message.
         """
-        if self.logged_in_user: 
-            username = self.logged_in_user
-            self.logged_in_user = None
-            self.logged_in_role = None
+        if session.is_logged_in(): 
+            username = session.username
+            session.clear()
             return {"status": "success","message": f"User {username} logged out."}
         else:
-            return {"status": "failure", "message": "No user is currently logged in"}
-        
-    def is_logged_in(self):
-        """Check if any user is logged in. 
-
-        Returns:
-            bool: True/False
-        """
-        return self.logged_in_user is not None
-    
-    def get_logged_in_user(self):
-        """Get logged in username. 
-
-        Returns:
-            str: username
-        """
-        return self.logged_in_user
-    
-    def get_logged_in_role(self):
-        """Get logged in user's role. 
-
-        Returns:
-            str: role
-        """
-        return self.logged_in_role
\ No newline at end of file
+            return {"status": "failure", "message": "No user is currently logged in"}
\ No newline at end of file
@@ -0,0 +1,166 @@
+import asyncio
+from src.async_managers import AsyncMessageManager
+from src.message_manager import INBOX_LIMIT, MessageManager
+
+
+class GroupCommitter:
+    """Queue of accepted messages which are saved in groups with a single statement and commit.
+
+    A group is written as soon as it has max_batch messages, or max_delay seconds
+    after its first message. While a group is being committed, the next one fills
+    up, so under load the groups grow and the database commits far less often
+    than once per message. Every sender waits until its group is committed, so a
+    message is acknowledged only once it is durable.
+
+    Everything runs on the event loop of the server. A synchronous database is
+    called on the given executor, an asyncio database is awaited.
+
+    Args:
+        database: storage engine with save_and_get_all
+        executor (Executor): runs the calls of a synchronous database, None for an asyncio database
+        max_batch (int): maximum number of messages committed together
+        max_delay (float): seconds the first message of a group waits for others
+        max_pending (int): maximum number of messages waiting in the queue
+    """
+
+    def __init__(self, database, executor=None, max_batch=500, max_delay=0.002, max_pending=10000) -> None:
+        self.db = database
+        self.executor = executor
+        self.max_batch = int(max_batch)
+        self.max_delay = float(max_delay)
+        self.max_pending = int(max_pending)
+        self.pending = []
+        self.task = None
+        self.closing = False
+        self.batches = 0
+        self.messages = 0
+        self.largest_batch = 0
+
+    def start(self):
+        """Start the flusher on the running event loop."""
+        self.wakeup = asyncio.Event()
+        self.full = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+
+    async def close(self):
+        """Commit the messages still in the queue and stop the flusher."""
+        if self.task is None:
+            return
+        self.closing = True
+        self.wakeup.set()
+        self.full.set()
+        await self.task
+        self.task = None
+
+    async def submit(self, sender, receiver, message):
+        """Queue the message and wait until its group is committed.
+
+        Returns:
+            dict: recipient_exists and sent, like query_send_message, or None if the queue is full
+        """
+        if len(self.pending) >= self.max_pending or self.closing:
+            return None
+        if self.task is None:
+            self.start()
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((sender, receiver, message, future))
+        self.wakeup.set()
+        if len(self.pending) >= self.max_batch:
+            self.full.set()
+        return await future
+
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            if len(self.pending) < self.max_batch and not self.closing:
+                try:
+                    await asyncio.wait_for(self.full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            await self.flush()
+            if self.closing and not self.pending:
+                return
+
+    async def flush(self):
+        """Commit the next group of messages and wake up their senders."""
+        batch, self.pending = self.pending[:self.max_batch], self.pending[self.max_batch:]
+        if len(self.pending) < self.max_batch:
+            self.full.clear()
+        if not self.pending:
+            self.wakeup.clear()
+        if not batch:
+            return
+
+        params = {"query": "query_send_messages", "query_arguments": {
+            "senders": [sender for sender, _, _, _ in batch],
+            "receivers": [receiver for _, receiver, _, _ in batch],
+            "messages": [message for _, _, message, _ in batch],
+            "inbox_limit": INBOX_LIMIT}}
+        try:
+            if self.executor is None:
+                rows = await self.db.save_and_get_all(params)
+            else:
+                rows = await asyncio.get_running_loop().run_in_executor(self.executor, self.db.save_and_get_all, params)
+        except Exception as error:
+            # nothing of the group was committed, every sender gets the error
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        self.batches += 1
+        self.messages += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for (_, _, _, future), row in zip(batch, rows):
+            if not future.done():
+                future.set_result(row)
+
+    def get_stats(self):
+        """Get group commit counters.
+
+        Returns:
+            dict: queued messages, committed groups and messages, mean and largest group size
+        """
+        return {"pending": len(self.pending), "batches": self.batches, "messages": self.messages,
+                "mean_batch": self.messages / self.batches if self.batches else 0.0,
+                "largest_batch": self.largest_batch}
+
+
+class WriteBehindMessageManager(MessageManager):
+    """MessageManager which queues sent messages for a GroupCommitter instead of
+    committing every message on its own. The sender gets the answer once the
+    group of its message is committed."""
+
+    def __init__(self, database, user_manager, notifier=None, committer=None) -> None:
+        super().__init__(database, user_manager, notifier)
+        self.committer = committer
+
+    async def send_msg_to_recipient(self, session, **kwargs):
+        """Send the message with the next group commit. The message must be less than 250 characters and the recipient's inbox cannot be full.
+
+        Args:
+            session (Session): session of the client
+            recipient (str): name of recipient
+            msg_content (str): content of message
+
+        Returns:
+            dict: Dictionary with status of job (failure or success) and message.
+        """
+        recipient = kwargs['recipient']
+        msg_content = kwargs['msg_content']
+
+        error = self.validate_msg(session, msg_content)
+        if error is not None:
+            return error
+
+        result = await self.committer.submit(session.username, recipient, msg_content)
+        if result is None:
+            return {"status": "failure", "message": "Server is busy. Try again later."}
+        if result['sent']:
+            self.notify(recipient, session.username, msg_content)
+        return self.send_result(result, recipient)
+
+
+class AsyncWriteBehindMessageManager(WriteBehindMessageManager, AsyncMessageManager):
+    """WriteBehindMessageManager for an asyncio database, e.g. AsyncDatabase."""
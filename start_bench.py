@@ -0,0 +1,56 @@
+import argparse
+import sys
+from src.bench import Benchmark, ServerThread, compare, load_results, parse_mix, print_report, save_results
+from start_server import load_config
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark of the server with many concurrent simulated clients.")
+    parser.add_argument('--config', default='database.ini', help="configuration file of the server")
+    parser.add_argument('--db-config', help="file with the section of the storage engine, e.g. tests/database.ini, --config by default")
+    parser.add_argument('--engine', choices=['postgresql', 'sqlite', 'memory'], help="storage engine, from the configuration by default")
+    parser.add_argument('--backend', choices=['psycopg2', 'async'], help="database backend, from the configuration by default")
+    parser.add_argument('--no-cache', action='store_true', help="don't use the user cache")
+    parser.add_argument('--write-behind', action='store_true', help="commit sent messages in groups")
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=200, help="requests sent by every client")
+    parser.add_argument('--mix', default='signup=5,login=10,send=50,read=35', help="weights of the commands")
+    parser.add_argument('--pipeline', type=int, default=1, help="requests a client keeps in flight")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--baseline', help="compare with the results saved by an earlier run")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="allowed relative regression")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    server_config = load_config(args.config, section='server')
+    server_config['engine'] = args.engine or server_config.get('engine', 'postgresql')
+    server_config['backend'] = args.backend or server_config.get('backend', 'psycopg2')
+    if args.write_behind:
+        server_config['write_behind'] = 'true'
+    # the benchmark runs a single server in this process
+    server_config.pop('workers', None)
+    engine = server_config['engine']
+    config = load_config(args.db_config or args.config, section=engine) if engine != 'memory' else {}
+    cache_config = None if args.no_cache else load_config(args.config, section='cache')
+
+    server = ServerThread(config, pool_config=load_config(args.config, section='pool'), cache_config=cache_config, **server_config).start()
+    try:
+        results = Benchmark(server, args.clients, args.requests, parse_mix(args.mix), args.pipeline, args.seed).run()
+    finally:
+        server.stop()
+
+    results['settings'].update(engine=engine, backend=server_config['backend'], cache=cache_config is not None,
+                               write_behind=server_config.get('write_behind', 'false'))
+    print_report(results)
+    if args.output:
+        save_results(results, args.output)
+
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline), args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        sys.exit(1 if regressions else 0)
@@ -1,5 +1,6 @@
 from src.client import Client
+from start_server import load_config
                 
 if __name__ == '__main__':
-    client = Client()
+    client = Client(**load_config(section='client'))
     client.start_connection()
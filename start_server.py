@@ -1,4 +1,5 @@
 from src.server import Server
+from src.supervisor import Supervisor
 from configparser import ConfigParser
 
 HOST = "127.0.0.1"  # The server's hostname or IP address
@@ -23,6 +24,17 @@ def load_config(filename='database.ini', section='postgresql'):
     return config
 
 if __name__ == '__main__':
-    config = load_config()
-    server = Server(HOST, PORT, VERSION, config)
-    server.start_server()
+    server_config = load_config(section='server')
+    # settings of the storage engine are in the section named after it, the memory engine has none
+    engine = server_config.get('engine', 'postgresql')
+    config = load_config(section=engine) if engine != 'memory' else {}
+    pool_config = load_config(section='pool')
+    cache_config = load_config(section='cache')
+    # more than one worker runs the server in several processes sharing the port
+    workers = int(server_config.pop('workers', 1))
+    if workers > 1:
+        supervisor = Supervisor(HOST, PORT, VERSION, config, workers=workers, pool_config=pool_config, cache_config=cache_config, **server_config)
+        supervisor.run()
+    else:
+        server = Server(HOST, PORT, VERSION, config, pool_config=pool_config, cache_config=cache_config, **server_config)
+        server.start_server()
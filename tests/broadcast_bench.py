@@ -0,0 +1,51 @@
+import argparse
+import time
+from src.database import Database
+from src.message_manager import MessageManager
+from src.session import Session
+from src.user_manager import UserManager
+from start_server import load_config
+from tests.send_bench import create_tables
+
+
+def run(db, send_all, recipients, rounds):
+    create_tables(db, recipients)
+    session = Session("bench_session")
+    session.username = 'sender'
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        send_all(session, recipients)
+    return rounds * len(recipients) / (time.perf_counter() - start)
+
+
+def send_loop(message_manager, session, recipients):
+    for recipient in recipients:
+        result = message_manager.send_msg_to_recipient(session=session, recipient=recipient, msg_content='benchmark message')
+        assert result['status'] == 'success', result
+
+
+def broadcast(message_manager, session, recipients):
+    result = message_manager.broadcast_msg(session=session, recipients=recipients, msg_content='benchmark message')
+    assert len(result['sent']) == len(recipients), result
+
+
+# run from the repository root: python -m tests.broadcast_bench
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark of broadcast against a loop of sends.")
+    parser.add_argument('--config', default='tests/database.ini')
+    parser.add_argument('--recipients', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=5, help="messages per recipient, at most the inbox limit")
+    args = parser.parse_args()
+
+    db = Database(load_config(args.config))
+    message_manager = MessageManager(db, UserManager(db))
+    recipients = [f"recipient{i}" for i in range(args.recipients)]
+
+    before = run(db, lambda session, names: send_loop(message_manager, session, names), recipients, args.rounds)
+    after = run(db, lambda session, names: broadcast(message_manager, session, names), recipients, args.rounds)
+
+    print(f"send loop ({args.recipients} statements per round): {before:.1f} messages/s")
+    print(f"broadcast (1 statement per round): {after:.1f} messages/s")
+    print(f"speedup: {after / before:.2f}x")
+    db.close()
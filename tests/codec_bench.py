@@ -0,0 +1,39 @@
+import argparse
+import time
+from src.protocol import Codec, available_codecs, available_compressions
+
+
+def generate_page(rows):
+    """Answer of an admin read with the given number of messages."""
+    return [{"sender_name": f"user{i % 50}", "receiver_name": f"user{(i * 7) % 50}", "message": f"benchmark message number {i}"}
+            for i in range(rows)]
+
+
+def measure(codec, msg, repeat):
+    """Return the payload size in bytes and the mean encode and decode time in milliseconds."""
+    payload = codec.dumps(msg)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        codec.dumps(msg)
+    encode_time = (time.perf_counter() - start) / repeat * 1000
+    start = time.perf_counter()
+    for _ in range(repeat):
+        codec.loads(payload)
+    decode_time = (time.perf_counter() - start) / repeat * 1000
+    return len(payload), encode_time, decode_time
+
+
+# run from the repository root: python -m tests.codec_bench
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark of the codecs on a large read answer.")
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    msg = {"request_id": 1, "response": generate_page(args.rows)}
+    print(f"{'codec':<8} {'compression':<12} {'columnar':<9} {'bytes':>9} {'encode ms':>10} {'decode ms':>10}")
+    for name in available_codecs():
+        for compression in [None] + available_compressions():
+            for columnar in (False, True):
+                size, encode_time, decode_time = measure(Codec(name, compression, columnar), msg, args.repeat)
+                print(f"{name:<8} {str(compression):<12} {str(columnar):<9} {size:>9} {encode_time:>10.3f} {decode_time:>10.3f}")
@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import time
+from src.bench import percentile
+from src.protocol import encode_msg, read_msg
+
+
+async def request(reader, writer, msg):
+    writer.write(encode_msg(msg))
+    await writer.drain()
+    answer = await read_msg(reader)
+    if answer is None:
+        raise ConnectionError("Connection closed by the server.")
+    return answer
+
+
+async def pipelined_requests(reader, writer, msgs):
+    """Send all messages tagged with request ids, then read the answers in any order.
+
+    Returns:
+        dict: {request_id: time from sending the batch to receiving the answer}
+    """
+    start = time.perf_counter()
+    writer.write(b''.join(encode_msg({**msg, "request_id": i}) for i, msg in enumerate(msgs)))
+    await writer.drain()
+
+    elapsed = {}
+    while len(elapsed) < len(msgs):
+        answer = await read_msg(reader)
+        if answer is None:
+            raise ConnectionError("Connection closed by the server.")
+        if 'stream' not in answer:
+            elapsed[answer['request_id']] = time.perf_counter() - start
+    return elapsed
+
+
+async def run_client(host, port, requests, latencies, depth=1):
+    reader, writer = await asyncio.open_connection(host, port)
+    commands = [
+        {"command": "uptime"},
+        {"command": "send", "recipient": "loadtest", "msg_content": "load test message"},
+        {"command": "read"},
+    ]
+    try:
+        # sessions belong to the connection, so every client logs in on its own and 'send' and 'read' hit the database
+        await request(reader, writer, {"command": "login", "username": "loadtest", "password": "loadtest"})
+        if depth > 1:
+            for first in range(0, requests, depth):
+                msgs = [commands[i % len(commands)] for i in range(first, min(first + depth, requests))]
+                for request_id, elapsed in (await pipelined_requests(reader, writer, msgs)).items():
+                    latencies[msgs[request_id]['command']].append(elapsed)
+            return
+
+        for i in range(requests):
+            msg = commands[i % len(commands)]
+            start = time.perf_counter()
+            await request(reader, writer, msg)
+            latencies[msg['command']].append(time.perf_counter() - start)
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def main(host, port, clients, requests, depth=1):
+    # create the test account the clients log in with
+    reader, writer = await asyncio.open_connection(host, port)
+    await request(reader, writer, {"command": "signup", "username": "loadtest", "password": "loadtest", "role": "user"})
+    writer.close()
+    await writer.wait_closed()
+
+    latencies = {"uptime": [], "send": [], "read": []}
+
+    start = time.perf_counter()
+    connections = await asyncio.gather(*[asyncio.open_connection(host, port) for _ in range(clients)])
+    connect_time = time.perf_counter() - start
+    for _, conn_writer in connections:
+        conn_writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[run_client(host, port, requests, latencies, depth) for _ in range(clients)])
+    total_time = time.perf_counter() - start
+
+    print(f"clients: {clients}, requests per client: {requests}, pipeline depth: {depth}")
+    print(f"connections/s: {clients / connect_time:.1f}")
+    print(f"requests/s: {clients * requests / total_time:.1f}")
+    for command, samples in latencies.items():
+        print(f"{command}: p50 {percentile(samples, 50) * 1000:.2f} ms, p99 {percentile(samples, 99) * 1000:.2f} ms")
+
+
+# run from the repository root: python -m tests.load_test
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test for the messaging server.")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=65432)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=30)
+    parser.add_argument('--pipeline', type=int, default=1, help="requests sent by a client before reading the answers")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.host, args.port, args.clients, args.requests, args.pipeline))
@@ -0,0 +1,86 @@
+import argparse
+import random
+import time
+from src.database import Database
+from src.migrations import apply_migrations
+from start_server import load_config
+
+MESSAGES_PER_USER = 5
+INDEXES = ["users_username_key", "messages_receiver_id_idx"]
+
+
+def generate_data(db, users):
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DROP TABLE IF EXISTS messages, users, schema_version;")
+            conn.commit()
+    apply_migrations(db)
+
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO users (username, password, role, unread_msgs)
+                SELECT 'user' || i, '1234', 'user', 0 FROM generate_series(1, %s) AS i
+                """, (users, ))
+            cur.execute(
+                """
+                INSERT INTO messages (sender_id, sender_name, receiver_id, receiver_name, message)
+                SELECT sender, 'user' || sender, receiver, 'user' || receiver, 'benchmark message'
+                FROM (
+                    SELECT 1 + (i::bigint * 7919) %% %s AS sender, 1 + (i::bigint * 104729) %% %s AS receiver
+                    FROM generate_series(1, %s) AS i
+                ) AS generated
+                """, (users, users, users * MESSAGES_PER_USER))
+            cur.execute("ANALYZE users; ANALYZE messages;")
+        conn.commit()
+
+
+def drop_indexes(db):
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            for index in INDEXES:
+                cur.execute(f"DROP INDEX IF EXISTS {index}")
+            cur.execute("ANALYZE users; ANALYZE messages;")
+        conn.commit()
+
+
+def measure(db, users, lookups):
+    """Return the mean latency in milliseconds of every user lookup query."""
+    names = [f"user{random.randint(1, users)}" for _ in range(lookups)]
+    queries = {
+        "query_check_if_user_exist": (db.check_data, lambda name: {"username": name}),
+        "query_get_user_data": (db.get_data, lambda name: {"username": name}),
+        "query_get_user_credentials": (db.get_data, lambda name: {"username": name}),
+        "query_get_user_messages": (db.get_data, lambda name: {"receiver": name}),
+        # only the first read of a user returns its messages, the next ones measure the cost of an empty range
+        "query_read_new_messages": (db.save_and_get_all, lambda name: {"username": name, "limit": 1000}),
+    }
+
+    results = {}
+    for query, (method, arguments) in queries.items():
+        start = time.perf_counter()
+        for name in names:
+            method({"query": query, "query_arguments": arguments(name)})
+        results[query] = (time.perf_counter() - start) / lookups * 1000
+    return results
+
+
+# run from the repository root: python -m tests.schema_bench
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark of user lookups as the tables grow.")
+    parser.add_argument('--config', default='tests/database.ini')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 500000])
+    parser.add_argument('--lookups', type=int, default=200)
+    args = parser.parse_args()
+
+    db = Database(load_config(args.config))
+    print(f"{'users':>8} {'query':<30} {'indexed ms':>11} {'no index ms':>12}")
+    for users in args.sizes:
+        generate_data(db, users)
+        indexed = measure(db, users, args.lookups)
+        drop_indexes(db)
+        sequential = measure(db, users, args.lookups)
+        for query in indexed:
+            print(f"{users:>8} {query:<30} {indexed[query]:>11.3f} {sequential[query]:>12.3f}")
+    db.close()
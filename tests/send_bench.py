@@ -0,0 +1,75 @@
+import argparse
+import time
+from src.database import Database
+from src.message import Message
+from src.message_manager import INBOX_LIMIT, MessageManager
+from src.migrations import apply_migrations
+from src.session import Session
+from src.user_manager import UserManager
+from start_server import load_config
+
+
+def create_tables(db, recipients):
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DROP TABLE IF EXISTS messages, users, schema_version;")
+        conn.commit()
+    apply_migrations(db)
+
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            cur.executemany(
+                "INSERT INTO users (username, password, role, unread_msgs) VALUES (%s, '1234', 'user', 0)",
+                [(name,) for name in ['sender'] + recipients],
+            )
+        conn.commit()
+
+
+def legacy_send(db, session, recipient, msg_content):
+    """Send path before the single statement version: four queries and two commits."""
+    if db.check_data({"query": "query_check_if_user_exist", "query_arguments": {"username": recipient}}) == False:
+        return {"status": "failure", "message": f"There is no such user like {recipient}."}
+
+    user = db.get_data({"query": "query_get_user_data", "query_arguments": {"username": recipient}})[0]
+    unread_msgs = user['unread_msgs']
+    if unread_msgs >= INBOX_LIMIT:
+        return {"status": "failure", "message": "Inbox is full."}
+
+    message = Message(session.username, recipient, msg_content)
+    db.save_data({"query": "query_insert_message", "query_arguments": message.__dict__})
+    db.save_data({"query": "query_update_unread_msgs", "query_arguments": {'unread_msgs': unread_msgs + 1, 'username': recipient}})
+    return {"status": "success", "message": f"The message has been sent to {recipient}."}
+
+
+def run(db, send, sends):
+    # every recipient gets exactly INBOX_LIMIT messages, so each send takes the full path
+    recipients = [f"recipient{i}" for i in range(sends // INBOX_LIMIT)]
+    create_tables(db, recipients)
+    session = Session("bench_session")
+    session.username = 'sender'
+
+    start = time.perf_counter()
+    for i in range(len(recipients) * INBOX_LIMIT):
+        result = send(session, recipients[i % len(recipients)], 'benchmark message')
+        assert result['status'] == 'success', result
+    return len(recipients) * INBOX_LIMIT / (time.perf_counter() - start)
+
+
+# run from the repository root: python -m tests.send_bench
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark of sending messages.")
+    parser.add_argument('--config', default='tests/database.ini')
+    parser.add_argument('--sends', type=int, default=5000)
+    parser.add_argument('--no-prepare', action='store_true', help="don't use prepared statements")
+    args = parser.parse_args()
+
+    db = Database(load_config(args.config), prepare_statements=not args.no_prepare)
+    message_manager = MessageManager(db, UserManager(db))
+
+    before = run(db, lambda session, recipient, msg: legacy_send(db, session, recipient, msg), args.sends)
+    after = run(db, lambda session, recipient, msg: message_manager.send_msg_to_recipient(session=session, recipient=recipient, msg_content=msg), args.sends)
+
+    print(f"before (4 queries, 2 commits): {before:.1f} sends/s")
+    print(f"after (1 statement, 1 commit): {after:.1f} sends/s")
+    print(f"speedup: {after / before:.2f}x")
+    db.close()
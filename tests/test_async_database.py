@@ -0,0 +1,112 @@
+import unittest
+from src.async_database import AsyncDatabase
+from src.async_managers import AsyncMessageManager, AsyncUserManager
+from src.database import Database
+from src.migrations import apply_migrations
+from src.session import Session
+from configparser import ConfigParser
+
+def load_config(filename='database.ini', section='postgresql'):
+    parser = ConfigParser()
+    parser.read(filename)
+    config = {}
+    if parser.has_section(section):
+        params = parser.items(section)
+        for param in params:
+            config[param[0]] = param[1]
+    else:
+        raise Exception(f'Section {section} not found in the {filename} file')
+    return config
+
+class AsyncDatabaseTests(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.config = load_config()
+        cls.sync_db = Database(cls.config)
+        cls.conn = cls.sync_db.conn
+        cls.cur = cls.conn.cursor()
+        cls.cur.execute("DROP TABLE IF EXISTS messages, users, schema_version;")
+        cls.conn.commit()
+        apply_migrations(cls.sync_db)
+
+    async def asyncSetUp(self):
+        self.cur.execute(
+            """
+            DELETE FROM messages;
+            DELETE FROM users;
+
+            INSERT INTO users (username, password, role, unread_msgs)
+            VALUES 
+            ('user1', '1234', 'user', 0),
+            ('user2', '1234', 'admin', 0),
+            ('user3', '1234', 'user', 5),
+            ('user4', '1234', 'user', 2);
+            """
+        )
+        self.conn.commit()
+        for sender, receiver, message in [('user1', 'user4', 'msg1'), ('user2', 'user4', 'msg2')]:
+            self.sync_db.save_data({"query": "query_insert_message", "query_arguments": {"sender": sender, "receiver": receiver, "message": message}})
+
+        self.db = AsyncDatabase(self.config, {"minconn": 1, "maxconn": 4})
+        await self.db.open()
+        self.user_manager = AsyncUserManager(self.db)
+        self.message_manager = AsyncMessageManager(self.db, self.user_manager)
+        self.session = Session("test_session")
+
+    async def asyncTearDown(self):
+        await self.db.close()
+
+    async def test_get_and_check_data(self):
+        self.assertTrue(await self.db.check_data({"query": "query_check_if_user_exist", "query_arguments": {"username": "user1"}}))
+        self.assertFalse(await self.db.check_data({"query": "query_check_if_user_exist", "query_arguments": {"username": "user9"}}))
+        users = await self.db.get_data({"query": "query_get_user_data", "query_arguments": {"username": "user2"}})
+        self.assertEqual(users[0]['role'], 'admin')
+
+    async def test_create_account_and_login(self):
+        result = await self.user_manager.create_account(username='test_user', password='123456', role='user')
+        self.assertEqual(result['status'], 'success')
+        result = await self.user_manager.create_account(username='test_user', password='123456', role='user')
+        self.assertEqual(result['message'], 'User with that name already exist.')
+        result = await self.user_manager.login(session=self.session, username='test_user', password='123456')
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(self.session.role, 'user')
+        result = await self.user_manager.logout(session=self.session)
+        self.assertEqual(result['status'], 'success')
+
+    async def test_send_and_read(self):
+        self.session.username = 'user1'
+        result = await self.message_manager.send_msg_to_recipient(session=self.session, recipient='user4', msg_content='msg3')
+        self.assertEqual(result['status'], 'success')
+        result = await self.message_manager.send_msg_to_recipient(session=self.session, recipient='user3', msg_content='msg3')
+        self.assertEqual(result['message'], 'Inbox is full.')
+
+        self.session.username = 'user4'
+        self.session.role = 'user'
+        result = await self.message_manager.read_msg(session=self.session)
+        self.assertEqual([msg['message'] for msg in result], ['msg1', 'msg2', 'msg3'])
+        users = await self.db.get_data({"query": "query_get_user_data", "query_arguments": {"username": "user4"}})
+        self.assertEqual(users[0]['unread_msgs'], 0)
+
+    async def test_broadcast(self):
+        self.session.username = 'user2'
+        result = await self.message_manager.broadcast_msg(session=self.session, recipients=['user1', 'user3', 'nobody'], msg_content='announcement')
+        self.assertEqual(result['sent'], ['user1'])
+        self.assertEqual(result['failed'], {'user3': 'Inbox is full.', 'nobody': 'There is no such user.'})
+
+    async def test_read_as_admin_stream(self):
+        self.session.username = 'user2'
+        self.session.role = 'admin'
+        stream = await self.message_manager.read_msg(session=self.session, page_size=1, stream=True)
+        chunks = [chunk async for chunk in stream]
+        self.assertEqual([chunk[0]['message'] for chunk in chunks], ['msg1', 'msg2'])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.cur.execute("DROP TABLE IF EXISTS messages, users, schema_version;")
+        cls.conn.commit()
+        cls.cur.close()
+        cls.conn.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import threading
+import unittest
+from src.bench import Benchmark, ServerThread, compare, parse_mix, percentile
+
+
+class BenchTests(unittest.TestCase):
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 99), 99)
+        self.assertEqual(percentile([], 99), 0.0)
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix("send=3, read=1,login"), {"send": 3.0, "read": 1.0, "login": 1.0})
+        with self.assertRaises(ValueError):
+            parse_mix("stop=1")
+
+    def test_benchmark_against_memory_engine(self):
+        server = ServerThread({}, engine='memory').start()
+        try:
+            results = Benchmark(server, clients=3, requests=20, mix=parse_mix("signup=1,login=1,send=2,read=2")).run()
+        finally:
+            server.stop()
+
+        self.assertEqual(results["total"]["requests"], 60)
+        self.assertEqual(sum(stats["requests"] for stats in results["commands"].values()), 60)
+        self.assertEqual(results["commands"]["send"]["queries_per_request"], 1.0)
+        self.assertEqual(results["commands"]["signup"]["failures"], 0)
+        self.assertEqual(compare(results, results), [])
+
+    def test_server_failing_to_start(self):
+        server = ServerThread({}, engine='memory')
+        # e.g. serve() failed, the thread ends without a listening socket
+        server.thread = threading.Thread(target=lambda: None)
+        with self.assertRaises(RuntimeError):
+            server.start()
+
+    def test_compare_finds_regressions(self):
+        baseline = {"total": {"throughput": 100.0, "queries_per_request": 1.0},
+                    "commands": {"send": {"throughput": 50.0, "p99_ms": 10.0, "queries_per_request": 1.0}}}
+        results = {"total": {"throughput": 95.0, "queries_per_request": 1.0},
+                   "commands": {"send": {"throughput": 40.0, "p99_ms": 20.0, "queries_per_request": 2.0}}}
+        self.assertEqual(len(compare(results, baseline, tolerance=0.1)), 3)
+
+if __name__ == "__main__":
+    unittest.main()
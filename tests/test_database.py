@@ -0,0 +1,109 @@
+import threading
+import unittest
+import psycopg2.extensions
+from src.connection_pool import ConnectionPool, PoolTimeout
+from src.database import Database
+from src.migrations import apply_migrations
+from configparser import ConfigParser
+
+def load_config(filename='database.ini', section='postgresql'):
+    parser = ConfigParser()
+    parser.read(filename)
+    config = {}
+    if parser.has_section(section):
+        params = parser.items(section)
+        for param in params:
+            config[param[0]] = param[1]
+    else:
+        raise Exception(f'Section {section} not found in the {filename} file')
+    return config
+
+class DatabaseTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.config = load_config()
+        cls.db = Database(cls.config, {"minconn": 1, "maxconn": 2, "timeout": 0.2, "health_check_interval": 0})
+        with cls.db.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DROP TABLE IF EXISTS messages, users, schema_version;")
+            conn.commit()
+        apply_migrations(cls.db)
+        cls.db.save_data({"query": "query_insert_user", "query_arguments": {"username": "user1", "password": "1234", "role": "user", "unread_msgs": 0}})
+
+    def user_exists(self, db, username):
+        return db.check_data({"query": "query_check_if_user_exist", "query_arguments": {"username": username}})
+
+    def test_pooled_queries(self):
+        self.assertTrue(self.user_exists(self.db, 'user1'))
+        self.assertFalse(self.user_exists(self.db, 'user2'))
+        self.assertEqual(self.db.pool.size, 1)
+
+    def test_pooled_queries_in_parallel(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.user_exists(self.db, 'user1'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [True] * 8)
+        self.assertLessEqual(self.db.pool.size, 2)
+
+    def test_acquire_timeout(self):
+        pool = ConnectionPool(self.config, minconn=0, maxconn=1, timeout=0.1)
+        conn = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        pool.release(conn)
+        self.assertIs(pool.acquire(), conn)
+        pool.discard(conn)
+        pool.close()
+
+    def test_broken_connection_is_replaced(self):
+        conn = self.db.pool.acquire()
+        self.db.pool.release(conn)
+        conn.close()
+        self.assertTrue(self.user_exists(self.db, 'user1'))
+        self.assertLessEqual(self.db.pool.size, 2)
+
+    def test_terminated_connection_is_replaced(self):
+        conn = self.db.pool.acquire()
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_backend_pid()")
+            pid = cur.fetchone()[0]
+        conn.rollback()
+        self.db.pool.release(conn)
+        other = Database(self.config)
+        with other.connection() as admin_conn:
+            with admin_conn.cursor() as cur:
+                cur.execute("SELECT pg_terminate_backend(%s)", (pid,))
+        other.close()
+        self.assertTrue(self.user_exists(self.db, 'user1'))
+
+    def test_reconnect_without_pool(self):
+        db = Database(self.config)
+        db.conn.close()
+        self.assertTrue(self.user_exists(db, 'user1'))
+        db.close()
+
+    def test_stream_closed_early(self):
+        for i in range(3):
+            self.db.save_data({"query": "query_insert_message", "query_arguments": {"sender": "user1", "receiver": "user1", "message": f"msg{i}"}})
+        stream = self.db.stream_data({"query": "query_get_all_messages", "query_arguments": {}}, chunk_size=1)
+        self.assertEqual(len(next(stream)), 1)
+        # e.g. the client disconnected in the middle of the stream
+        stream.close()
+        self.assertEqual([conn.get_transaction_status() for conn, _ in self.db.pool.idle],
+                         [psycopg2.extensions.TRANSACTION_STATUS_IDLE] * len(self.db.pool.idle))
+        self.assertTrue(self.user_exists(self.db, 'user1'))
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls.db.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DROP TABLE IF EXISTS messages, users, schema_version;")
+            conn.commit()
+        cls.db.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,14 @@
+import asyncio
+import random
+import threading
 import unittest
-from src.message_manager import MessageManager
+from concurrent.futures import ThreadPoolExecutor
+from src.message_manager import INBOX_LIMIT, MessageManager
 from src.user_manager import UserManager
 from src.database import Database
+from src.session import Session
+from src.migrations import apply_migrations
+from src.write_behind import GroupCommitter, WriteBehindMessageManager
 from configparser import ConfigParser
 
 def load_config(filename='database.ini', section='postgresql'):
@@ -24,46 +31,19 @@ class MessageTest(unittest.TestCase):
         cls.db = Database(cls.config)
         cls.conn = cls.db.conn
         cls.cur = cls.conn.cursor()
-        cls.cur.execute(
-            """
-            DROP TABLE IF EXISTS messages;
-            CREATE TABLE messages (
-                msg_id SERIAL PRIMARY KEY,
-                sender_name VARCHAR(255) NOT NULL,
-                receiver_name VARCHAR(255) NOT NULL,
-                message VARCHAR(255)
-            );
-
-            DROP TABLE IF EXISTS users;
-            CREATE TABLE users (
-                user_id SERIAL PRIMARY KEY,
-                username VARCHAR(255) NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                role VARCHAR(5) NOT NULL,
-                unread_msgs INTEGER NOT NULL
-            );
-            """
-        )
+        cls.cur.execute("DROP TABLE IF EXISTS messages, users, schema_version;")
         cls.conn.commit()
+        apply_migrations(cls.db)
 
     def setUp(self):
         self.user_manager = UserManager(self.db)
         self.message_manager = MessageManager(self.db, self.user_manager)
+        self.session = Session("test_session")
         self.cur = self.conn.cursor()
         self.cur.execute(
             """
-            DELETE FROM users;
             DELETE FROM messages;
-
-            INSERT INTO messages (sender_name, receiver_name, message)
-            VALUES
-            ('user1', 'user3', 'msg1'),
-            ('user1', 'user3', 'msg2'),
-            ('user1', 'user3', 'msg3'),
-            ('user1', 'user3', 'msg4'),
-            ('user1', 'user3', 'msg5'),
-            ('user1', 'user4', 'msg1'),
-            ('user2', 'user4', 'msg2'); 
+            DELETE FROM users;
 
             INSERT INTO users (username, password, role, unread_msgs)
             VALUES 
@@ -75,6 +55,18 @@ class MessageTest(unittest.TestCase):
         )
         self.conn.commit()
 
+        messages = [
+            ('user1', 'user3', 'msg1'),
+            ('user1', 'user3', 'msg2'),
+            ('user1', 'user3', 'msg3'),
+            ('user1', 'user3', 'msg4'),
+            ('user1', 'user3', 'msg5'),
+            ('user1', 'user4', 'msg1'),
+            ('user2', 'user4', 'msg2'),
+        ]
+        for sender, receiver, message in messages:
+            self.db.save_data({"query": "query_insert_message", "query_arguments": {"sender": sender, "receiver": receiver, "message": message}})
+
     def get_user_data(self, username):
         self.cur.execute("SELECT username, password, role, unread_msgs FROM users WHERE username = %s", (username,))
         row = self.cur.fetchone()
@@ -88,15 +80,15 @@ class MessageTest(unittest.TestCase):
         return None
 
     def get_user_msgs_from_inbox(self, username):
-        self.cur.execute("SELECT sender_name, receiver_name, message FROM messages WHERE receiver_name = %s", (username,))
+        self.cur.execute("SELECT sender_name, receiver_name, message FROM messages WHERE receiver_name = %s ORDER BY msg_id", (username,))
         msgs = []
         for row in self.cur.fetchall():
             msgs.append({'sender': row[0], 'receiver': row[1], 'message': row[2]})
         return msgs
 
     def test_send_message_success(self):
-        self.user_manager.logged_in_user = 'user1'
-        result = self.message_manager.send_msg_to_recipient(recipient='user2', msg_content='message content')
+        self.session.username = 'user1'
+        result = self.message_manager.send_msg_to_recipient(session=self.session, recipient='user2', msg_content='message content')
         self.assertEqual(result['status'], 'success')
         self.assertEqual(result['message'], 'The message has been sent to user2.')
 
@@ -113,33 +105,173 @@ class MessageTest(unittest.TestCase):
         self.assertEqual(user["unread_msgs"], 1)
 
     def test_send_message_wrong_recipient(self):
-        self.user_manager.logged_in_user = 'user1'
-        result = self.message_manager.send_msg_to_recipient(recipient='wrong recipient', msg_content='message content')
+        self.session.username = 'user1'
+        result = self.message_manager.send_msg_to_recipient(session=self.session, recipient='wrong recipient', msg_content='message content')
         self.assertEqual(result['status'], 'failure')
         self.assertEqual(result['message'], 'There is no such user like wrong recipient.')
 
     def test_send_message_no_logged_user(self):
-        self.user_manager.logged_in_user = None
-        result = self.message_manager.send_msg_to_recipient(recipient='user2', msg_content='message content')
+        self.session.username = None
+        result = self.message_manager.send_msg_to_recipient(session=self.session, recipient='user2', msg_content='message content')
         self.assertEqual(result['status'], 'failure')
         self.assertEqual(result['message'], 'No user is currently logged in.')
 
     def test_send_message_too_long_message(self):
-        self.user_manager.logged_in_user = 'user1'
+        self.session.username = 'user1'
         too_long_message = 'A' * 256
-        result = self.message_manager.send_msg_to_recipient(recipient='user2', msg_content=too_long_message)
+        result = self.message_manager.send_msg_to_recipient(session=self.session, recipient='user2', msg_content=too_long_message)
         self.assertEqual(result['status'], 'failure')
         self.assertEqual(result['message'], 'Message is to long.')
 
     def test_send_message_full_inbox(self):
-        self.user_manager.logged_in_user = 'user1'
-        result = self.message_manager.send_msg_to_recipient(recipient='user3', msg_content='message content')
+        self.session.username = 'user1'
+        result = self.message_manager.send_msg_to_recipient(session=self.session, recipient='user3', msg_content='message content')
         self.assertEqual(result['status'], 'failure')
         self.assertEqual(result['message'], 'Inbox is full.')
 
+    def test_send_message_concurrent_senders(self):
+        db = Database(self.config, {"minconn": 0, "maxconn": 8})
+        message_manager = MessageManager(db, UserManager(db))
+        results = []
+
+        def send():
+            session = Session("sender_session")
+            session.username = 'user1'
+            result = message_manager.send_msg_to_recipient(session=session, recipient='user4', msg_content='message content')
+            results.append(result['status'])
+
+        threads = [threading.Thread(target=send) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        db.close()
+
+        # user4 already has 2 unread messages, so only 3 more fit in the inbox
+        self.assertEqual(results.count('success'), 3)
+        self.assertEqual(self.get_user_data('user4')['unread_msgs'], 5)
+        self.assertEqual(len(self.get_user_msgs_from_inbox('user4')), 5)
+
+    def test_inbox_limit_stress(self):
+        recipients = [f'stress{i}' for i in range(4)]
+        for username in recipients:
+            self.db.save_data({"query": "query_insert_user", "query_arguments": {"username": username, "password": "1234", "role": "user", "unread_msgs": 0}})
+        delivered = []
+        read = []
+        errors = []
+
+        def client(seed):
+            rand = random.Random(seed)
+            sender = Session("sender_session")
+            sender.username = 'user1'
+            try:
+                for _ in range(40):
+                    choice = rand.random()
+                    if choice < 0.5:
+                        recipient = rand.choice(recipients)
+                        result = self.message_manager.send_msg_to_recipient(session=sender, recipient=recipient, msg_content='hello')
+                        delivered.extend([recipient] if result['status'] == 'success' else [])
+                    elif choice < 0.7:
+                        result = self.message_manager.broadcast_msg(session=sender, recipients=recipients, msg_content='hello')
+                        delivered.extend(result['sent'])
+                    else:
+                        reader = Session("reader_session")
+                        reader.username = rand.choice(recipients)
+                        reader.role = 'user'
+                        result = self.message_manager.read_msg(session=reader)
+                        read.extend([reader.username] * len(result) if isinstance(result, list) else [])
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=client, args=(seed,)) for seed in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        # every counter matches the messages left to read and never passed the limit
+        for username in recipients:
+            unread = self.get_user_data(username)['unread_msgs']
+            self.assertLessEqual(unread, INBOX_LIMIT)
+            reader = Session("reader_session")
+            reader.username = username
+            reader.role = 'user'
+            result = self.message_manager.read_msg(session=reader)
+            self.assertEqual(len(result) if isinstance(result, list) else 0, unread)
+            self.assertEqual(delivered.count(username), read.count(username) + unread)
+
+    def test_group_commit(self):
+        committer = GroupCommitter(self.db, ThreadPoolExecutor(max_workers=1), max_batch=4, max_delay=0.05)
+        message_manager = WriteBehindMessageManager(self.db, self.user_manager, committer=committer)
+        session = Session("sender_session")
+        session.username = 'user2'
+        recipients = ['user1'] * 6 + ['nobody'] + ['user4'] * 4
+
+        async def send_all():
+            results = await asyncio.gather(*(message_manager.send_msg_to_recipient(session=session, recipient=recipient, msg_content=f'msg{i}')
+                                             for i, recipient in enumerate(recipients)))
+            await committer.close()
+            return results
+
+        results = [result['message'] for result in asyncio.run(send_all())]
+        # every recipient takes the messages in the order they were sent until the inbox is full
+        self.assertEqual(results, ['The message has been sent to user1.'] * 5 + ['Inbox is full.', 'There is no such user like nobody.']
+                         + ['The message has been sent to user4.'] * 3 + ['Inbox is full.'])
+        self.assertEqual(committer.get_stats()['batches'], 3)
+        self.assertEqual(self.get_user_data('user1')['unread_msgs'], 5)
+        self.assertEqual(self.get_user_data('user4')['unread_msgs'], 5)
+        reader = Session("reader_session")
+        reader.username = 'user1'
+        reader.role = 'user'
+        self.assertEqual([msg['message'] for msg in self.message_manager.read_msg(session=reader)], [f'msg{i}' for i in range(5)])
+
+    def test_broadcast_message(self):
+        self.session.username = 'user2'
+        result = self.message_manager.broadcast_msg(session=self.session, recipients=['user1', 'user3', 'user4', 'nobody', 'user1'], msg_content='announcement')
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['message'], 'The message has been sent to 2 of 4 recipients.')
+        self.assertEqual(result['sent'], ['user1', 'user4'])
+        self.assertEqual(result['failed'], {'user3': 'Inbox is full.', 'nobody': 'There is no such user.'})
+
+        self.assertEqual(self.get_user_data('user1')['unread_msgs'], 1)
+        self.assertEqual(self.get_user_data('user4')['unread_msgs'], 3)
+        self.assertEqual(self.get_user_msgs_from_inbox('user1'), [{'sender': 'user2', 'receiver': 'user1', 'message': 'announcement'}])
+
+    def test_broadcast_message_invalid_recipients(self):
+        self.session.username = 'user2'
+        result = self.message_manager.broadcast_msg(session=self.session, recipients='user1', msg_content='announcement')
+        self.assertEqual(result['status'], 'failure')
+        result = self.message_manager.broadcast_msg(session=self.session, recipients=[], msg_content='announcement')
+        self.assertEqual(result['message'], 'Recipients must be a non-empty list of names.')
+        result = self.message_manager.broadcast_msg(session=self.session, recipients=['user1'] * 1001, msg_content='announcement')
+        self.assertEqual(result['status'], 'failure')
+
+    def test_broadcast_message_concurrent(self):
+        db = Database(self.config, {"minconn": 0, "maxconn": 8})
+        message_manager = MessageManager(db, UserManager(db))
+        results = []
+
+        def broadcast(recipients):
+            session = Session("sender_session")
+            session.username = 'user2'
+            results.append(message_manager.broadcast_msg(session=session, recipients=recipients, msg_content='announcement'))
+
+        # opposite orders of recipients mustn't deadlock
+        threads = [threading.Thread(target=broadcast, args=(['user1', 'user4'] if i % 2 else ['user4', 'user1'],)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        db.close()
+
+        self.assertEqual(sum(len(result['sent']) for result in results), 5 + 3)
+        self.assertEqual(self.get_user_data('user1')['unread_msgs'], 5)
+        self.assertEqual(self.get_user_data('user4')['unread_msgs'], 5)
+
     def test_read_message_success(self):
-        self.user_manager.logged_in_user = 'user4'
-        result = self.message_manager.read_msg()
+        self.session.username = 'user4'
+        result = self.message_manager.read_msg(session=self.session)
 
         # Check content of message
         messages = self.get_user_msgs_from_inbox('user4')
@@ -156,31 +288,96 @@ class MessageTest(unittest.TestCase):
         user = self.get_user_data('user4')
         self.assertEqual(user['unread_msgs'], 0)
 
+    def test_read_only_new_messages(self):
+        self.session.username = 'user4'
+        self.session.role = 'user'
+        self.assertEqual(len(self.message_manager.read_msg(session=self.session)), 2)
+        self.assertEqual(self.message_manager.read_msg(session=self.session)["message"], "You don't have any messages.")
+
+        sender = Session("sender_session")
+        sender.username = 'user1'
+        self.message_manager.send_msg_to_recipient(session=sender, recipient='user4', msg_content='new')
+        result = self.message_manager.read_msg(session=self.session)
+        self.assertEqual([dict(msg) for msg in result], [{"sender_name": "user1", "message": "new"}])
+        self.assertEqual(self.get_user_data('user4')['unread_msgs'], 0)
+
+    def test_read_message_concurrent_readers(self):
+        results = []
+
+        def read():
+            db = Database(self.config)
+            session = Session("reader_session")
+            session.username = 'user3'
+            session.role = 'user'
+            result = MessageManager(db, UserManager(db)).read_msg(session=session)
+            results.append(result if isinstance(result, list) else [])
+            db.close()
+
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # every message is returned by exactly one of the readers
+        self.assertEqual(sorted(msg['message'] for result in results for msg in result), ['msg1', 'msg2', 'msg3', 'msg4', 'msg5'])
+
     def test_read_message_failure_no_logged_user(self):
-        result = self.message_manager.read_msg()
+        result = self.message_manager.read_msg(session=self.session)
         self.assertEqual(result['status'], 'failure')
         self.assertEqual(result['message'], 'No user is currently logged in.')
 
     def test_read_message_empty_inbox(self):
-        self.user_manager.logged_in_user = 'user1'
-        self.user_manager.logged_in_role = 'user'
-        result = self.message_manager.read_msg()
+        self.session.username = 'user1'
+        self.session.role = 'user'
+        result = self.message_manager.read_msg(session=self.session)
         self.assertEqual(result["message"], "You don't have any messages.")
 
     def test_read_message_as_admin(self):
-        self.user_manager.logged_in_user = 'user4'
-        self.user_manager.logged_in_role = 'admin'
-        result = self.message_manager.read_msg()
-        print(result)
-        self.assertEqual(len(result), 7)
+        self.session.username = 'user4'
+        self.session.role = 'admin'
+        result = self.message_manager.read_msg(session=self.session)
+        # without a page size the admin gets the first page of MAX_PAGE_SIZE messages
+        self.assertEqual(len(result['messages']), 7)
+        self.assertIsNone(result['next_cursor'])
         # Check if number of unread messages was updated
         user = self.get_user_data('user4')
         self.assertEqual(user['unread_msgs'], 0)
 
+    def test_read_message_as_admin_paginated(self):
+        self.session.username = 'user2'
+        self.session.role = 'admin'
+        pages = []
+        cursor = None
+        while True:
+            result = self.message_manager.read_msg(session=self.session, page_size=3, cursor=cursor)
+            pages.append([msg['message'] for msg in result['messages']])
+            cursor = result['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(pages, [['msg1', 'msg2', 'msg3'], ['msg4', 'msg5', 'msg1'], ['msg2']])
+
+    def test_read_message_as_admin_invalid_page(self):
+        self.session.username = 'user2'
+        self.session.role = 'admin'
+        result = self.message_manager.read_msg(session=self.session, page_size=3, cursor='invalid')
+        self.assertEqual(result['message'], 'Invalid cursor.')
+        result = self.message_manager.read_msg(session=self.session, page_size=0)
+        self.assertEqual(result['status'], 'failure')
+        for page_size in [True, False]:
+            result = self.message_manager.read_msg(session=self.session, page_size=page_size)
+            self.assertEqual(result['status'], 'failure')
+
+    def test_read_message_as_admin_stream(self):
+        self.session.username = 'user2'
+        self.session.role = 'admin'
+        chunks = list(self.message_manager.read_msg(session=self.session, page_size=2, stream=True))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 2, 1])
+        self.assertEqual(chunks[0][0]['receiver_name'], 'user3')
+
     @classmethod
     def tearDownClass(cls):
-        cls.cur.execute("DROP TABLE IF EXISTS messages;")
-        cls.cur.execute("DROP TABLE IF EXISTS users;")
+        cls.cur.execute("DROP TABLE IF EXISTS messages, users, schema_version;")
         cls.conn.commit()
         cls.cur.close()
         cls.conn.close()
\ No newline at end of file
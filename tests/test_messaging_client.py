@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import time
+import unittest
+from src.messaging_client import AsyncMessagingClient, MessagingClient
+from src.server import Server
+
+
+class MessagingClientTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = Server("127.0.0.1", 0, "0.0.1", {}, engine='memory')
+        cls.thread = threading.Thread(target=cls.server.start_server)
+        cls.thread.start()
+        while getattr(cls.server, 'listener', None) is None:
+            time.sleep(0.01)
+        cls.port = cls.server.listener.sockets[0].getsockname()[1]
+
+        with MessagingClient(port=cls.port) as client:
+            client.signup("admin", "1234", role="admin")
+            for i in range(3):
+                client.signup(f"user{i}", "1234")
+
+    def test_login_is_replayed_on_pooled_connections(self):
+        with MessagingClient(port=self.port, pool_size=3) as client:
+            self.assertEqual(client.login("user0", "1234")["status"], "success")
+            results = []
+
+            def send():
+                results.append(client.send("admin", "hello")["status"])
+
+            threads = [threading.Thread(target=send) for _ in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            # the inbox of admin fits 5 messages
+            self.assertEqual(results.count("success"), 5)
+            self.assertLessEqual(client.created, 3)
+
+            # the new login replaces the old one on every connection
+            self.assertEqual(client.login("user1", "1234")["status"], "success")
+            for _ in range(3):
+                self.assertEqual(client.read()["message"], "You don't have any messages.")
+
+            self.assertEqual(client.logout()["status"], "success")
+            self.assertEqual(client.read()["message"], "No user is currently logged in.")
+
+    def test_typed_commands(self):
+        with MessagingClient(port=self.port) as client:
+            self.assertEqual(client.info()["version"], "0.0.1")
+            self.assertIn("uptime", client.uptime())
+            self.assertIn("broadcast", client.help())
+            client.login("admin", "1234")
+            result = client.broadcast(["user0", "user2", "nobody"], "announcement")
+            self.assertEqual(result["failed"], {"nobody": "There is no such user."})
+            chunks = list(client.read(page_size=2, stream=True))
+            self.assertTrue(chunks)
+            self.assertTrue(all(1 <= len(chunk) <= 2 for chunk in chunks))
+
+    def test_compressed_columnar_connections(self):
+        async def run():
+            async with AsyncMessagingClient(port=self.port, pool_size=2, compression='zlib', columnar=True) as client:
+                await client.login("admin", "1234")
+                return await asyncio.gather(client.read(), client.read(page_size=2))
+
+        first_page, page = asyncio.run(run())
+        self.assertEqual(set(first_page["messages"][0]), {"msg_id", "sender_name", "receiver_name", "message"})
+        self.assertEqual(len(page["messages"]), 2)
+
+        with MessagingClient(port=self.port, compression='zlib', columnar=True) as client:
+            self.assertEqual(client.info()["version"], "0.0.1")
+
+    def test_connection_refused_after_retries(self):
+        client = MessagingClient(port=1, retries=1, retry_delay=0)
+        with self.assertRaises(ConnectionError):
+            client.uptime()
+        self.assertEqual(client.created, 0)
+
+    def test_async_client(self):
+        async def run():
+            async with AsyncMessagingClient(port=self.port, pool_size=2) as client:
+                await client.login("user2", "1234")
+                answers = await asyncio.gather(*[client.send("user0", f"msg{i}") for i in range(3)] + [client.uptime()])
+                self.assertEqual([answer["status"] for answer in answers[:3]], ["success"] * 3)
+                await client.login("user0", "1234")
+                return await client.read()
+
+        messages = asyncio.run(run())
+        self.assertEqual(sorted(message["message"] for message in messages if message["sender_name"] == "user2"), ["msg0", "msg1", "msg2"])
+
+    def test_async_stream(self):
+        async def run():
+            async with AsyncMessagingClient(port=self.port, pool_size=1) as client:
+                await client.login("admin", "1234")
+                chunks = [chunk async for chunk in client.read(page_size=1, stream=True)]
+                # a stream left early doesn't hold up the connection
+                stream = client.read(page_size=1, stream=True)
+                first = await anext(stream)
+                await stream.aclose()
+                return chunks, first, await client.info()
+
+        chunks, first, info = asyncio.run(run())
+        self.assertTrue(chunks)
+        self.assertEqual({len(chunk) for chunk in chunks}, {1})
+        self.assertEqual(first, chunks[0])
+        self.assertEqual(info["version"], "0.0.1")
+
+    @classmethod
+    def tearDownClass(cls):
+        with MessagingClient(port=cls.port) as client:
+            client.call("stop")
+        cls.thread.join()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from src.metrics import Histogram, Metrics
+
+
+class MetricsTests(unittest.TestCase):
+
+    def test_histogram(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in [0.05, 0.1, 0.5, 2.0]:
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1])
+        self.assertEqual(list(histogram.cumulative()), [(0.1, 2), (1.0, 3), (float('inf'), 4)])
+        self.assertEqual(histogram.quantile(0.5), 0.1)
+        self.assertEqual(histogram.quantile(0.75), 1.0)
+        self.assertEqual(histogram.quantile(1.0), 1.0)
+
+    def test_observe(self):
+        metrics = Metrics(["send", "read"])
+        metrics.observe("send", 0.002, {"status": "success"})
+        metrics.observe("send", 0.004, {"status": "failure", "message": "Inbox is full."})
+        metrics.observe("drop tables", 0.001, "Wrong command")
+        stats = metrics.get_stats()
+        self.assertEqual(stats["commands"]["send"]["requests"], 2)
+        self.assertEqual(stats["commands"]["send"]["errors"], 1)
+        self.assertEqual(stats["commands"]["unknown"]["errors"], 1)
+        self.assertNotIn("drop tables", stats["commands"])
+
+    def test_render_prometheus(self):
+        metrics = Metrics(["send"])
+        metrics.connection_opened()
+        metrics.observe("send", 0.002, {"status": "success"})
+        page = metrics.render_prometheus(
+            db_stats={"query_send_message": {"count": 1, "total_time": 0.001, "max_time": 0.001}},
+            gauges={"server_queued_requests": ("Requests waiting for a worker.", 0)})
+        self.assertIn('server_requests_total{command="send"} 1', page)
+        self.assertIn('server_request_duration_seconds_bucket{command="send",le="0.0025"} 1', page)
+        self.assertIn('server_request_duration_seconds_bucket{command="send",le="0.001"} 0', page)
+        self.assertIn('server_db_queries_total{query="query_send_message"} 1', page)
+        self.assertIn('server_active_connections 1', page)
+        self.assertIn('# TYPE server_queued_requests gauge', page)
+
+    def test_merge(self):
+        first = Metrics(["send"])
+        first.connection_opened()
+        first.observe("send", 0.002, {"status": "success"})
+        second = Metrics(["send", "read"])
+        second.observe("send", 0.02, {"status": "failure"})
+        second.observe("read", 0.001, [])
+        merged = Metrics.merge([first.snapshot(), second.snapshot()])
+        stats = merged.get_stats()
+        self.assertEqual(stats["connections"], 1)
+        self.assertEqual(stats["commands"]["send"]["requests"], 2)
+        self.assertEqual(stats["commands"]["send"]["errors"], 1)
+        self.assertEqual(stats["commands"]["read"]["requests"], 1)
+        self.assertEqual(merged.latency["send"].count, 2)
+        self.assertEqual(merged.start_time, first.start_time)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+import psycopg2
+from src.database import Database
+from src.migrations import MIGRATIONS, apply_migrations, get_schema_version
+from configparser import ConfigParser
+
+def load_config(filename='database.ini', section='postgresql'):
+    parser = ConfigParser()
+    parser.read(filename)
+    config = {}
+    if parser.has_section(section):
+        params = parser.items(section)
+        for param in params:
+            config[param[0]] = param[1]
+    else:
+        raise Exception(f'Section {section} not found in the {filename} file')
+    return config
+
+class MigrationTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.config = load_config()
+        cls.db = Database(cls.config)
+        cls.conn = cls.db.conn
+        cls.cur = cls.conn.cursor()
+
+    def setUp(self):
+        self.cur.execute("DROP TABLE IF EXISTS messages, messages_archive, users, schema_version;")
+        self.conn.commit()
+
+    def test_apply_all_migrations(self):
+        self.assertEqual(get_schema_version(self.db), 0)
+        self.assertEqual(apply_migrations(self.db), [version for version, _, _ in MIGRATIONS])
+        self.assertEqual(get_schema_version(self.db), MIGRATIONS[-1][0])
+        # applying again is a no-op
+        self.assertEqual(apply_migrations(self.db), [])
+
+    def test_migrate_existing_data(self):
+        apply_migrations(self.db, target_version=1)
+        self.cur.execute(
+            """
+            INSERT INTO users (username, password, role, unread_msgs)
+            VALUES ('user1', '1234', 'user', 0), ('user2', '1234', 'user', 1);
+
+            INSERT INTO messages (sender_name, receiver_name, message)
+            VALUES ('user1', 'user2', 'msg1');
+            """
+        )
+        self.conn.commit()
+
+        self.assertEqual(apply_migrations(self.db, target_version=2), [2])
+        self.cur.execute(
+            """
+            SELECT sender.username, receiver.username, messages.created_at IS NOT NULL
+            FROM messages
+            JOIN users sender ON sender.user_id = messages.sender_id
+            JOIN users receiver ON receiver.user_id = messages.receiver_id
+            """
+        )
+        self.assertEqual(self.cur.fetchall(), [('user1', 'user2', True)])
+
+    def test_read_watermark_keeps_unread_messages(self):
+        apply_migrations(self.db, target_version=2)
+        self.cur.execute(
+            """
+            INSERT INTO users (username, password, role, unread_msgs)
+            VALUES ('user1', '1234', 'user', 0), ('user2', '1234', 'user', 1), ('user3', '1234', 'user', 0);
+            """
+        )
+        for receiver, message in [('user1', 'msg1'), ('user2', 'msg2'), ('user2', 'msg3'), ('user1', 'msg4')]:
+            self.db.save_data({"query": "query_insert_message", "query_arguments": {"sender": "user3", "receiver": receiver, "message": message}})
+        self.conn.commit()
+
+        self.assertEqual(apply_migrations(self.db, target_version=3), [3])
+        read = lambda username: [row['message'] for row in self.db.save_and_get_all(
+            {"query": "query_read_new_messages", "query_arguments": {"username": username, "limit": 10}})]
+        self.assertEqual(read('user1'), [])
+        self.assertEqual(read('user2'), ['msg3'])
+        self.assertEqual(read('user3'), [])
+
+    def test_deleted_messages_leave_inbox(self):
+        apply_migrations(self.db)
+        for username in ['user1', 'user2']:
+            self.db.save_data({"query": "query_insert_user", "query_arguments": {"username": username, "password": "1234", "role": "user", "unread_msgs": 0}})
+        for i in range(4):
+            self.db.save_and_get_data({"query": "query_send_message", "query_arguments": {
+                "sender": "user1", "receiver": "user2", "message": f"msg{i}", "inbox_limit": 5}})
+        self.db.save_and_get_all({"query": "query_read_new_messages", "query_arguments": {"username": "user2", "limit": 1}})
+
+        # only the unread messages are taken off the counter
+        self.cur.execute("DELETE FROM messages WHERE message IN ('msg0', 'msg1', 'msg2')")
+        self.conn.commit()
+        self.cur.execute("SELECT unread_msgs FROM users WHERE username = 'user2'")
+        self.assertEqual(self.cur.fetchone()[0], 1)
+        with self.assertRaises(psycopg2.errors.CheckViolation):
+            self.cur.execute("UPDATE users SET unread_msgs = -1 WHERE username = 'user2'")
+        self.conn.rollback()
+
+    def test_partition_existing_messages(self):
+        apply_migrations(self.db, target_version=4)
+        for username in ['user1', 'user2']:
+            self.db.save_data({"query": "query_insert_user", "query_arguments": {"username": username, "password": "1234", "role": "user", "unread_msgs": 0}})
+        send = lambda receiver, message: self.db.save_and_get_data({"query": "query_send_message", "query_arguments": {
+            "sender": "user1", "receiver": receiver, "message": message, "inbox_limit": 100}})
+        send("user1", "old0")
+        send("user2", "old1")
+        send("user2", "old2")
+
+        # the existing rows stay where they are, in the partition of the ids given so far
+        self.assertEqual(apply_migrations(self.db), [5])
+        self.cur.execute("SELECT relkind FROM pg_class WHERE relname = 'messages'")
+        self.assertEqual(self.cur.fetchone()[0], 'p')
+        self.cur.execute("SELECT count(*) FROM messages_legacy")
+        self.assertEqual(self.cur.fetchone()[0], 3)
+
+        maintain = lambda: self.db.save_and_get_data({"query": "query_maintain_partitions", "query_arguments": {"partition_size": 2, "partitions_ahead": 2}})
+        self.assertEqual(dict(maintain()), {"created": 2, "dropped": 0})
+        self.assertEqual(dict(maintain()), {"created": 0, "dropped": 0})
+        send("user2", "new0")
+        send("user2", "new1")
+        self.cur.execute("SELECT tableoid::regclass::text FROM messages WHERE message = 'new0'")
+        self.assertEqual(self.cur.fetchone()[0], 'messages_4')
+        self.conn.commit()
+
+        archive = lambda: self.db.save_and_get_data({"query": "query_archive_messages", "query_arguments": {
+            "cutoff": datetime.now(timezone.utc) + timedelta(days=1), "limit": 2}})["archived"]
+        self.db.save_and_get_all({"query": "query_read_new_messages", "query_arguments": {"username": "user2", "limit": 10}})
+        # only read messages are archived
+        self.assertEqual(archive(), 2)
+        self.assertEqual(archive(), 2)
+        self.assertEqual(archive(), 0)
+
+        # the emptied partition is dropped, the unread message of user1 only keeps the partition of the old ids
+        self.assertEqual(maintain()["dropped"], 1)
+        self.cur.execute("SELECT to_regclass('messages_4'), to_regclass('messages_legacy')::text")
+        self.assertEqual(self.cur.fetchone(), (None, 'messages_legacy'))
+
+        self.cur.execute("SELECT message_count, messages FROM messages_archive ORDER BY archive_id")
+        batches = self.cur.fetchall()
+        self.assertEqual([count for count, _ in batches], [2, 2])
+        self.assertEqual([row["message"] for _, rows in batches for row in rows], ["old1", "old2", "new0", "new1"])
+        self.assertEqual(batches[0][1][0]["receiver_name"], "user2")
+        self.cur.execute("SELECT username, unread_msgs FROM users ORDER BY username")
+        self.assertEqual(self.cur.fetchall(), [('user1', 1), ('user2', 0)])
+        self.conn.commit()
+
+        purge = self.db.save_and_get_data({"query": "query_purge_archive", "query_arguments": {"cutoff": datetime.now(timezone.utc) + timedelta(days=1)}})
+        self.assertEqual(purge["purged"], 4)
+
+    def test_username_is_unique(self):
+        apply_migrations(self.db)
+        user = {"username": "user1", "password": "1234", "role": "user", "unread_msgs": 0}
+        self.db.save_data({"query": "query_insert_user", "query_arguments": user})
+        with self.assertRaises(psycopg2.errors.UniqueViolation):
+            self.db.save_data({"query": "query_insert_user", "query_arguments": user})
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.cur.execute("DROP TABLE IF EXISTS messages, messages_archive, users, schema_version;")
+        cls.conn.commit()
+        cls.cur.close()
+        cls.conn.close()
+
+if __name__ == "__main__":
+    unittest.main()
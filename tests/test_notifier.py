@@ -0,0 +1,80 @@
+import asyncio
+import unittest
+from src.notifier import Notifier, PostgresNotifyBridge
+from configparser import ConfigParser
+
+def load_config(filename='database.ini', section='postgresql'):
+    parser = ConfigParser()
+    parser.read(filename)
+    config = {}
+    if parser.has_section(section):
+        params = parser.items(section)
+        for param in params:
+            config[param[0]] = param[1]
+    else:
+        raise Exception(f'Section {section} not found in the {filename} file')
+    return config
+
+class NotifierTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.notifier = Notifier()
+        self.notifier.bind(asyncio.get_running_loop())
+
+    async def test_publish_to_subscribers_of_the_user(self):
+        first, second, other = [], [], []
+        self.notifier.subscribe('user1', first.append)
+        self.notifier.subscribe('user1', second.append)
+        self.notifier.subscribe('user2', other.append)
+
+        # published from a worker thread, delivered on the loop
+        await asyncio.to_thread(self.notifier.publish, 'user1', {"message": "hello"})
+        await asyncio.sleep(0)
+        self.assertEqual(first, [{"message": "hello"}])
+        self.assertEqual(second, [{"message": "hello"}])
+        self.assertEqual(other, [])
+        self.assertEqual(self.notifier.get_stats(), {"subscriptions": 3, "delivered": 2, "dropped": 0})
+
+    async def test_cancel_and_drop(self):
+        events = []
+        subscription = self.notifier.subscribe('user1', events.append)
+        self.notifier.subscribe('user1', lambda event: False)
+        subscription.cancel()
+        self.notifier.publish('user1', {"message": "hello"})
+        await asyncio.sleep(0)
+        self.assertEqual(events, [])
+        self.assertEqual(self.notifier.get_stats(), {"subscriptions": 1, "delivered": 0, "dropped": 1})
+
+    async def test_publish_without_subscribers(self):
+        self.notifier.publish('nobody', {"message": "hello"})
+        await asyncio.sleep(0)
+        self.assertEqual(self.notifier.subscribers, {})
+
+
+class PostgresNotifyBridgeTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_events_reach_the_other_server(self):
+        config = load_config()
+        loop = asyncio.get_running_loop()
+        sender = Notifier(PostgresNotifyBridge(config, 'test_events'))
+        receiver = Notifier(PostgresNotifyBridge(config, 'test_events'))
+        received = asyncio.Queue()
+        sent = []
+        for notifier in (sender, receiver):
+            notifier.bind(loop)
+            notifier.bridge.start(notifier)
+        try:
+            receiver.subscribe('user1', received.put_nowait)
+            sender.subscribe('user1', sent.append)
+            sender.publish('user1', {"message": "hello"})
+            self.assertEqual(await asyncio.wait_for(received.get(), 5), {"message": "hello"})
+            # the sending server delivers its own events only once
+            await asyncio.sleep(0.2)
+            self.assertEqual(sent, [{"message": "hello"}])
+        finally:
+            await asyncio.to_thread(sender.bridge.stop)
+            await asyncio.to_thread(receiver.bridge.stop)
+
+
+if __name__ == "__main__":
+    unittest.main()
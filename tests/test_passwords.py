@@ -0,0 +1,64 @@
+import asyncio
+import unittest
+from src.passwords import DUMMY_HASH, SALT_SIZE, PasswordHasher, hash_password, needs_rehash, verify_password
+from src.memory_database import MemoryDatabase
+from src.session import Session
+from src.user_manager import UserManager
+
+
+class PasswordTests(unittest.TestCase):
+
+    def test_hash_and_verify(self):
+        stored = hash_password("1234")
+        self.assertTrue(stored.startswith("scrypt$16384$8$1$"))
+        self.assertNotEqual(stored, hash_password("1234"))
+        self.assertTrue(verify_password("1234", stored))
+        self.assertFalse(verify_password("12345", stored))
+        self.assertFalse(verify_password("1234", "scrypt$16384$8$1$not base64$"))
+        self.assertFalse(needs_rehash(stored))
+        self.assertTrue(needs_rehash(hash_password("1234", n=2 ** 10)))
+        self.assertEqual(DUMMY_HASH, hash_password("", salt=bytes(SALT_SIZE)))
+
+    def test_plain_text_password(self):
+        self.assertTrue(verify_password("1234", "1234"))
+        self.assertFalse(verify_password("12345", "1234"))
+        self.assertTrue(needs_rehash("1234"))
+
+    def test_process_pool(self):
+        hasher = PasswordHasher(workers=1)
+        try:
+            stored = hasher.hash("1234")
+            self.assertTrue(hasher.verify("user1", "1234", stored))
+            self.assertFalse(hasher.verify("user1", "wrong", stored))
+            self.assertFalse(hasher.verify("user2", "", None))
+            self.assertTrue(asyncio.run(hasher.async_verify("user3", "1234", asyncio.run(hasher.async_hash("1234")))))
+        finally:
+            hasher.close()
+
+    def test_verification_cache(self):
+        hasher = PasswordHasher(workers=0, cache_ttl=30)
+        stored = hash_password("1234")
+        self.assertFalse(hasher.cached("user1", "1234", stored))
+        self.assertTrue(hasher.verify("user1", "1234", stored))
+        self.assertTrue(hasher.cached("user1", "1234", stored))
+        # a wrong password or a changed hash isn't answered from the cache
+        self.assertFalse(hasher.cached("user1", "wrong", stored))
+        self.assertFalse(hasher.cached("user1", "1234", hash_password("1234")))
+        self.assertFalse(hasher.verify("user1", "wrong", stored))
+        self.assertFalse(PasswordHasher(workers=0, cache_ttl=0).cached("user1", "1234", stored))
+
+    def test_login_upgrades_plain_text_password(self):
+        db = MemoryDatabase()
+        db.save_data({"query": "query_insert_user", "query_arguments": {"username": "user1", "password": "1234", "role": "admin", "unread_msgs": 0}})
+        user_manager = UserManager(db)
+        session = Session("test_session")
+        self.assertEqual(user_manager.login(session, username="user1", password="1234")["status"], "success")
+        self.assertEqual(session.role, "admin")
+        stored = db.get_data({"query": "query_get_user_credentials", "query_arguments": {"username": "user1"}})[0]["password"]
+        self.assertFalse(needs_rehash(stored))
+        self.assertTrue(verify_password("1234", stored))
+        self.assertEqual(user_manager.login(Session("other_session"), username="user1", password="1234")["status"], "success")
+
+
+if __name__ == "__main__":
+    unittest.main()
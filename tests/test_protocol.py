@@ -0,0 +1,110 @@
+import asyncio
+import unittest
+from src.protocol import (Codec, FrameDecoder, FrameReader, ProtocolError, RAW, ZLIB, decode_msg, encode_msg,
+                          msgpack, pack_rows, read_msg)
+
+
+class FakeSocket:
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def recv(self, size):
+        return self.chunks.pop(0) if self.chunks else b''
+
+
+class ProtocolTests(unittest.TestCase):
+
+    def test_decode_partial_frame(self):
+        frame = encode_msg({"command": "uptime"})
+        decoder = FrameDecoder()
+        decoder.feed(frame[:3])
+        self.assertIsNone(decoder.next_frame())
+        decoder.feed(frame[3:-1])
+        self.assertIsNone(decoder.next_frame())
+        decoder.feed(frame[-1:])
+        self.assertEqual(decode_msg(decoder.next_frame()), {"command": "uptime"})
+        self.assertEqual(len(decoder.buffer), 0)
+
+    def test_decode_coalesced_frames(self):
+        decoder = FrameDecoder()
+        decoder.feed(encode_msg({"command": "uptime"}) + encode_msg({"command": "info"}) + encode_msg("x")[:2])
+        frames = [decode_msg(payload) for payload in decoder.frames()]
+        self.assertEqual(frames, [{"command": "uptime"}, {"command": "info"}])
+        self.assertEqual(len(decoder.buffer), 2)
+
+    def test_decode_too_large_frame(self):
+        decoder = FrameDecoder(max_frame_size=10)
+        decoder.feed(encode_msg("A" * 20))
+        with self.assertRaises(ProtocolError):
+            decoder.next_frame()
+
+    def test_frame_reader_large_message(self):
+        msgs = [{"sender_name": "user1", "message": "A" * 255} for _ in range(1000)]
+        data = encode_msg(msgs) + encode_msg('stop')
+        chunks = [data[i:i + 1000] for i in range(0, len(data), 1000)]
+        reader = FrameReader(FakeSocket(chunks))
+        self.assertEqual(reader.read_msg(), msgs)
+        self.assertEqual(reader.read_msg(), 'stop')
+        self.assertIsNone(reader.read_msg())
+
+    def test_async_read_msg(self):
+        async def read_all():
+            reader = asyncio.StreamReader()
+            reader.feed_data(encode_msg({"command": "read"}) + encode_msg({"command": "logout"}))
+            reader.feed_eof()
+            return [await read_msg(reader) for _ in range(3)]
+
+        self.assertEqual(asyncio.run(read_all()), [{"command": "read"}, {"command": "logout"}, None])
+
+
+class CodecTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [{"sender_name": f"user{i}", "receiver_name": "admin", "message": "A" * 100} for i in range(100)]
+
+    def test_columnar_rows(self):
+        packed = pack_rows({"messages": self.rows, "next_cursor": None})
+        self.assertEqual(packed["messages"]["$columns"], ["sender_name", "receiver_name", "message"])
+        self.assertEqual(list(packed["messages"]["$rows"][0]), ["user0", "admin", "A" * 100])
+        # rows with different keys are sent as they are
+        self.assertEqual(pack_rows([{"a": 1}, {"b": 2}]), [{"a": 1}, {"b": 2}])
+
+        codec = Codec(columnar=True)
+        payload = codec.dumps(self.rows)
+        self.assertLess(len(payload), len(encode_msg(self.rows)) * 0.8)
+        self.assertEqual(codec.loads(payload), self.rows)
+
+    def test_compression(self):
+        codec = Codec(compression='zlib')
+        payload = codec.dumps(self.rows)
+        self.assertEqual(payload[:1], ZLIB)
+        self.assertLess(len(payload), len(encode_msg(self.rows)) / 10)
+        self.assertEqual(codec.loads(payload), self.rows)
+        # small payloads aren't compressed
+        self.assertEqual(codec.dumps({"command": "info"}), RAW + b'{"command": "info"}')
+        self.assertEqual(codec.loads(RAW + b'{"command": "info"}'), {"command": "info"})
+        with self.assertRaises(ValueError):
+            codec.loads(ZLIB + b'not compressed')
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test_msgpack(self):
+        codec = Codec('msgpack', compression='zlib', columnar=True)
+        self.assertEqual(codec.loads(codec.dumps({"request_id": 1, "response": self.rows})), {"request_id": 1, "response": self.rows})
+
+    def test_unavailable_codec(self):
+        with self.assertRaises(ValueError):
+            Codec('xml')
+        with self.assertRaises(ValueError):
+            Codec(compression='lz4')
+
+    def test_frame_reader_with_codec(self):
+        codec = Codec(compression='zlib', columnar=True)
+        data = codec.encode_msg(self.rows) + codec.encode_msg('stop')
+        reader = FrameReader(FakeSocket([data[:100], data[100:]]), codec=codec)
+        self.assertEqual(reader.read_msg(), self.rows)
+        self.assertEqual(reader.read_msg(), 'stop')
+
+
+if __name__ == "__main__":
+    unittest.main()
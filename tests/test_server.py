@@ -0,0 +1,217 @@
+import asyncio
+import socket
+import threading
+import time
+import unittest
+import src.protocol as protocol
+from src.client import Connection, StreamError
+from src.server import Server
+from src.session import Session
+from configparser import ConfigParser
+
+def load_config(filename='database.ini', section='postgresql'):
+    parser = ConfigParser()
+    parser.read(filename)
+    config = {}
+    if parser.has_section(section):
+        params = parser.items(section)
+        for param in params:
+            config[param[0]] = param[1]
+    else:
+        raise Exception(f'Section {section} not found in the {filename} file')
+    return config
+
+class ServerTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.config = load_config()
+        cls.server = Server("127.0.0.1", 0, "0.0.1", cls.config, handler_workers=2, max_queue=2)
+        cls.conn = cls.server.db.conn
+        cls.cur = cls.conn.cursor()
+
+    def setUp(self):
+        self.cur.execute(
+            """
+            DELETE FROM messages;
+            DELETE FROM users;
+
+            INSERT INTO users (username, password, role, unread_msgs)
+            VALUES ('user1', '1234', 'user', 0);
+            """
+        )
+        self.conn.commit()
+        self.session = Session("test_session")
+
+    def test_run_handler_on_worker(self):
+        request = {"command": "login", "username": "user1", "password": "1234"}
+        result = asyncio.run(self.server.run_handler(request, self.session))
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(self.session.username, "user1")
+
+    def test_run_inline_command(self):
+        result = asyncio.run(self.server.run_handler({"command": "info"}, self.session))
+        self.assertEqual(result["version"], "0.0.1")
+
+    def test_wrong_command(self):
+        result = asyncio.run(self.server.run_handler({"command": "unknown"}, self.session))
+        self.assertEqual(result, "Wrong command")
+
+    def test_server_busy(self):
+        async def run_requests():
+            request = {"command": "login", "username": "user1", "password": "1234"}
+            return await asyncio.gather(*[self.server.run_handler(request, Session(f"session{i}")) for i in range(4)])
+
+        results = asyncio.run(run_requests())
+        # only max_queue requests can wait for a worker, the rest is rejected
+        self.assertEqual([result["status"] for result in results], ["success", "success", "failure", "failure"])
+        self.assertEqual(results[2]["message"], "Server is busy. Try again later.")
+        self.assertEqual(self.server.queued, 0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.executor.shutdown()
+        cls.cur.execute("DROP TABLE IF EXISTS messages, users, schema_version;")
+        cls.conn.commit()
+        cls.cur.close()
+        cls.server.db.close()
+
+class PipelineTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = Server("127.0.0.1", 0, "0.0.1", load_config(), engine='memory', max_in_flight=4, metrics_port=0)
+        cls.thread = threading.Thread(target=cls.server.start_server)
+        cls.thread.start()
+        while getattr(cls.server, 'metrics_listener', None) is None:
+            time.sleep(0.01)
+        cls.port = cls.server.listener.sockets[0].getsockname()[1]
+
+        with Connection(port=cls.port) as conn:
+            conn.request("signup", username="admin", password="1234", role="admin")
+            conn.request("signup", username="user1", password="1234", role="user")
+            conn.request("signup", username="user2", password="1234", role="user")
+
+    def setUp(self):
+        self.conn = Connection(port=self.port).connect()
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_pipeline(self):
+        self.assertEqual(self.conn.request("login", username="user1", password="1234")["status"], "success")
+        answers = self.conn.pipeline([{"command": "send", "recipient": "admin", "msg_content": f"msg{i}"} for i in range(3)]
+                                     + [{"command": "info"}, {"command": "unknown"}])
+        self.assertEqual([answer["status"] for answer in answers[:3]], ["success"] * 3)
+        self.assertEqual(answers[3]["version"], "0.0.1")
+        self.assertEqual(answers[4], "Wrong command")
+
+    def test_batch(self):
+        answers = self.conn.batch([
+            {"command": "login", "username": "admin", "password": "1234"},
+            {"command": "send", "recipient": "user1", "msg_content": "hello", "request_id": "a"},
+            {"command": "read", "page_size": 1, "stream": True},
+        ])
+        self.assertEqual(answers[0]["status"], "success")
+        self.assertEqual(answers[1], {"request_id": "a", "response": {"status": "success", "message": "The message has been sent to user1."}})
+        self.assertEqual(answers[2]["message"], "Streams can't be sent in a batch.")
+
+    def test_stream_with_request_id(self):
+        self.conn.request("login", username="admin", password="1234")
+        self.conn.request("send", recipient="user1", msg_content="streamed")
+        chunks = list(self.conn.stream("read", page_size=1, stream=True))
+        self.assertEqual({len(chunk) for chunk in chunks}, {1})
+        self.assertIn([{"sender_name": "admin", "receiver_name": "user1", "message": "streamed"}], chunks)
+
+        answer = self.conn.request("read", page_size=1, stream=True)
+        self.assertTrue(answer["end_of_stream"])
+        self.assertNotIn("items", answer)
+
+    def test_stream_closed_early(self):
+        self.conn.request("login", username="admin", password="1234")
+        for i in range(3):
+            self.conn.request("send", recipient="user2", msg_content=f"early{i}")
+        stream = self.conn.stream("read", page_size=1, stream=True)
+        self.assertEqual(len(next(stream)), 1)
+        stream.close()
+        # the rest of the stream is skipped
+        self.assertEqual(self.conn.request("info")["version"], "0.0.1")
+        self.assertEqual(self.conn.results, {})
+
+        with self.assertRaises(StreamError):
+            list(self.conn.stream("read", page_size=0, stream=True))
+
+    def test_answer_too_large(self):
+        max_frame_size = protocol.MAX_FRAME_SIZE
+        protocol.MAX_FRAME_SIZE = 300
+        try:
+            answer = self.conn.request("help")
+            pipelined = self.conn.pipeline([{"command": "help"}])[0]
+        finally:
+            protocol.MAX_FRAME_SIZE = max_frame_size
+        self.assertEqual(answer["status"], "failure")
+        self.assertEqual(pipelined["status"], "failure")
+        # the connection stays open
+        self.assertEqual(self.conn.request("info")["version"], "0.0.1")
+
+    def test_stats(self):
+        self.conn.request("login", username="user1", password="1234")
+        self.conn.request("unknown")
+        stats = self.conn.request("stats")
+        self.assertGreaterEqual(stats["commands"]["login"]["requests"], 1)
+        self.assertGreaterEqual(stats["commands"]["unknown"]["errors"], 1)
+        self.assertGreaterEqual(stats["active_connections"], 1)
+        self.assertIn("query_insert_user", stats["db"])
+        self.assertIn("partitions_created", stats["retention"])
+
+    def test_metrics_endpoint(self):
+        self.conn.request("info")
+        port = self.server.metrics_listener.sockets[0].getsockname()[1]
+        with socket.create_connection(("127.0.0.1", port)) as sock:
+            sock.sendall(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            response = b"".join(iter(lambda: sock.recv(65536), b"")).decode()
+        self.assertTrue(response.startswith("HTTP/1.1 200 OK"))
+        self.assertIn('server_requests_total{command="info"}', response)
+        self.assertIn('server_request_duration_seconds_bucket{command="info",le="+Inf"}', response)
+        self.assertIn('server_db_queries_total{query="query_insert_user"} 3', response)
+
+    def test_hello(self):
+        self.assertEqual(self.conn.request("hello", codec="xml")["status"], "failure")
+        answer = self.conn.hello(compression='zlib', columnar=True)
+        self.assertEqual(answer, {"status": "success", "codec": "json", "compression": "zlib", "columnar": True})
+
+        self.conn.request("login", username="admin", password="1234")
+        for i in range(3):
+            self.conn.request("send", recipient="user1", msg_content=f"hello{i}")
+        answer = self.conn.request("read", buffered=True, page_size=2, stream=True)
+        self.assertTrue(answer["end_of_stream"])
+        self.assertIn({"sender_name": "admin", "receiver_name": "user1", "message": "hello2"}, answer["items"])
+        self.assertEqual(self.conn.request("info")["version"], "0.0.1")
+
+    def test_subscribe(self):
+        self.assertEqual(self.conn.request("subscribe")["message"], "No user is currently logged in.")
+        self.conn.request("login", username="admin", password="1234")
+        # empties the inbox filled by the other tests
+        self.conn.request("read")
+        self.assertEqual(self.conn.request("subscribe")["status"], "success")
+        self.assertEqual(self.conn.request("subscribe")["message"], "You are already subscribed.")
+
+        with Connection(port=self.port) as sender:
+            sender.request("login", username="user1", password="1234")
+            sender.request("send", recipient="admin", msg_content="pushed")
+            sender.request("broadcast", recipients=["admin", "user1"], msg_content="pushed to all")
+        self.assertEqual(self.conn.next_event(), {"type": "message", "sender_name": "user1", "message": "pushed"})
+        self.assertEqual(self.conn.next_event()["message"], "pushed to all")
+
+        self.conn.request("logout")
+        self.assertEqual(self.conn.request("unsubscribe")["message"], "You are not subscribed.")
+        self.assertEqual(self.server.stats()["events"]["subscriptions"], 0)
+
+    @classmethod
+    def tearDownClass(cls):
+        with Connection(port=cls.port) as conn:
+            conn.request("stop")
+        cls.thread.join()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+from src.notifier import Notifier, Subscription
+from src.session import SessionManager
+
+
+class SessionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.session_manager = SessionManager(idle_timeout=60)
+
+    def test_sessions_are_independent(self):
+        first = self.session_manager.create()
+        second = self.session_manager.create()
+        first.username = 'user1'
+        first.role = 'admin'
+        self.assertTrue(first.is_logged_in())
+        self.assertFalse(second.is_logged_in())
+        self.assertIs(self.session_manager.get(first.session_id), first)
+        self.assertIs(self.session_manager.get(second.session_id), second)
+
+    def test_get_expired_session(self):
+        session = self.session_manager.create()
+        session.username = 'user1'
+        session.last_seen -= 61
+        self.assertIsNone(self.session_manager.get(session.session_id))
+        self.assertFalse(session.is_logged_in())
+        self.assertNotIn(session.session_id, self.session_manager.sessions)
+
+    def test_expire_idle(self):
+        idle = self.session_manager.create()
+        active = self.session_manager.create()
+        idle.last_seen -= 61
+        self.session_manager.get(active.session_id)
+        self.assertEqual(self.session_manager.expire_idle(), 1)
+        self.assertEqual(list(self.session_manager.sessions), [active.session_id])
+
+    def test_subscribed_session_does_not_expire(self):
+        subscribed = self.session_manager.create()
+        subscribed.subscription = Subscription(Notifier(), 'user1', None)
+        subscribed.last_seen -= 61
+        self.assertEqual(self.session_manager.expire_idle(), 0)
+        self.assertIs(self.session_manager.get(subscribed.session_id), subscribed)
+
+    def test_remove(self):
+        session = self.session_manager.create()
+        session.username = 'user1'
+        self.session_manager.remove(session.session_id)
+        self.assertIsNone(self.session_manager.get(session.session_id))
+        self.assertFalse(session.is_logged_in())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+from src.database import Database
+from src.migrations import apply_migrations
+from src.statements import to_positional
+from configparser import ConfigParser
+
+def load_config(filename='database.ini', section='postgresql'):
+    parser = ConfigParser()
+    parser.read(filename)
+    config = {}
+    if parser.has_section(section):
+        params = parser.items(section)
+        for param in params:
+            config[param[0]] = param[1]
+    else:
+        raise Exception(f'Section {section} not found in the {filename} file')
+    return config
+
+class StatementTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.config = load_config()
+        cls.db = Database(cls.config)
+        cls.conn = cls.db.conn
+        cls.cur = cls.conn.cursor()
+        cls.cur.execute("DROP TABLE IF EXISTS messages, users, schema_version;")
+        cls.conn.commit()
+        apply_migrations(cls.db)
+        cls.db.save_data({"query": "query_insert_user", "query_arguments": {"username": "user1", "password": "1234", "role": "user", "unread_msgs": 0}})
+
+    def setUp(self):
+        self.cur.execute("DEALLOCATE ALL")
+        self.conn.commit()
+        self.conn.prepared.clear()
+        self.db.statements.stats.clear()
+
+    def prepared_statements(self):
+        self.cur.execute("SELECT name FROM pg_prepared_statements ORDER BY name")
+        names = [row[0] for row in self.cur.fetchall()]
+        self.conn.commit()
+        return names
+
+    def user_exists(self, username):
+        return self.db.check_data({"query": "query_check_if_user_exist", "query_arguments": {"username": username}})
+
+    def test_to_positional(self):
+        self.assertEqual(to_positional("SELECT * FROM users WHERE username = %s AND password = %s"),
+                         "SELECT * FROM users WHERE username = $1 AND password = $2")
+        self.assertEqual(to_positional("SELECT 5 %% 2, %s"), "SELECT 5 % 2, $1")
+
+    def test_statement_is_prepared_once(self):
+        self.assertTrue(self.user_exists('user1'))
+        self.assertFalse(self.user_exists('user2'))
+        self.assertEqual(self.prepared_statements(), ['query_check_if_user_exist'])
+        self.assertEqual(self.db.statements.get_stats()['query_check_if_user_exist']['count'], 2)
+
+    def test_statement_is_prepared_again_after_deallocate(self):
+        self.assertTrue(self.user_exists('user1'))
+        self.cur.execute("DEALLOCATE ALL")
+        self.conn.commit()
+        self.assertTrue(self.user_exists('user1'))
+        self.assertEqual(self.prepared_statements(), ['query_check_if_user_exist'])
+
+    def test_unknown_query(self):
+        with self.assertRaises(ValueError):
+            self.db.get_data({"query": "connect", "query_arguments": {}})
+
+    def test_without_prepared_statements(self):
+        db = Database(self.config, prepare_statements=False)
+        self.assertTrue(db.check_data({"query": "query_check_if_user_exist", "query_arguments": {"username": "user1"}}))
+        self.assertEqual(db.statements.get_stats()['query_check_if_user_exist']['count'], 1)
+        self.assertEqual(db.conn.prepared, set())
+        db.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.cur.execute("DROP TABLE IF EXISTS messages, users, schema_version;")
+        cls.conn.commit()
+        cls.cur.close()
+        cls.conn.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,285 @@
+import asyncio
+import json
+import os
+import random
+import tempfile
+import threading
+import unittest
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from src.memory_database import MemoryDatabase
+from src.message_manager import INBOX_LIMIT, MessageManager
+from src.retention import Archiver
+from src.sqlite_database import SqliteDatabase
+from src.session import Session
+from src.user_manager import UserManager
+from src.write_behind import GroupCommitter, WriteBehindMessageManager
+
+
+class StorageEngineTests:
+    """Behaviour expected from every storage engine, run against each of them by the subclasses."""
+
+    def create_database(self):
+        raise NotImplementedError
+
+    def get_archive(self):
+        """Get the messages of every archived batch."""
+        raise NotImplementedError
+
+    def setUp(self):
+        self.db = self.create_database()
+        for username, role, unread_msgs in [('user1', 'user', 0), ('user2', 'admin', 0), ('user3', 'user', 5), ('user4', 'user', 0)]:
+            self.db.save_data({"query": "query_insert_user", "query_arguments": {"username": username, "password": "1234", "role": role, "unread_msgs": unread_msgs}})
+        for sender, receiver, message in [('user1', 'user3', 'msg1'), ('user1', 'user3', 'msg2'), ('user1', 'user4', 'msg3'), ('user2', 'user4', 'msg4')]:
+            self.db.save_data({"query": "query_insert_message", "query_arguments": {"sender": sender, "receiver": receiver, "message": message}})
+        self.db.save_data({"query": "query_update_unread_msgs", "query_arguments": {"unread_msgs": 2, "username": "user4"}})
+
+        self.user_manager = UserManager(self.db)
+        self.message_manager = MessageManager(self.db, self.user_manager)
+        self.session = Session("test_session")
+
+    def tearDown(self):
+        self.db.close()
+
+    def get_user(self, username):
+        return self.db.get_data({"query": "query_get_user_data", "query_arguments": {"username": username}})[0]
+
+    def test_create_account_and_login(self):
+        result = self.user_manager.create_account(username='test_user', password='123456', role='user')
+        self.assertEqual(result['status'], 'success')
+        result = self.user_manager.create_account(username='test_user', password='123456', role='user')
+        self.assertEqual(result['message'], 'User with that name already exist.')
+
+        result = self.user_manager.login(session=self.session, username='test_user', password='wrong')
+        self.assertEqual(result['status'], 'failure')
+        result = self.user_manager.login(session=self.session, username='test_user', password='123456')
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(self.session.role, 'user')
+
+    def test_send_message(self):
+        self.session.username = 'user1'
+        result = self.message_manager.send_msg_to_recipient(session=self.session, recipient='user2', msg_content='hello')
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(self.get_user('user2')['unread_msgs'], 1)
+
+        result = self.message_manager.send_msg_to_recipient(session=self.session, recipient='nobody', msg_content='hello')
+        self.assertEqual(result['message'], 'There is no such user like nobody.')
+        result = self.message_manager.send_msg_to_recipient(session=self.session, recipient='user3', msg_content='hello')
+        self.assertEqual(result['message'], 'Inbox is full.')
+
+    def test_broadcast_message(self):
+        self.session.username = 'user2'
+        result = self.message_manager.broadcast_msg(session=self.session, recipients=['user1', 'user3', 'user4', 'nobody', 'user1'], msg_content='hello')
+        self.assertEqual(result['sent'], ['user1', 'user4'])
+        self.assertEqual(result['failed'], {'user3': 'Inbox is full.', 'nobody': 'There is no such user.'})
+        self.assertEqual(self.get_user('user1')['unread_msgs'], 1)
+        self.assertEqual(self.get_user('user4')['unread_msgs'], 3)
+
+    def test_send_message_concurrent_senders(self):
+        results = []
+
+        def send():
+            session = Session("sender_session")
+            session.username = 'user1'
+            results.append(self.message_manager.send_msg_to_recipient(session=session, recipient='user4', msg_content='hello')['status'])
+
+        threads = [threading.Thread(target=send) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # user4 already has 2 unread messages, so only 3 more fit in the inbox
+        self.assertEqual(results.count('success'), 3)
+        self.assertEqual(self.get_user('user4')['unread_msgs'], 5)
+
+    def test_inbox_limit_stress(self):
+        recipients = [f'stress{i}' for i in range(4)]
+        for username in recipients:
+            self.db.save_data({"query": "query_insert_user", "query_arguments": {"username": username, "password": "1234", "role": "user", "unread_msgs": 0}})
+        delivered = []
+        read = []
+        errors = []
+
+        def client(seed):
+            rand = random.Random(seed)
+            sender = Session("sender_session")
+            sender.username = 'user1'
+            try:
+                for _ in range(40):
+                    choice = rand.random()
+                    if choice < 0.5:
+                        recipient = rand.choice(recipients)
+                        result = self.message_manager.send_msg_to_recipient(session=sender, recipient=recipient, msg_content='hello')
+                        delivered.extend([recipient] if result['status'] == 'success' else [])
+                    elif choice < 0.7:
+                        result = self.message_manager.broadcast_msg(session=sender, recipients=recipients, msg_content='hello')
+                        delivered.extend(result['sent'])
+                    else:
+                        reader = Session("reader_session")
+                        reader.username = rand.choice(recipients)
+                        reader.role = 'user'
+                        result = self.message_manager.read_msg(session=reader)
+                        read.extend([reader.username] * len(result) if isinstance(result, list) else [])
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=client, args=(seed,)) for seed in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        # every counter matches the messages left to read and never passed the limit
+        for username in recipients:
+            unread = self.get_user(username)['unread_msgs']
+            self.assertLessEqual(unread, INBOX_LIMIT)
+            reader = Session("reader_session")
+            reader.username = username
+            reader.role = 'user'
+            result = self.message_manager.read_msg(session=reader)
+            self.assertEqual(len(result) if isinstance(result, list) else 0, unread)
+            self.assertEqual(delivered.count(username), read.count(username) + unread)
+
+    def test_group_commit(self):
+        committer = GroupCommitter(self.db, ThreadPoolExecutor(max_workers=1), max_batch=4, max_delay=0.05)
+        message_manager = WriteBehindMessageManager(self.db, self.user_manager, committer=committer)
+        session = Session("sender_session")
+        session.username = 'user2'
+        recipients = ['user1'] * 6 + ['nobody'] + ['user4'] * 4
+
+        async def send_all():
+            results = await asyncio.gather(*(message_manager.send_msg_to_recipient(session=session, recipient=recipient, msg_content=f'msg{i}')
+                                             for i, recipient in enumerate(recipients)))
+            await committer.close()
+            return results
+
+        results = [result['message'] for result in asyncio.run(send_all())]
+        # every recipient takes the messages in the order they were sent until the inbox is full
+        self.assertEqual(results, ['The message has been sent to user1.'] * 5 + ['Inbox is full.', 'There is no such user like nobody.']
+                         + ['The message has been sent to user4.'] * 3 + ['Inbox is full.'])
+        self.assertEqual(committer.get_stats()['batches'], 3)
+        self.assertEqual(self.get_user('user1')['unread_msgs'], 5)
+        self.assertEqual(self.get_user('user4')['unread_msgs'], 5)
+        reader = Session("reader_session")
+        reader.username = 'user1'
+        reader.role = 'user'
+        self.assertEqual([msg['message'] for msg in self.message_manager.read_msg(session=reader)], [f'msg{i}' for i in range(5)])
+
+    def test_read_message(self):
+        self.session.username = 'user4'
+        self.session.role = 'user'
+        result = self.message_manager.read_msg(session=self.session)
+        self.assertEqual([dict(msg) for msg in result], [{"sender_name": "user1", "message": "msg3"}, {"sender_name": "user2", "message": "msg4"}])
+        self.assertEqual(self.get_user('user4')['unread_msgs'], 0)
+
+    def test_read_only_new_messages(self):
+        self.session.username = 'user4'
+        self.session.role = 'user'
+        self.assertEqual(len(self.message_manager.read_msg(session=self.session)), 2)
+        self.assertEqual(self.message_manager.read_msg(session=self.session), {"message": "You don't have any messages."})
+
+        sender = Session("sender_session")
+        sender.username = 'user1'
+        self.message_manager.send_msg_to_recipient(session=sender, recipient='user4', msg_content='new')
+        self.assertEqual(self.get_user('user4')['unread_msgs'], 1)
+        self.assertEqual([dict(msg) for msg in self.message_manager.read_msg(session=self.session)], [{"sender_name": "user1", "message": "new"}])
+        self.assertEqual(self.get_user('user4')['unread_msgs'], 0)
+
+    def test_read_message_as_admin_paginated(self):
+        self.session.username = 'user2'
+        self.session.role = 'admin'
+        self.assertEqual(len(self.message_manager.read_msg(session=self.session)['messages']), 4)
+
+        pages = []
+        cursor = None
+        while True:
+            result = self.message_manager.read_msg(session=self.session, page_size=3, cursor=cursor)
+            pages.append([msg['message'] for msg in result['messages']])
+            cursor = result['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(pages, [['msg1', 'msg2', 'msg3'], ['msg4']])
+
+    def test_read_message_as_admin_stream(self):
+        self.session.username = 'user2'
+        self.session.role = 'admin'
+        chunks = list(self.message_manager.read_msg(session=self.session, page_size=3, stream=True))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 1])
+        self.assertEqual(chunks[0][0]['receiver_name'], 'user3')
+
+    def test_archive_read_messages(self):
+        self.session.username = 'user4'
+        self.session.role = 'user'
+        self.message_manager.read_msg(session=self.session)
+        archiver = Archiver(self.db, retention_days=1, archive_retention_days=30, batch_size=1)
+
+        # nothing is old enough yet
+        self.assertEqual(archiver.run_once()["archived"], 0)
+        stats = archiver.run_once(now=datetime.now(timezone.utc) + timedelta(days=2))
+        self.assertEqual((stats["runs"], stats["archived"], stats["purged"]), (2, 2, 0))
+        # unread messages stay in the inbox whatever their age
+        self.assertEqual([msg['message'] for msg in self.db.get_data({"query": "query_get_all_messages"})], ['msg1', 'msg2'])
+        self.assertEqual(self.get_user('user3')['unread_msgs'], 5)
+        self.assertEqual(self.get_user('user4')['unread_msgs'], 0)
+        self.assertEqual(self.message_manager.read_msg(session=self.session), {"message": "You don't have any messages."})
+        self.assertEqual([batch[0]['message'] for batch in self.get_archive()], ['msg3', 'msg4'])
+
+        self.assertEqual(archiver.run_once(now=datetime.now(timezone.utc) + timedelta(days=40))["purged"], 2)
+        self.assertEqual(self.get_archive(), [])
+
+    def test_send_after_archive(self):
+        self.session.username = 'user4'
+        self.session.role = 'user'
+        self.message_manager.read_msg(session=self.session)
+        Archiver(self.db, retention_days=1).run_once(now=datetime.now(timezone.utc) + timedelta(days=2))
+
+        # ids of archived messages aren't given again, they would be below the read watermark
+        sender = Session("sender_session")
+        sender.username = 'user1'
+        self.message_manager.send_msg_to_recipient(session=sender, recipient='user4', msg_content='new')
+        self.assertEqual([dict(msg) for msg in self.message_manager.read_msg(session=self.session)], [{"sender_name": "user1", "message": "new"}])
+        self.assertEqual(self.get_user('user4')['unread_msgs'], 0)
+
+    def test_unknown_query(self):
+        with self.assertRaises(ValueError):
+            self.db.get_data({"query": "drop_everything", "query_arguments": {}})
+
+
+class MemoryDatabaseTests(StorageEngineTests, unittest.TestCase):
+
+    def create_database(self):
+        return MemoryDatabase()
+
+    def get_archive(self):
+        return [json.loads(zlib.decompress(batch['messages'])) for batch in self.db.archive]
+
+
+class SqliteDatabaseTests(StorageEngineTests, unittest.TestCase):
+
+    def create_database(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        return SqliteDatabase({"path": os.path.join(self.directory.name, "test.db")})
+
+    def get_archive(self):
+        return [json.loads(zlib.decompress(row['messages'])) for row in self.db.fetch("SELECT messages FROM messages_archive ORDER BY archive_id")]
+
+    def test_wal_mode(self):
+        self.assertEqual(self.db.get_connection().execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+
+    def test_deleted_messages_leave_inbox(self):
+        self.session.username = 'user4'
+        self.session.role = 'user'
+        self.message_manager.read_msg(session=self.session)
+        sender = Session("sender_session")
+        sender.username = 'user1'
+        for i in range(3):
+            self.message_manager.send_msg_to_recipient(session=sender, recipient='user4', msg_content=f'new{i}')
+        self.assertEqual(self.get_user('user4')['unread_msgs'], 3)
+
+        # only the unread messages are taken off the counter
+        self.db.get_connection().execute("DELETE FROM messages WHERE message IN ('msg3', 'new0', 'new1')")
+        self.assertEqual(self.get_user('user4')['unread_msgs'], 1)
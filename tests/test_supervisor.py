@@ -0,0 +1,94 @@
+import os
+import signal
+import tempfile
+import threading
+import time
+import unittest
+import urllib.request
+from src.client import Connection
+from src.supervisor import Supervisor
+
+
+def wait_for(condition, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out.")
+        time.sleep(0.05)
+
+
+class SupervisorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        config = {"path": os.path.join(self.tmpdir.name, "client_server.db"), "timeout": "5"}
+        self.supervisor = Supervisor("127.0.0.1", 0, "0.0.1", config, workers=2, metrics_port=0, restart_delay=0.1,
+                                     stats_interval=0.1, engine='sqlite')
+        self.thread = threading.Thread(target=self.supervisor.run)
+        self.thread.start()
+        self.supervisor.ready.wait(10)
+        # the workers listen once both of them have reported their counters
+        wait_for(lambda: len(self.supervisor.worker_stats) == 2)
+
+    def tearDown(self):
+        self.supervisor.stop()
+        self.thread.join(30)
+        self.tmpdir.cleanup()
+
+    def test_workers(self):
+        port = self.supervisor.port
+        with Connection(port=port) as conn:
+            self.assertEqual(conn.request("signup", username="user1", password="1234", role="user")["status"], "success")
+            self.assertEqual(conn.request("signup", username="user2", password="1234", role="user")["status"], "success")
+
+        # every connection can land on another worker, they all share the database
+        for i in range(10):
+            with Connection(port=port) as conn:
+                conn.request("login", username="user1", password="1234")
+                # the inbox holds 5 messages
+                self.assertEqual(conn.request("send", recipient="user2", msg_content=f"msg{i}")["status"], "success" if i < 5 else "failure")
+        with Connection(port=port) as conn:
+            conn.request("login", username="user2", password="1234")
+            self.assertEqual(len(conn.request("read")), 5)
+
+        # counters of the workers are added up
+        wait_for(lambda: self.supervisor.get_stats()["commands"].get("login", {}).get("requests") == 11)
+        stats = self.supervisor.get_stats()
+        self.assertEqual(stats["commands"]["send"]["requests"], 10)
+        self.assertEqual(stats["connections"], 12)
+        self.assertEqual(stats["commands"]["send"]["errors"], 5)
+        self.assertEqual(stats["db"]["query_send_message"]["count"], 10)
+
+        page = urllib.request.urlopen(f"http://127.0.0.1:{self.supervisor.metrics_server.server_port}/metrics").read().decode()
+        self.assertIn('server_requests_total{command="send"} 10', page)
+        self.assertIn('server_workers 2', page)
+
+    def test_restart_crashed_worker(self):
+        pid = self.supervisor.processes[0].pid
+        os.kill(pid, signal.SIGKILL)
+        wait_for(lambda: self.supervisor.restarts.get(0) == 1 and self.supervisor.processes[0].is_alive())
+        self.assertNotEqual(self.supervisor.processes[0].pid, pid)
+
+        # the port is still served
+        with Connection(port=self.supervisor.port) as conn:
+            self.assertEqual(conn.request("info")["version"], "0.0.1")
+
+    def test_stop_command(self):
+        with Connection(port=self.supervisor.port) as conn:
+            conn.request("stop")
+        self.thread.join(30)
+        self.assertFalse(self.thread.is_alive())
+        self.assertFalse(any(process.is_alive() for process in self.supervisor.processes.values()))
+
+    def test_user_cache_disabled(self):
+        config = {"path": os.path.join(self.tmpdir.name, "cache.db")}
+        supervisor = Supervisor("127.0.0.1", 0, "0.0.1", config, workers=2, engine='sqlite', cache_config={"max_size": 10, "ttl": 60})
+        self.assertIsNone(supervisor.server_kwargs["cache_config"])
+
+    def test_memory_engine(self):
+        with self.assertRaises(ValueError):
+            Supervisor("127.0.0.1", 0, "0.0.1", {}, workers=2, engine='memory')
+
+
+if __name__ == "__main__":
+    unittest.main()
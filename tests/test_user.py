@@ -1,6 +1,8 @@
 import unittest
 from src.user_manager import UserManager
 from src.database import Database
+from src.session import Session
+from src.migrations import apply_migrations
 from configparser import ConfigParser
 
 def load_config(filename='database.ini', section='postgresql'):
@@ -23,24 +25,15 @@ class UserTests(unittest.TestCase):
         cls.db = Database(cls.config)
         cls.conn = cls.db.conn
         cls.cur = cls.conn.cursor()
-        cls.cur.execute(
-            """
-            DROP TABLE IF EXISTS users;
-            CREATE TABLE users (
-                user_id SERIAL PRIMARY KEY,
-                username VARCHAR(255) NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                role VARCHAR(5) NOT NULL,
-                unread_msgs INTEGER NOT NULL
-            );
-            """
-        )
+        cls.cur.execute("DROP TABLE IF EXISTS messages, users, schema_version;")
         cls.conn.commit()
+        apply_migrations(cls.db)
 
 
     def setUp(self):
         self.user_manager = UserManager(self.db)
-        self.cur.execute("DELETE FROM users;")
+        self.session = Session("test_session")
+        self.cur.execute("DELETE FROM messages; DELETE FROM users;")
         self.cur.execute(
             """
             INSERT INTO users (username, password, role, unread_msgs)
@@ -64,6 +57,8 @@ class UserTests(unittest.TestCase):
         self.assertEqual(
             result["message"], "You have created new account named test_user."
         )
+        self.cur.execute("SELECT password FROM users WHERE username = 'test_user'")
+        self.assertTrue(self.cur.fetchone()[0].startswith("scrypt$"))
 
     def test_create_account_failure(self):
         self.user_manager.create_account(**self.user_credentials)
@@ -80,52 +75,53 @@ class UserTests(unittest.TestCase):
 
     def test_login_success(self):
         self.user_manager.create_account(**self.user_credentials)
-        result = self.user_manager.login(username="test_user", password="123456")
+        result = self.user_manager.login(session=self.session, username="test_user", password="123456")
         self.assertEqual(result["status"], "success")
         self.assertEqual(result["message"], "User test_user logged in.")
-        self.assertEqual(self.user_manager.logged_in_user, "test_user")
-        self.assertEqual(self.user_manager.logged_in_role, "user")
+        self.assertEqual(self.session.username, "test_user")
+        self.assertEqual(self.session.role, "user")
 
     def test_login_wrong_name(self):
         self.user_manager.create_account(**self.user_credentials)
-        result = self.user_manager.login(username="wrong_name", password="123456")
+        result = self.user_manager.login(session=self.session, username="wrong_name", password="123456")
         self.assertEqual(result["status"], "failure")
         self.assertEqual(result["message"], "Invalid username or password.")
-        self.assertEqual(self.user_manager.logged_in_user, None)
+        self.assertEqual(self.session.username, None)
 
     def test_login_wrong_password(self):
         self.user_manager.create_account(**self.user_credentials)
         result = self.user_manager.login(
+            session=self.session,
             username="test_user", password="wrong_password"
         )
         self.assertEqual(result["status"], "failure")
         self.assertEqual(result["message"], "Invalid username or password.")
-        self.assertEqual(self.user_manager.logged_in_user, None)
+        self.assertEqual(self.session.username, None)
 
     def test_login_already_login(self):
         self.user_manager.create_account(**self.user_credentials)
-        self.user_manager.login(username="test_user", password="123456")
-        result = self.user_manager.login(username="test_user", password="123456")
+        self.user_manager.login(session=self.session, username="test_user", password="123456")
+        result = self.user_manager.login(session=self.session, username="test_user", password="123456")
         self.assertEqual(result["status"], "failure")
         self.assertEqual(result["message"], "You are logged in as test_user.")
 
     def test_logout_success(self):
         self.user_manager.create_account(**self.user_credentials)
-        self.user_manager.login(username="test_user", password="123456")
-        result = self.user_manager.logout()
+        self.user_manager.login(session=self.session, username="test_user", password="123456")
+        result = self.user_manager.logout(session=self.session)
         self.assertEqual(result["status"], "success")
         self.assertEqual(result["message"], "User test_user logged out.")
-        self.assertEqual(self.user_manager.logged_in_user, None)
-        self.assertEqual(self.user_manager.logged_in_role, None)
+        self.assertEqual(self.session.username, None)
+        self.assertEqual(self.session.role, None)
 
     def test_logout_failure(self):
-        result = self.user_manager.logout()
+        result = self.user_manager.logout(session=self.session)
         self.assertEqual(result["status"], "failure")
         self.assertEqual(result["message"], "No user is currently logged in")
 
     @classmethod
     def tearDownClass(cls):
-        cls.cur.execute("DROP TABLE IF EXISTS users;")
+        cls.cur.execute("DROP TABLE IF EXISTS messages, users, schema_version;")
         cls.conn.commit()
         cls.cur.close()
         cls.conn.close()
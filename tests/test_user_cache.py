@@ -0,0 +1,112 @@
+import unittest
+from src.database import Database
+from src.migrations import apply_migrations
+from src.session import Session
+from src.user_cache import CachedDatabase, UserCache
+from src.user_manager import UserManager
+from configparser import ConfigParser
+
+def load_config(filename='database.ini', section='postgresql'):
+    parser = ConfigParser()
+    parser.read(filename)
+    config = {}
+    if parser.has_section(section):
+        params = parser.items(section)
+        for param in params:
+            config[param[0]] = param[1]
+    else:
+        raise Exception(f'Section {section} not found in the {filename} file')
+    return config
+
+class UserCacheTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.config = load_config()
+        cls.database = Database(cls.config)
+        cls.conn = cls.database.conn
+        cls.cur = cls.conn.cursor()
+        cls.cur.execute("DROP TABLE IF EXISTS messages, users, schema_version;")
+        cls.conn.commit()
+        apply_migrations(cls.database)
+
+    def setUp(self):
+        self.cur.execute(
+            """
+            DELETE FROM messages;
+            DELETE FROM users;
+
+            INSERT INTO users (username, password, role, unread_msgs)
+            VALUES ('user1', '1234', 'user', 0), ('user2', '1234', 'admin', 0);
+            """
+        )
+        self.conn.commit()
+        self.database.statements.stats.clear()
+        self.db = CachedDatabase(self.database, UserCache(max_size=2, ttl=60))
+        self.user_manager = UserManager(self.db)
+
+    def query_count(self, query):
+        return self.database.statements.get_stats().get(query, {}).get('count', 0)
+
+    def test_repeated_login_hits_cache(self):
+        # the first login replaces the password in plain text with its hash
+        self.user_manager.login(session=Session("test_session"), username='user2', password='1234')
+        self.database.statements.stats.clear()
+        self.db.user_cache.misses = 0
+        for _ in range(3):
+            session = Session("test_session")
+            result = self.user_manager.login(session=session, username='user2', password='1234')
+            self.assertEqual(result['status'], 'success')
+            self.assertEqual(session.role, 'admin')
+        self.assertEqual(self.query_count('query_get_user_data'), 1)
+        self.assertEqual(self.query_count('query_get_user_credentials'), 0)
+        self.assertEqual(self.db.user_cache.get_stats()['misses'], 1)
+
+    def test_wrong_password_from_cache(self):
+        self.user_manager.login(session=Session("test_session"), username='user1', password='1234')
+        result = self.user_manager.login(session=Session("test_session"), username='user1', password='wrong')
+        self.assertEqual(result['status'], 'failure')
+
+    def test_insert_invalidates_missing_user(self):
+        self.assertFalse(self.db.check_data({"query": "query_check_if_user_exist", "query_arguments": {"username": "user3"}}))
+        result = self.user_manager.create_account(username='user3', password='1234', role='user')
+        self.assertEqual(result['status'], 'success')
+        self.assertTrue(self.db.check_data({"query": "query_check_if_user_exist", "query_arguments": {"username": "user3"}}))
+
+    def test_update_invalidates_user(self):
+        self.assertEqual(self.db.get_data({"query": "query_get_user_data", "query_arguments": {"username": "user1"}})[0]['unread_msgs'], 0)
+        self.db.save_data({"query": "query_update_unread_msgs", "query_arguments": {"unread_msgs": 3, "username": "user1"}})
+        self.assertEqual(self.db.get_data({"query": "query_get_user_data", "query_arguments": {"username": "user1"}})[0]['unread_msgs'], 3)
+        self.assertEqual(self.db.user_cache.get_stats()['invalidations'], 1)
+
+    def test_broadcast_invalidates_recipients(self):
+        for username in ['user1', 'user2']:
+            self.db.get_data({"query": "query_get_user_data", "query_arguments": {"username": username}})
+        self.db.save_and_get_all({"query": "query_broadcast_message", "query_arguments": {
+            "sender": "user2", "receivers": ["user1", "user2"], "message": "announcement", "inbox_limit": 5}})
+        for username in ['user1', 'user2']:
+            self.assertEqual(self.db.get_data({"query": "query_get_user_data", "query_arguments": {"username": username}})[0]['unread_msgs'], 1)
+        self.assertEqual(self.db.user_cache.get_stats()['invalidations'], 2)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = UserCache(max_size=2, ttl=60)
+        cache.put('user1', {})
+        cache.put('user2', {})
+        cache.get('user1')
+        cache.put('user3', {})
+        self.assertEqual(list(cache.entries), ['user1', 'user3'])
+
+    def test_expired_record_is_reloaded(self):
+        cache = UserCache(ttl=0)
+        cache.put('user1', {})
+        self.assertEqual(cache.get('user1'), (False, None))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.cur.execute("DROP TABLE IF EXISTS messages, users, schema_version;")
+        cls.conn.commit()
+        cls.cur.close()
+        cls.conn.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from src.client import Connection
+from src.memory_database import MemoryDatabase
+from src.server import Server
+from src.write_behind import GroupCommitter
+
+
+class FailingDatabase:
+
+    async def save_and_get_all(self, params):
+        raise RuntimeError("database is down")
+
+
+class GroupCommitterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.db = MemoryDatabase()
+        self.db.save_data({"query": "query_insert_user", "query_arguments": {"username": "user1", "password": "1234", "role": "user", "unread_msgs": 0}})
+
+    def test_full_queue(self):
+        committer = GroupCommitter(self.db, ThreadPoolExecutor(max_workers=1), max_batch=10, max_delay=0.05, max_pending=2)
+
+        async def send_all():
+            results = await asyncio.gather(*(committer.submit("user1", "user1", f"msg{i}") for i in range(3)))
+            await committer.close()
+            return results
+
+        results = asyncio.run(send_all())
+        # the third message didn't fit in the queue
+        self.assertEqual(results, [{"recipient_exists": True, "sent": True}] * 2 + [None])
+        self.assertEqual(committer.get_stats()["batches"], 1)
+
+    def test_failed_commit(self):
+        committer = GroupCommitter(FailingDatabase(), max_delay=0.01)
+
+        async def send():
+            try:
+                return await committer.submit("user1", "user1", "msg")
+            finally:
+                await committer.close()
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run(send())
+
+
+class WriteBehindServerTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = Server("127.0.0.1", 0, "0.0.1", {}, engine='memory', write_behind='true', group_commit_delay='0.01', kdf_workers=0)
+        cls.thread = threading.Thread(target=cls.server.start_server)
+        cls.thread.start()
+        while getattr(cls.server, 'listener', None) is None:
+            time.sleep(0.01)
+        cls.port = cls.server.listener.sockets[0].getsockname()[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        with Connection(port=cls.port) as conn:
+            conn.request("stop")
+        cls.thread.join()
+
+    def test_pipelined_sends_are_committed_together(self):
+        with Connection(port=self.port) as conn:
+            conn.request("signup", username="user1", password="1234", role="user")
+            conn.request("signup", username="user2", password="1234", role="user")
+            conn.request("login", username="user1", password="1234")
+            answers = conn.pipeline([{"command": "send", "recipient": "user2", "msg_content": f"msg{i}"} for i in range(6)])
+            self.assertEqual([answer["status"] for answer in answers], ["success"] * 5 + ["failure"])
+            stats = conn.request("stats")["write_behind"]
+            self.assertEqual(stats["messages"], 6)
+            self.assertLess(stats["batches"], 6)
+
+            conn.request("logout")
+            conn.request("login", username="user2", password="1234")
+            self.assertEqual([msg["message"] for msg in conn.request("read")], [f"msg{i}" for i in range(5)])
+
+
+if __name__ == "__main__":
+    unittest.main()